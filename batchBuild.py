@@ -0,0 +1,189 @@
+    # coding=utf-8
+    # Пакетная сборка сетапов спины для библиотеки ассетов в нескольких процессах.
+    # Манифест - JSON со списком ассетов (все поля, кроме name, необязательные):
+    #
+    #   {"assets": [{"name": "wolf", "type": "quadruped", "neckRoot": [0, 30, 30], "hip": [0, 30, -30],
+    #                "guides": [[0, 35, 0]], "spacing": "arcLength", "num": 9, "fkNum": 5,
+    #                "squashMode": "compact", "skinWeights": "analytic", "ikSegments": 2, "midDrivers": 1,
+    #                "controlDrive": "matrix", "budget": {"nodes": 400, "memory": 1048576}}]}
+    #
+    #   python batchBuild.py library.json --output-dir builds --workers 8 --retries 1
+    #   mayapy batchBuild.py library.json --output-dir builds --backend maya
+    #
+    # Каждый рабочий процесс собирает свои ассеты в одной сессии. Со сценой в памяти (--backend memory)
+    # результат ассета - JSON с записанными операциями (sceneBackend.loadRecording + replay воспроизводит
+    # его в Maya), с --backend maya - сцена .ma. Отчет по ассетам пишется в batch_report.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+BACKENDS = ("memory", "maya")
+RIG_TYPES = ("biped", "quadruped")
+    # Поля ассета, которые передаются в rigSetup.buildRigs
+ASSET_KEYS = ("type", "num", "fkNum", "squashMode", "skinWeights", "ikSegments", "midDrivers", "controlDrive", "budget",
+              "neckRoot", "hip", "guides", "spacing")
+REPORT_NAME = "batch_report.json"
+
+_clock = getattr(time, "perf_counter", time.time)
+
+    # Сцена рабочего процесса, задается в initWorker
+_workerBackend = None
+
+    # Читает и проверяет манифест: у каждого ассета есть уникальное имя и известный тип рига
+def loadManifest(path):
+    with open(path) as source:
+        data = json.load(source)
+    assets = data["assets"] if isinstance(data, dict) else data
+    names = set()
+    for asset in assets:
+        name = asset.get("name")
+        if not name:
+            raise ValueError("Manifest asset without a name: {}".format(asset))
+        if name in names:
+            raise ValueError("Duplicate asset name in manifest: {}".format(name))
+        if asset.get("type", "biped") not in RIG_TYPES:
+            raise ValueError("Unknown rig type for asset {}: {}".format(name, asset.get("type")))
+        names.add(name)
+    return assets
+
+    # Инициализация рабочего процесса: для Maya сессия поднимается один раз на процесс
+def initWorker(backend):
+    global _workerBackend
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    _workerBackend = backend
+    if backend == "maya":
+        import maya.standalone
+        maya.standalone.initialize(name = "python")
+
+    # Собирает один ассет и сохраняет результат в outputDir. Ошибка сборки не выходит за пределы ассета:
+    # она попадает в результат вместе с временем и процессом, в котором случилась
+def buildAsset(asset, outputDir, backend = None):
+    import rigSetup
+    from sceneBackend import MayaBackend, RecordingBackend, useBackend
+
+    backend = backend or _workerBackend or "memory"
+    result = {"name": asset["name"], "pid": os.getpid(), "status": "ok", "output": None, "error": None}
+    spec = dict((key, asset[key]) for key in ASSET_KEYS if key in asset)
+    start = _clock()
+    try:
+        if backend == "maya":
+            from maya import cmds as mayaCmds
+            mayaCmds.file(new = True, force = True)
+            scene = MayaBackend(mayaCmds)
+            path = os.path.join(outputDir, asset["name"] + ".ma")
+        else:
+            scene = RecordingBackend()
+            path = os.path.join(outputDir, asset["name"] + ".json")
+        with useBackend(scene):
+            stats = rigSetup.buildRigs([spec], lambda rig: _saveResult(scene, path, rig))[0]
+        result.update(stats)
+        result["output"] = path
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    result["time"] = _clock() - start
+    return result
+
+    # Записывает результат во временный файл и переименовывает его, чтобы после сбоя не оставалось
+    # недописанных файлов под именем ассета
+def _saveResult(scene, path, rig):
+    root, ext = os.path.splitext(path)
+    temp = root + ".tmp" + ext
+    if scene.mode == "maya":
+        scene.file(rename = temp)
+        scene.file(save = True, type = "mayaAscii")
+        nodes = len(scene.ls())
+    else:
+        scene.save(temp)
+        nodes = len(scene.shadow.nodes)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temp, path)
+    # Режим сжатия и количество FK джоинтов могут отличаться от манифеста, если сетап подбирался под бюджет
+    return {"sceneNodes": nodes, "renames": len(rig.names.renames), "squashMode": rig.SQUASH_MODE,
+            "fkJoints": rig.fkJointCount}
+
+    # Собирает ассеты в пуле из workers процессов. Неудачные ассеты отправляются на сборку повторно,
+    # пока не исчерпаны retries попыток. timeout (секунды) ограничивает ожидание одного ассета:
+    # так же обнаруживается рабочий процесс, который упал или завис. workers=0 - сборка в текущем процессе
+def runBatch(assets, outputDir, workers = 4, retries = 1, backend = "memory", timeout = None, log = sys.stderr):
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+    pool = None
+    if workers > 0:
+        pool = multiprocessing.Pool(workers, initWorker, (backend,))
+    else:
+        initWorker(backend)
+    results = {}
+    attempts = {}
+    start = _clock()
+    try:
+        pending = list(assets)
+        while pending:
+            if pool is not None:
+                jobs = [(asset, pool.apply_async(buildAsset, (asset, outputDir))) for asset in pending]
+            else:
+                jobs = [(asset, None) for asset in pending]
+            pending = []
+            for asset, job in jobs:
+                name = asset["name"]
+                attempts[name] = attempts.get(name, 0) + 1
+                if job is None:
+                    result = buildAsset(asset, outputDir, backend)
+                else:
+                    try:
+                        result = job.get(timeout)
+                    except multiprocessing.TimeoutError:
+                        result = {"name": name, "pid": None, "status": "failed", "output": None, "time": timeout,
+                                  "error": "no result after {} s".format(timeout)}
+                result["attempts"] = attempts[name]
+                results[name] = result
+                if result["status"] != "ok" and attempts[name] <= retries:
+                    pending.append(asset)
+                if log is not None:
+                    log.write("{:<24}{:>8}{:>10.1f} ms  attempt {}\n".format(name, result["status"],
+                                                                          result["time"] * 1000.0, attempts[name]))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    elapsed = _clock() - start
+    ordered = [results[asset["name"]] for asset in assets]
+    built = [result for result in ordered if result["status"] == "ok"]
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(), "backend": backend,
+                     "workers": workers, "retries": retries, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "summary": {"assets": len(assets), "built": len(built), "failed": len(assets) - len(built),
+                        "time": elapsed, "assetsPerSecond": len(built) / elapsed if elapsed > 0 else 0.0},
+            "results": ordered}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Batch build of TorsoRig for a library of assets")
+    parser.add_argument("manifest")
+    parser.add_argument("--output-dir", default = "builds")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(),
+                        help = "worker processes, 0 - build in the current process")
+    parser.add_argument("--retries", type = int, default = 1)
+    parser.add_argument("--timeout", type = float, default = None, help = "seconds to wait for one asset")
+    parser.add_argument("--backend", default = "memory", choices = BACKENDS)
+    args = parser.parse_args(argv)
+
+    report = runBatch(loadManifest(args.manifest), args.output_dir, args.workers, args.retries, args.backend,
+                      args.timeout)
+    path = os.path.join(args.output_dir, REPORT_NAME)
+    with open(path, "w") as output:
+        json.dump(report, output, indent = 2, sort_keys = True)
+    summary = report["summary"]
+    sys.stderr.write("{} built, {} failed in {:.2f} s ({:.1f} assets/s), report written to {}\n".format(
+        summary["built"], summary["failed"], summary["time"], summary["assetsPerSecond"], path))
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+    # coding=utf-8
+    # Замеры масштабирования сборки TorsoRig на сцене в памяти.
+    # Каждый замер выполняется в отдельном процессе, чтобы сборки не влияли друг на друга
+    # и пик памяти относился к одной сборке.
+    #
+    #   python benchmark.py --joints 4 16 64 256 --output bench.json
+    #   python benchmark.py --compare old.json new.json
+    #   python benchmark.py --squash-report --joints 8 32 128
+    #   python benchmark.py --imports-only
+    #   python benchmark.py --segment-report --joints 16 64 256 --segments 1 4 8
+    #   mayapy benchmark.py --segment-report --backend maya --joints 16 64 256 --segments 1 4 8
+    #   mayapy benchmark.py --segment-report --backend maya --control-drive matrix --segments 1
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_JOINTS = (4, 8, 16, 32, 64, 128, 256, 400)
+DEFAULT_TYPES = ("biped", "quadruped")
+DEFAULT_SEGMENTS = (1, 2, 4, 8)
+    # Сколько кадров проигрывается при замере вычисления системы сжатия
+FRAME_SAMPLES = 24
+    # Модули, время импорта которых замеряется, и тяжелые зависимости, которые они не должны загружать при импорте
+IMPORT_MODULES = ("rigSetup", "rigGraph", "graphAnalysis", "rigReconcile")
+HEAVY_MODULES = ("maya", "numpy")
+
+_clock = getattr(time, "perf_counter", time.time)
+
+    # Один замер в текущем процессе: время сборки, вызовы сцены, ноды и пик памяти
+def measureBuild(rigType, joints, fkJoints, profile = False, squashMode = "perJoint"):
+    sys.path.insert(0, ROOT)
+    from memoryBackend import MemoryBackend
+    from sceneBackend import useBackend
+    import rigSetup
+
+    tracemalloc = None
+    if profile:
+        try:
+            import tracemalloc
+            tracemalloc.start()
+        except ImportError:
+            tracemalloc = None
+
+    backend = MemoryBackend()
+    rig = rigSetup.TorsoRig(rigType)
+    with useBackend(backend):
+        start = _clock()
+        report = rig.build(joints, fkJoints, profile = profile, squashMode = squashMode)
+        elapsed = _clock() - start
+        frameTime, frameCurveEvaluations = measureFrames(backend, rig)
+
+    result = {"rigType": rigType, "joints": joints, "fkJoints": fkJoints, "squashMode": squashMode,
+              "time": elapsed, "sceneNodes": len(backend.nodes), "connections": len(backend.inputs),
+              "frameTime": frameTime, "frameCurveEvaluations": frameCurveEvaluations}
+    if profile:
+        result["calls"] = report["totalCalls"]
+        result["callsByCommand"] = report["calls"]
+        result["nodesCreated"] = report["nodesCreated"]
+        result["stages"] = dict((stage["name"], stage["time"]) for stage in report["stages"])
+        squashStage = [stage for stage in report["stages"] if stage["name"] == "createSqshStchCont"][0]
+        result["squashNodes"] = squashStage["nodesCreated"]
+        result["squashConnections"] = squashStage["calls"].get("connectAttr", 0)
+        if tracemalloc is not None:
+            result["peakMemory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            import resource
+            result["peakMemory"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+    # Проигрывание анимации: сцена переходит на следующий кадр и отдает масштаб всех джоинтов спины.
+    # Возвращает среднее время кадра и количество вычислений анимационных кривых за кадр
+def measureFrames(scene, rig, frames = FRAME_SAMPLES):
+    plugs = ["{}.scaleY".format(joint) for joint in rig.joints[:-1]]
+    evaluations = scene.curveEvaluations
+    start = _clock()
+    for frame in range(frames):
+        scene.currentTime(frame + 1)
+        for plug in plugs:
+            scene.getAttr(plug)
+    frames = max(1, frames)
+    return (_clock() - start) / frames, (scene.curveEvaluations - evaluations) / float(frames)
+
+    # Импорт модуля в чистом процессе: время и загруженные при этом тяжелые зависимости
+def measureImport(module):
+    sys.path.insert(0, ROOT)
+    start = _clock()
+    __import__(module)
+    elapsed = _clock() - start
+    return {"module": module, "time": elapsed,
+            "heavyModules": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+def _runImportChild(module):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child-import", module],
+                                     cwd = ROOT)
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+    # Время импорта каждого модуля: медиана repeat замеров, каждый в новом процессе
+def runImports(modules = IMPORT_MODULES, repeat = 3, log = sys.stderr):
+    results = []
+    for module in modules:
+        runs = [_runImportChild(module) for _ in range(max(1, repeat))]
+        times = sorted(run["time"] for run in runs)
+        result = runs[0]
+        result["time"] = times[len(times) // 2]
+        result["timeMin"] = times[0]
+        results.append(result)
+        if log is not None:
+            log.write("import {:<16}{:>10.1f} ms  {}\n".format(module, result["time"] * 1000.0,
+                                                             ", ".join(result["heavyModules"]) or "-"))
+    return results
+
+    # Сборка с ikSegments участками IK spline и замер вычисления сцены: контроллер плеч сдвигается samples раз,
+    # после каждого сдвига читается мировая матрица последнего джоинта спины. Время решения IK spline
+    # имеет смысл только в Maya (--backend maya под mayapy): сцена в памяти IK не решает.
+    # controlDrive - как IK контроллеры ведут джоинты кривых (TorsoRig.CONTROL_DRIVE)
+def measureSegments(rigType, joints, segments, samples = 50, backend = "memory", controlDrive = "constraint"):
+    sys.path.insert(0, ROOT)
+    from sceneBackend import MayaBackend, useBackend
+    import rigSetup
+
+    if backend == "maya":
+        import maya.standalone
+        maya.standalone.initialize(name = "python")
+        from maya import cmds as mayaCmds
+        scene = MayaBackend(mayaCmds)
+    else:
+        from memoryBackend import MemoryBackend
+        scene = MemoryBackend()
+    rig = rigSetup.TorsoRig(rigType)
+    with useBackend(scene):
+        start = _clock()
+        rig.build(joints, 4, ikSegments = segments, controlDrive = controlDrive)
+        buildTime = _clock() - start
+        control = "{}.translateY".format(rig.ikControls[1].controlName)
+        matrix = "{}.worldMatrix[0]".format(rig.joints[-1])
+        start = _clock()
+        for n in range(samples):
+            scene.setAttr(control, n % 10)
+            scene.getAttr(matrix)
+        solveTime = (_clock() - start) / max(1, samples)
+        bounds = rig.segmentBounds()
+        nodes = len(scene.ls())
+    return {"rigType": rigType, "joints": joints, "segments": len(bounds) - 1, "backend": backend,
+            "controlDrive": controlDrive, "buildTime": buildTime, "solveTime": solveTime, "sceneNodes": nodes,
+            "maxChain": max(bounds[n + 1] - bounds[n] + 1 for n in range(len(bounds) - 1))}
+
+    # Одна ikHandle против участков: для каждого количества джоинтов - сборка с каждым количеством участков
+def segmentReport(rigType, jointCounts, segmentCounts, samples = 50, backend = "memory", controlDrive = "constraint",
+                  log = sys.stdout):
+    rows = []
+    log.write("{:<8}{:>10}{:>10}{:>12}{:>12}{:>8}\n".format("joints", "segments", "max chain", "build ms",
+                                                          "solve ms", "nodes"))
+    for joints in jointCounts:
+        for segments in segmentCounts:
+            command = [sys.executable, os.path.abspath(__file__), "--child-segments", rigType, str(joints),
+                       str(segments), "--samples", str(samples), "--backend", backend, "--control-drive", controlDrive]
+            output = subprocess.check_output(command, cwd = ROOT)
+            row = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+            rows.append(row)
+            log.write("{:<8}{:>10}{:>10}{:>12.1f}{:>12.3f}{:>8}\n".format(joints, row["segments"], row["maxChain"],
+                                                                      row["buildTime"] * 1000.0,
+                                                                      row["solveTime"] * 1000.0, row["sceneNodes"]))
+    return rows
+
+def _runChild(rigType, joints, fkJoints, profile, squashMode = "perJoint"):
+    command = [sys.executable, os.path.abspath(__file__), "--child", rigType, str(joints), str(fkJoints),
+               "--squash-mode", squashMode]
+    if profile:
+        command.append("--profile")
+    output = subprocess.check_output(command, cwd = ROOT)
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+    # Полный прогон: для каждого случая один замер с профайлером и repeat замеров времени без него
+def runSuite(rigTypes, jointCounts, fkCounts, repeat = 3, log = sys.stderr):
+    results = []
+    for rigType in rigTypes:
+        for joints, fkJoints in zip(jointCounts, fkCounts):
+            result = _runChild(rigType, joints, fkJoints, True)
+            times = [_runChild(rigType, joints, fkJoints, False)["time"] for _ in range(repeat)]
+            result["profiledTime"] = result["time"]
+            result["time"] = sorted(times)[len(times) // 2] if times else result["time"]
+            result["timeMin"] = min(times) if times else result["time"]
+            results.append(result)
+            if log is not None:
+                log.write("{:<10}{:>6}{:>6}{:>10.1f} ms{:>8} calls{:>7} nodes{:>10.1f} KiB\n".format(
+                    rigType, joints, fkJoints, result["time"] * 1000.0, result["calls"],
+                    result["nodesCreated"], result["peakMemory"] / 1024.0))
+    return {"meta": _metadata(repeat), "results": results, "imports": runImports(repeat = repeat, log = log)}
+
+def _metadata(repeat):
+    commit = None
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = ROOT,
+                                         stderr = subprocess.STDOUT).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {"python": platform.python_version(), "platform": platform.platform(), "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": repeat, "backend": "memory"}
+
+    # Сравнивает число нод и связей системы сжатия в режимах perJoint и compact и вычисления кривой splineStretch
+    # за кадр: в compact степени берутся из кэша кривой и на кадре не пересчитываются
+def squashModeReport(rigType, jointCounts, log = sys.stdout):
+    rows = []
+    log.write("{:<8}{:>16}{:>16}{:>16}{:>16}{:>14}{:>14}{:>16}{:>16}\n".format(
+        "joints", "perJoint nodes", "compact nodes", "perJoint conn", "compact conn", "scene before", "scene after",
+        "perJoint evals", "compact evals"))
+    for joints in jointCounts:
+        perJoint = _runChild(rigType, joints, 4, True, "perJoint")
+        compact = _runChild(rigType, joints, 4, True, "compact")
+        rows.append({"joints": joints, "perJoint": perJoint, "compact": compact})
+        log.write("{:<8}{:>16}{:>16}{:>16}{:>16}{:>14}{:>14}{:>16.1f}{:>16.1f}\n".format(
+            joints, perJoint["squashNodes"], compact["squashNodes"], perJoint["squashConnections"],
+            compact["squashConnections"], perJoint["sceneNodes"], compact["sceneNodes"],
+            perJoint["frameCurveEvaluations"], compact["frameCurveEvaluations"]))
+    return rows
+
+    # Сравнивает два файла результатов по совпадающим случаям
+def compareResults(old, new, log = sys.stdout):
+    oldCases = dict(((r["rigType"], r["joints"], r["fkJoints"]), r) for r in old["results"])
+    log.write("{:<10}{:>6}{:>6}{:>10}{:>10}{:>10}\n".format("type", "joints", "fk", "time x", "calls x", "memory x"))
+    for result in new["results"]:
+        before = oldCases.get((result["rigType"], result["joints"], result["fkJoints"]))
+        if before is None:
+            continue
+        ratio = lambda key: result[key] / float(before[key]) if before.get(key) else float("nan")
+        log.write("{:<10}{:>6}{:>6}{:>10.2f}{:>10.2f}{:>10.2f}\n".format(result["rigType"], result["joints"],
+                                                                      result["fkJoints"], ratio("time"),
+                                                                      ratio("calls"), ratio("peakMemory")))
+    oldImports = dict((r["module"], r) for r in old.get("imports", []))
+    for result in new.get("imports", []):
+        before = oldImports.get(result["module"])
+        if before is not None and before["time"]:
+            log.write("import {:<16}{:>10.2f}\n".format(result["module"], result["time"] / before["time"]))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "TorsoRig build scaling benchmark")
+    parser.add_argument("--types", nargs = "+", default = list(DEFAULT_TYPES))
+    parser.add_argument("--joints", nargs = "+", type = int, default = list(DEFAULT_JOINTS),
+                        help = "createPositionJoints(num=...) values")
+    parser.add_argument("--fk-joints", nargs = "+", type = int, default = None,
+                        help = "createFkCtrlJoints(num=...) values, paired with --joints (default: same values)")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--output", default = "bench_results.json")
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"))
+    parser.add_argument("--squash-report", action = "store_true",
+                        help = "compare squash network size of the perJoint and compact modes")
+    parser.add_argument("--squash-mode", default = "perJoint", choices = ("perJoint", "compact"))
+    parser.add_argument("--segment-report", action = "store_true",
+                        help = "compare one IK spline handle with IK_SEGMENTS segments")
+    parser.add_argument("--segments", nargs = "+", type = int, default = list(DEFAULT_SEGMENTS),
+                        help = "IK_SEGMENTS values for --segment-report")
+    parser.add_argument("--samples", type = int, default = 50,
+                        help = "scene evaluations per case for --segment-report")
+    parser.add_argument("--backend", default = "memory", choices = ("memory", "maya"),
+                        help = "scene for --segment-report; IK solve time is only measured by maya (mayapy)")
+    parser.add_argument("--control-drive", default = "constraint", choices = ("constraint", "matrix"),
+                        help = "how IK controls drive the curve joints in --segment-report")
+    parser.add_argument("--imports-only", action = "store_true",
+                        help = "measure module import time only, without builds")
+    parser.add_argument("--child", nargs = 3, help = argparse.SUPPRESS)
+    parser.add_argument("--child-import", help = argparse.SUPPRESS)
+    parser.add_argument("--child-segments", nargs = 3, help = argparse.SUPPRESS)
+    parser.add_argument("--profile", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        rigType, joints, fkJoints = args.child
+        print(json.dumps(measureBuild(rigType, int(joints), int(fkJoints), args.profile, args.squash_mode)))
+        return 0
+    if args.child_segments:
+        rigType, joints, segments = args.child_segments
+        print(json.dumps(measureSegments(rigType, int(joints), int(segments), args.samples, args.backend,
+                                         args.control_drive)))
+        return 0
+    if args.child_import:
+        print(json.dumps(measureImport(args.child_import)))
+        return 0
+    if args.imports_only:
+        data = {"meta": _metadata(args.repeat), "results": [], "imports": runImports(repeat = args.repeat)}
+        with open(args.output, "w") as output:
+            json.dump(data, output, indent = 2, sort_keys = True)
+        sys.stderr.write("results written to {}\n".format(args.output))
+        return 0
+    if args.squash_report:
+        for rigType in args.types:
+            sys.stdout.write("{}\n".format(rigType))
+            squashModeReport(rigType, args.joints)
+        return 0
+    if args.segment_report:
+        data = {"meta": _metadata(args.repeat), "segments": []}
+        data["meta"]["backend"] = args.backend
+        data["meta"]["controlDrive"] = args.control_drive
+        for rigType in args.types:
+            sys.stdout.write("{}\n".format(rigType))
+            data["segments"].extend(segmentReport(rigType, args.joints, args.segments, args.samples, args.backend,
+                                                  args.control_drive))
+        with open(args.output, "w") as output:
+            json.dump(data, output, indent = 2, sort_keys = True)
+        sys.stderr.write("results written to {}\n".format(args.output))
+        return 0
+    if args.compare:
+        with open(args.compare[0]) as oldFile, open(args.compare[1]) as newFile:
+            compareResults(json.load(oldFile), json.load(newFile))
+        return 0
+
+    fkCounts = args.fk_joints or [max(3, n) for n in args.joints]
+    if len(fkCounts) != len(args.joints):
+        parser.error("--fk-joints must have as many values as --joints")
+    data = runSuite(args.types, args.joints, fkCounts, args.repeat)
+    with open(args.output, "w") as output:
+        json.dump(data, output, indent = 2, sort_keys = True)
+    sys.stderr.write("results written to {}\n".format(args.output))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
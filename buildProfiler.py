@@ -0,0 +1,177 @@
+    # coding=utf-8
+import contextlib
+import functools
+import time
+
+from rigFootprint import Footprint, sceneFootprint
+from sceneBackend import WrapperBackend, getBackend, useBackend
+
+_clock = getattr(time, "perf_counter", time.time)
+
+    # Декоратор этапа сборки: если у рига включен профайлер, этап замеряется,
+    # иначе метод вызывается напрямую. После этапа риг запоминает его входные данные,
+    # если у него есть recordStage (см. TorsoRig.update)
+def buildStage(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.profiler
+        if profiler is None:
+            result = method(self, *args, **kwargs)
+        else:
+            with profiler.stage(name):
+                result = method(self, *args, **kwargs)
+        recordStage = getattr(self, "recordStage", None)
+        if recordStage is not None:
+            recordStage(name)
+        return result
+    return wrapper
+
+    # Замеры одного этапа сборки
+class StageRecord(object):
+    __slots__ = ("name", "depth", "time", "childTime", "calls", "nodesCreated", "footprint", "childFootprint")
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.time = 0.0
+        self.childTime = 0.0
+        self.calls = {}
+        self.nodesCreated = 0
+        # След, добавленный самим этапом, и след вложенных этапов (только с BuildProfiler(footprint=True))
+        self.footprint = None
+        self.childFootprint = Footprint()
+
+    def asDict(self):
+        result = {"name": self.name,
+                  "depth": self.depth,
+                  "time": self.time,
+                  "selfTime": self.time - self.childTime,
+                  "calls": dict(self.calls),
+                  "totalCalls": sum(self.calls.values()),
+                  "nodesCreated": self.nodesCreated}
+        if self.footprint is not None:
+            result["footprint"] = self.footprint.asDict()
+        return result
+
+    # Сцена-обертка, считающая вызовы команд для текущего этапа профайлера
+class ProfilingBackend(WrapperBackend):
+
+    def __init__(self, inner, profiler):
+        WrapperBackend.__init__(self, inner)
+        self.profiler = profiler
+
+    def wrap(self, command, func):
+        countCall = self.profiler.countCall
+
+        def counted(*args, **kwargs):
+            countCall(command)
+            return func(*args, **kwargs)
+
+        return counted
+
+    def applyBatch(self, command, calls):
+        self.profiler.countCall(command, len(calls))
+        return self.inner.applyBatch(command, calls)
+
+    # Расширенный метод - один вызов сцены, как и без профайлера
+    def callBulk(self, command, *args, **kwargs):
+        self.profiler.countCall(command)
+        return WrapperBackend.callBulk(self, command, *args, **kwargs)
+
+    # Профайлер сборки: время этапов, количество вызовов команд сцены и созданных нод.
+    # Время этапа включает вложенные этапы, вызовы и ноды относятся к самому вложенному этапу.
+    # С footprint=True до и после каждого этапа считается след нод, созданных за сборку (rigFootprint).
+    # Подсчет запрашивает сцену напрямую и не попадает в вызовы этапов, но замедляет сборку
+class BuildProfiler(object):
+
+    def __init__(self, footprint = False):
+        self.stages = []
+        self._stack = []
+        self.footprint = footprint
+        self._scene = None
+        self._baseline = set()
+
+    # Подключает подсчет вызовов и созданных нод к текущей сцене
+    @contextlib.contextmanager
+    def activate(self):
+        inner = getBackend()
+        callbackId = inner.addNodeAddedCallback(self.countNode)
+        self._scene = inner
+        if self.footprint:
+            self._baseline = set(inner.ls())
+        try:
+            with useBackend(ProfilingBackend(inner, self)):
+                yield self
+        finally:
+            if callbackId is not None:
+                inner.removeCallback(callbackId)
+            self._scene = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = StageRecord(name, len(self._stack))
+        self.stages.append(record)
+        self._stack.append(record)
+        before = self.currentFootprint()
+        start = _clock()
+        try:
+            yield record
+        finally:
+            record.time = _clock() - start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].childTime += record.time
+            if before is not None:
+                total = self.currentFootprint().difference(before)
+                record.footprint = total.difference(record.childFootprint)
+                if self._stack:
+                    self._stack[-1].childFootprint.add(total)
+
+    # След нод, созданных с начала замеров, None - след не считается
+    def currentFootprint(self):
+        if not self.footprint or self._scene is None:
+            return None
+        return sceneFootprint(self._scene, [name for name in self._scene.ls() if name not in self._baseline])
+
+    def countCall(self, command, count = 1):
+        if self._stack:
+            calls = self._stack[-1].calls
+            calls[command] = calls.get(command, 0) + count
+
+    def countNode(self, *args):
+        if self._stack:
+            self._stack[-1].nodesCreated += 1
+
+    # Итоговый отчет по всем этапам
+    def report(self):
+        stages = [record.asDict() for record in self.stages]
+        calls = {}
+        for record in self.stages:
+            for command, count in record.calls.items():
+                calls[command] = calls.get(command, 0) + count
+        result = {"stages": stages,
+                  "totalTime": sum(record.time for record in self.stages if record.depth == 0),
+                  "calls": calls,
+                  "totalCalls": sum(calls.values()),
+                  "nodesCreated": sum(record.nodesCreated for record in self.stages)}
+        if self.footprint:
+            total = Footprint()
+            for record in self.stages:
+                if record.footprint is not None:
+                    total.add(record.footprint)
+            result["footprint"] = total.asDict()
+        return result
+
+    # Отчет профайлера в виде текстовой таблицы
+def formatReport(report):
+    lines = ["{:<32}{:>10}{:>10}{:>8}{:>8}".format("stage", "time ms", "self ms", "calls", "nodes")]
+    for stage in report["stages"]:
+        lines.append("{:<32}{:>10.2f}{:>10.2f}{:>8}{:>8}".format("  " * stage["depth"] + stage["name"],
+                                                                   stage["time"] * 1000.0,
+                                                                   stage["selfTime"] * 1000.0,
+                                                                   stage["totalCalls"], stage["nodesCreated"]))
+    lines.append("{:<32}{:>10.2f}{:>10}{:>8}{:>8}".format("total", report["totalTime"] * 1000.0, "",
+                                                          report["totalCalls"], report["nodesCreated"]))
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+    # coding=utf-8
+import rigMath
+
+    # CV периодической окружности Maya единичного радиуса (8 секций) в плоскости XY
+CIRCLE_CVS = ((0.783612, -0.783612, 0.0), (0.0, -1.108194, 0.0), (-0.783612, -0.783612, 0.0),
+              (-1.108194, 0.0, 0.0), (-0.783612, 0.783612, 0.0), (0.0, 1.108194, 0.0),
+              (0.783612, 0.783612, 0.0), (1.108194, 0.0, 0.0))
+
+    # Шаблоны, построенные за сессию: {имя шейпа: ShapeTemplate}
+_templates = {}
+
+    # Шаблон шейпа контроллера: CV единичного размера, степень и замкнутость кривой.
+    # Масштабированные массивы CV кэшируются, поэтому одинаковые контроллеры не пересчитываются
+class ShapeTemplate(object):
+    __slots__ = ("name", "cvs", "degree", "periodic", "scaled")
+
+    def __init__(self, name, cvs, degree, periodic = False):
+        self.name = name
+        self.cvs = tuple(tuple(float(c) for c in cv) for cv in cvs)
+        self.degree = degree
+        self.periodic = periodic
+        self.scaled = {}
+
+    # CV в масштабе scale. Для периодической кривой первые degree точек повторяются в конце, как в Maya
+    def points(self, scale = 1.0):
+        points = self.scaled.get(scale)
+        if points is None:
+            points = [rigMath.vecScale(cv, scale) for cv in self.cvs]
+            if self.periodic:
+                points += points[:self.degree]
+            points = self.scaled[scale] = tuple(points)
+        return list(points)
+
+    # CV в масштабе scale, повернутые матрицей matrix (перенос не учитывается)
+    def orientedPoints(self, matrix, scale = 1.0):
+        return [rigMath.transformVector(point, matrix) for point in self.points(scale)]
+
+    # CV в масштабе scale, перенесенные матрицей matrix вместе с переносом
+    def transformedPoints(self, matrix, scale = 1.0):
+        return [rigMath.transformPoint(point, matrix) for point in self.points(scale)]
+
+    # Окружность единичного радиуса с нормалью normal
+def circleCvs(normal):
+    normal = rigMath.vecNormalize(normal)
+    if abs(normal[2]) > 1.0 - rigMath.EPSILON:
+        return list(CIRCLE_CVS)
+    xAxis = rigMath.vecNormalize(rigMath.vecCross((0.0, 0.0, 1.0), normal))
+    yAxis = rigMath.vecCross(normal, xAxis)
+    return [rigMath.vecAdd(rigMath.vecScale(xAxis, cv[0]), rigMath.vecScale(yAxis, cv[1])) for cv in CIRCLE_CVS]
+
+    # Шаблон шейпа по описанию из библиотеки контроллеров. Строится один раз за сессию
+def shapeTemplate(name, description):
+    template = _templates.get(name)
+    if template is None:
+        if "normal" in description:
+            template = ShapeTemplate(name, circleCvs(description["normal"]), 3, periodic = True)
+        else:
+            template = ShapeTemplate(name, description["cvsList"], description["degree"])
+        _templates[name] = template
+    return template
@@ -0,0 +1,364 @@
+    # coding=utf-8
+    # Анализ графа зависимостей собранного сетапа без Maya: по файлу rigGraph, записи операций
+    # (RecordingBackend.save) или текущей сцене. Считает ноды по типам, точки большого ветвления
+    # и схождения связей, самую длинную цепочку зависимостей и циклы, и отмечает конструкции,
+    # которые мешают параллельному вычислению в Maya (Evaluation Manager).
+    #
+    #   python graphAnalysis.py torso.rgrf
+    #   python graphAnalysis.py builds/wolf.json --output wolf_graph.json --fail-on cycle untrustedNode
+    #
+    # Код возврата 1, если найдены проблемы из --fail-on: так отчет можно использовать для приемки ассетов
+import argparse
+import json
+import sys
+
+import rigGraph
+from sceneBackend import cmds, loadRecording, useBackend
+
+    # Порог ветвления: сколько приемников у одного атрибута и сколько входящих связей у одной ноды
+FAN_OUT_LIMIT = 16
+FAN_IN_LIMIT = 16
+    # Порог длины цепочки зависимостей (в нодах)
+DEPTH_LIMIT = 64
+    # Сколько самых нагруженных атрибутов и нод попадает в отчет
+TOP_COUNT = 10
+
+    # Типы нод, которые Evaluation Manager не считает безопасными для параллельного вычисления
+    # и вычисляет последовательно
+UNTRUSTED_TYPES = ("expression", "script", "unknown", "unknownDag", "unknownTransform")
+    # Ноды, которые читают входы в другие моменты времени, а не в текущем кадре
+TIME_SHIFT_TYPES = ("frameCache",)
+
+    # Ноды, которые Maya размещает под управляемой нодой: их положение в иерархии не зависимость
+CHILD_EXEMPT_TYPES = ("parentConstraint", "pointConstraint", "orientConstraint", "aimConstraint",
+                      "scaleConstraint", "ikEffector")
+    # Атрибуты-ссылки и настройки отображения слоя: связь через них не участвует в вычислении кадра
+REFERENCE_ATTRS = ("message", "handlePath", "drawInfo")
+
+    # Коды проблем отчета
+HAZARDS = {"cycle": "dependency cycle, the whole cluster is evaluated serially",
+           "untrustedNode": "node type is not trusted by the parallel evaluator and is evaluated serially",
+           "timeShift": "node pulls its inputs at other frames, outside the current evaluation",
+           "fanOut": "one plug drives many nodes, every change dirties all of them",
+           "fanIn": "many inputs converge on one node, a synchronization point for parallel evaluation",
+           "unitConversion": "implicit conversion node on a connection",
+           "deepChain": "long serial dependency chain limits parallel speedup"}
+
+    # Граф зависимостей сетапа: ноды, связи атрибутов и иерархия. Мировая матрица потомка зависит
+    # от родителя, поэтому иерархия - тоже ребра зависимостей
+class DependencyGraph(object):
+
+    def __init__(self):
+        # {имя: тип}
+        self.nodes = {}
+        self.order = []
+        # [(нода источника, атрибут, нода приемника, атрибут)]
+        self.edges = []
+        # {потомок: родитель}
+        self.parents = {}
+
+    def addNode(self, name, nodeType, parent = None):
+        if name not in self.nodes:
+            self.order.append(name)
+        self.nodes[name] = nodeType
+        if parent is not None:
+            self.parents[name] = parent
+
+    def connect(self, src, srcAttr, dst, dstAttr):
+        self.edges.append((src, srcAttr, dst, dstAttr))
+
+    # {нода: множество нод, которые от нее зависят}, по связям и иерархии. Не создают зависимостей между
+    # нодами связи атрибутов одной ноды, ссылки (REFERENCE_ATTRS) и связи управляемой ноды с ее ограничением:
+    # ограничение читает только матрицу родителя управляемой ноды
+    def dependents(self):
+        result = dict((name, set()) for name in self.order)
+        for src, srcAttr, dst, dstAttr in self.edges:
+            if src == dst or src not in result or dst not in result or srcAttr.split("[")[0] in REFERENCE_ATTRS:
+                continue
+            if self.parents.get(dst) == src and self.nodes[dst] in CHILD_EXEMPT_TYPES:
+                continue
+            result[src].add(dst)
+        for child, parent in self.parents.items():
+            if parent in result and child in result and self.nodes[child] not in CHILD_EXEMPT_TYPES:
+                result[parent].add(child)
+        return result
+
+    # Граф из файла rigGraph. Связи, которые делает сама команда создания ноды (цели ограничений, джоинты
+    # ikHandle, влияния скина), в файле не хранятся и восстанавливаются по записям этих нод
+def graphFromFile(path):
+    graph = DependencyGraph()
+    with rigGraph.RigGraph(path) as source:
+        nodes = source.nodes()
+        names = [name for name, nodeType, parent, kind in nodes]
+        for name, nodeType, parent, kind in nodes:
+            graph.addNode(name, nodeType, names[parent] if parent >= 0 else None)
+        string = source.string
+        for src, srcAttr, dst, dstAttr in source.records("CONN"):
+            graph.connect(names[src], string(srcAttr), names[dst], string(dstAttr))
+        for constraint, target, driven in source.records("CONS"):
+            graph.connect(names[target], "worldMatrix", names[constraint], "target.targetParentMatrix")
+            for attr in ("translate", "rotate"):
+                graph.connect(names[constraint], "constraint" + attr[0].upper() + attr[1:], names[driven], attr)
+        for handle, effector, start, end, curve in source.records("IKHD"):
+            graph.connect(names[start], "message", names[handle], "startJoint")
+            graph.connect(names[effector], "handlePath", names[handle], "endEffector")
+            graph.connect(names[curve], "worldSpace", names[handle], "inCurve")
+            graph.connect(names[end], "translate", names[effector], "translate")
+            _connectIkChain(graph, names[handle], names[start], names[end])
+        for info, curve in source.records("CINF"):
+            graph.connect(names[curve], "worldSpace", names[info], "inputCurve")
+        for skin, shape, influences, firstInfluence, points, firstWeight in source.records("SKIN"):
+            for n, (influence,) in enumerate(source.records("INFL", firstInfluence, influences)):
+                graph.connect(names[influence], "worldMatrix", names[skin], "matrix[{}]".format(n))
+            graph.connect(names[skin], "outputGeometry", names[shape], "create")
+    return graph
+
+    # Граф текущей сцены: ноды под roots и связанные с ними DG-ноды (без roots - вся сцена).
+    # Служебные ноды и промежуточные шейпы пропускаются, как при экспорте в rigGraph
+def graphFromScene(roots = None):
+    graph = DependencyGraph()
+
+    def include(name):
+        if cmds.nodeType(name) in rigGraph.SKIP_TYPES:
+            return False
+        if not cmds.ls(name, dag = True):
+            return True
+        try:
+            return not cmds.getAttr("{}.intermediateObject".format(name))
+        except ValueError:
+            return True
+
+    if roots is None:
+        pending = [name for name in cmds.ls() if include(name)]
+        for name in pending:
+            parents = cmds.listRelatives(name, parent = True) or []
+            graph.addNode(name, cmds.nodeType(name), parents[0] if parents else None)
+    else:
+        stack = [(root, None) for root in reversed(roots)]
+        while stack:
+            name, parent = stack.pop()
+            graph.addNode(name, cmds.nodeType(name), parent)
+            children = [child for child in cmds.listRelatives(name, children = True) or [] if include(child)]
+            stack.extend((child, name) for child in reversed(children))
+        pending = list(graph.order)
+        while pending:
+            name = pending.pop(0)
+            for other in cmds.listConnections(name) or []:
+                other = other.split("|")[-1]
+                if other in graph.nodes or not include(other) or cmds.ls(other, dag = True):
+                    continue
+                graph.addNode(other, cmds.nodeType(other))
+                pending.append(other)
+
+    for name in graph.order:
+        pairs = cmds.listConnections(name, source = True, destination = False, connections = True,
+                                     plugs = True) or []
+        for own, other in zip(pairs[::2], pairs[1::2]):
+            srcNode, srcAttr = rigGraph._splitPlug(other)
+            if srcNode in graph.nodes:
+                graph.connect(srcNode, srcAttr, name, rigGraph._splitPlug(own)[1])
+        if graph.nodes[name] == "ikHandle":
+            effector = rigGraph._source(name, "endEffector")
+            end = [x for x in cmds.listConnections(effector, source = True, destination = False) or []
+                   if cmds.nodeType(x) == "joint"][0]
+            _connectIkChain(graph, name, rigGraph._source(name, "startJoint"), end.split("|")[-1])
+    return graph
+
+    # Решатель ikHandle поворачивает джоинты от конечного до начального без связей в графе:
+    # зависимость добавляется явно
+def _connectIkChain(graph, handle, start, end):
+    joint = end
+    while joint is not None:
+        graph.connect(handle, "ikSolve", joint, "rotate")
+        if joint == start:
+            break
+        joint = graph.parents.get(joint)
+
+    # Граф из записи операций: запись воспроизводится в сцене в памяти
+def graphFromRecording(path):
+    from memoryBackend import MemoryBackend
+    scene = MemoryBackend()
+    loadRecording(path).replay(scene)
+    with useBackend(scene):
+        return graphFromScene()
+
+    # Граф по пути к файлу: запись операций (.json) или rigGraph
+def loadDependencyGraph(path):
+    if path.endswith(".json"):
+        return graphFromRecording(path)
+    return graphFromFile(path)
+
+    # Компоненты сильной связности (алгоритм Тарьяна без рекурсии) в порядке, обратном топологическому
+def _components(order, dependents):
+    index = {}
+    low = {}
+    onStack = set()
+    stack = []
+    components = []
+    for root in order:
+        if root in index:
+            continue
+        work = [(root, iter(sorted(dependents[root])))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        onStack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    onStack.add(child)
+                    work.append((child, iter(sorted(dependents[child]))))
+                    advanced = True
+                    break
+                elif child in onStack:
+                    low[node] = min(low[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    onStack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+    # Самая длинная цепочка зависимостей. Цикл считается одним звеном длиной в количество его нод
+def _longestChain(components, dependents):
+    owner = {}
+    for n, component in enumerate(components):
+        for member in component:
+            owner[member] = n
+    # Компоненты идут от стоков к истокам: все зависимые компоненты уже посчитаны
+    length = [0] * len(components)
+    following = [None] * len(components)
+    for n, component in enumerate(components):
+        best = 0
+        for member in component:
+            for child in dependents[member]:
+                other = owner[child]
+                if other != n and length[other] > best:
+                    best = length[other]
+                    following[n] = other
+        length[n] = best + len(component)
+    if not components:
+        return []
+    current = max(range(len(components)), key = lambda n: length[n])
+    chain = []
+    while current is not None:
+        chain.extend(sorted(components[current]))
+        current = following[current]
+    return chain
+
+    # Отчет анализа графа: словарь, который можно сохранить в JSON
+def analyzeGraph(graph, fanOutLimit = FAN_OUT_LIMIT, fanInLimit = FAN_IN_LIMIT, depthLimit = DEPTH_LIMIT,
+                 top = TOP_COUNT):
+    nodeTypes = {}
+    for name in graph.order:
+        nodeType = graph.nodes[name]
+        nodeTypes[nodeType] = nodeTypes.get(nodeType, 0) + 1
+
+    fanOut = {}
+    fanIn = {}
+    for src, srcAttr, dst, dstAttr in graph.edges:
+        if srcAttr.split("[")[0] in REFERENCE_ATTRS:
+            continue
+        plug = "{}.{}".format(src, srcAttr)
+        fanOut[plug] = fanOut.get(plug, 0) + 1
+        fanIn[dst] = fanIn.get(dst, 0) + 1
+
+    dependents = graph.dependents()
+    components = _components(graph.order, dependents)
+    cycles = [sorted(component) for component in reversed(components) if len(component) > 1]
+    chain = _longestChain(components, dependents)
+
+    hazards = []
+    for cycle in cycles:
+        hazards.append({"code": "cycle", "node": cycle[0], "detail": "{} nodes: {}".format(len(cycle),
+                                                                                         ", ".join(cycle))})
+    for name in graph.order:
+        nodeType = graph.nodes[name]
+        if nodeType in UNTRUSTED_TYPES:
+            hazards.append({"code": "untrustedNode", "node": name, "detail": nodeType})
+        elif nodeType in TIME_SHIFT_TYPES:
+            hazards.append({"code": "timeShift", "node": name, "detail": nodeType})
+        elif nodeType == "unitConversion":
+            hazards.append({"code": "unitConversion", "node": name, "detail": nodeType})
+    for plug, count in sorted(fanOut.items()):
+        if count > fanOutLimit:
+            hazards.append({"code": "fanOut", "node": plug.split(".", 1)[0],
+                            "detail": "{} drives {} plugs".format(plug, count)})
+    for name in graph.order:
+        if fanIn.get(name, 0) > fanInLimit:
+            hazards.append({"code": "fanIn", "node": name, "detail": "{} incoming connections".format(fanIn[name])})
+    if len(chain) > depthLimit:
+        hazards.append({"code": "deepChain", "node": chain[0],
+                        "detail": "{} nodes from {} to {}".format(len(chain), chain[0], chain[-1])})
+
+    hazardCounts = {}
+    for hazard in hazards:
+        hazardCounts[hazard["code"]] = hazardCounts.get(hazard["code"], 0) + 1
+    byCount = lambda item: (-item[1], item[0])
+    return {"nodes": len(graph.order),
+            "connections": len(graph.edges),
+            "nodeTypes": nodeTypes,
+            "fanOut": [{"plug": plug, "count": count} for plug, count in sorted(fanOut.items(), key = byCount)[:top]],
+            "fanIn": [{"node": name, "count": count} for name, count in sorted(fanIn.items(), key = byCount)[:top]],
+            "depth": len(chain),
+            "chain": chain,
+            # Сколько нод в среднем можно вычислять одновременно при идеальном расписании
+            "parallelism": len(graph.order) / float(len(chain)) if chain else 0.0,
+            "cycles": cycles,
+            "hazards": hazards,
+            "hazardCounts": hazardCounts}
+
+    # Краткий текстовый отчет
+def formatReport(report, log = sys.stdout):
+    log.write("{} nodes, {} connections, chain depth {}, parallelism {:.1f}\n".format(
+        report["nodes"], report["connections"], report["depth"], report["parallelism"]))
+    for nodeType, count in sorted(report["nodeTypes"].items(), key = lambda item: (-item[1], item[0])):
+        log.write("  {:<24}{:>6}\n".format(nodeType, count))
+    log.write("fan-out\n")
+    for entry in report["fanOut"]:
+        log.write("  {:<56}{:>6}\n".format(entry["plug"], entry["count"]))
+    log.write("fan-in\n")
+    for entry in report["fanIn"]:
+        log.write("  {:<56}{:>6}\n".format(entry["node"], entry["count"]))
+    for hazard in report["hazards"]:
+        log.write("{:<16}{:<40}{}\n".format(hazard["code"], hazard["node"], hazard["detail"]))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Evaluation cost report for built rig graphs")
+    parser.add_argument("paths", nargs = "+", help = "rigGraph files or recordings (.json)")
+    parser.add_argument("--output", default = None, help = "write the reports to a JSON file")
+    parser.add_argument("--fail-on", nargs = "*", default = ["cycle", "untrustedNode"], choices = sorted(HAZARDS),
+                        help = "hazards that make the exit code 1")
+    parser.add_argument("--fan-out-limit", type = int, default = FAN_OUT_LIMIT)
+    parser.add_argument("--fan-in-limit", type = int, default = FAN_IN_LIMIT)
+    parser.add_argument("--depth-limit", type = int, default = DEPTH_LIMIT)
+    args = parser.parse_args(argv)
+
+    reports = {}
+    failed = False
+    for path in args.paths:
+        report = reports[path] = analyzeGraph(loadDependencyGraph(path), args.fan_out_limit, args.fan_in_limit,
+                                              args.depth_limit)
+        sys.stdout.write("{}\n".format(path))
+        formatReport(report)
+        failed = failed or any(hazard["code"] in args.fail_on for hazard in report["hazards"])
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(reports, output, indent = 2, sort_keys = True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
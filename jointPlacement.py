@@ -0,0 +1,318 @@
+    # coding=utf-8
+import bisect
+
+import rigMath
+
+    # numpy загружается при первом расчете, а не при импорте модуля. None - numpy недоступен
+    # или отключен (jointPlacement.numpy = None до первого расчета)
+_NOT_LOADED = object()
+numpy = _NOT_LOADED
+
+def _loadNumpy():
+    global numpy
+    if numpy is _NOT_LOADED:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+    # Способы распределения джоинтов вдоль кривой:
+    # "uniform" - равный шаг параметра на каждом участке между направляющими,
+    # "arcLength" - равные расстояния вдоль кривой
+SPACING_MODES = ("uniform", "arcLength")
+
+    # Количество точек на участок кривой при расчете длины дуги
+ARC_SAMPLES = 32
+
+    # Затухание веса между соседними влияниями скина (см. curveSkinWeights):
+    # "linear" - линейное, "smooth" и "smoother" - с плавным началом и концом
+FALLOFF_MODES = ("linear", "smooth", "smoother")
+
+    # Точки, через которые проходит кривая: начало, промежуточные направляющие, конец
+def controlPoints(start, end, guides = None):
+    return [tuple(float(c) for c in p) for p in [start] + list(guides or ()) + [end]]
+
+    # Точки кривой Catmull-Rom, проходящей через points, для параметров params в диапазоне [0, 1].
+    # Крайние точки отражаются, поэтому для двух точек кривая совпадает с отрезком
+def splinePoints(points, params):
+    if _loadNumpy() is not None:
+        return _splinePointsNumpy(points, params)
+    count = len(points) - 1
+    padded = _padPoints(points)
+    result = []
+    for t in params:
+        segment, u = _segment(t, count)
+        p0, p1, p2, p3 = padded[segment:segment + 4]
+        weights = _catmullRomWeights(u)
+        result.append(tuple(sum(w * p[c] for w, p in zip(weights, (p0, p1, p2, p3))) for c in range(3)))
+    return result
+
+def _padPoints(points):
+    first = rigMath.vecSub(rigMath.vecScale(points[0], 2.0), points[1])
+    last = rigMath.vecSub(rigMath.vecScale(points[-1], 2.0), points[-2])
+    return [first] + list(points) + [last]
+
+def _segment(t, count):
+    scaled = min(max(float(t), 0.0), 1.0) * count
+    segment = min(int(scaled), count - 1)
+    return segment, scaled - segment
+
+def _catmullRomWeights(u):
+    return (0.5 * (-u + 2 * u * u - u ** 3),
+            0.5 * (2 - 5 * u * u + 3 * u ** 3),
+            0.5 * (u + 4 * u * u - 3 * u ** 3),
+            0.5 * (-u * u + u ** 3))
+
+def _splinePointsNumpy(points, params):
+    padded = numpy.asarray(_padPoints(points), dtype = float)
+    count = len(points) - 1
+    scaled = numpy.clip(numpy.asarray(params, dtype = float), 0.0, 1.0) * count
+    segment = numpy.minimum(scaled.astype(int), count - 1)
+    u = scaled - segment
+    weights = numpy.stack([0.5 * (-u + 2 * u * u - u ** 3),
+                           0.5 * (2 - 5 * u * u + 3 * u ** 3),
+                           0.5 * (u + 4 * u * u - 3 * u ** 3),
+                           0.5 * (-u * u + u ** 3)], axis = 1)
+    corners = padded[segment[:, None] + numpy.arange(4)[None, :]]
+    return numpy.einsum("nk,nkc->nc", weights, corners)
+
+    # Параметры кривой для count точек на равных расстояниях вдоль нее
+def arcLengthParams(points, count, samples = ARC_SAMPLES):
+    total = samples * (len(points) - 1)
+    if _loadNumpy() is not None:
+        dense = numpy.linspace(0.0, 1.0, total + 1)
+        positions = _splinePointsNumpy(points, dense)
+        lengths = numpy.concatenate([[0.0], numpy.cumsum(numpy.linalg.norm(numpy.diff(positions, axis = 0),
+                                                                            axis = 1))])
+        targets = numpy.linspace(0.0, lengths[-1], count)
+        return numpy.interp(targets, lengths, dense)
+    dense = [float(n) / total for n in range(total + 1)]
+    positions = splinePoints(points, dense)
+    lengths = [0.0]
+    for n in range(total):
+        lengths.append(lengths[-1] + rigMath.vecLength(rigMath.vecSub(positions[n + 1], positions[n])))
+    params = []
+    index = 0
+    for n in range(count):
+        target = lengths[-1] * n / float(count - 1) if count > 1 else 0.0
+        while index < total - 1 and lengths[index + 1] < target:
+            index += 1
+        span = lengths[index + 1] - lengths[index]
+        local = (target - lengths[index]) / span if span > 0 else 0.0
+        params.append(dense[index] + (dense[index + 1] - dense[index]) * min(max(local, 0.0), 1.0))
+    return params
+
+    # Ориентации джоинтов: aimAxis смотрит на следующий джоинт, upAxis по возможности вдоль up.
+    # Последний джоинт повторяет ориентацию предыдущего, как после orientJoint в Maya
+def aimRotations(positions, up = (1.0, 0.0, 0.0), aimAxis = "x", upAxis = "z"):
+    count = len(positions)
+    if count < 2:
+        return [rigMath.identityMatrix() for _ in range(count)]
+    if _loadNumpy() is not None:
+        return _aimRotationsNumpy(numpy.asarray(positions, dtype = float), up, aimAxis, upAxis)
+    rotations = []
+    for n in range(count - 1):
+        rotations.append(rigMath.aimMatrix(rigMath.vecSub(positions[n + 1], positions[n]), up, aimAxis, upAxis))
+    rotations.append(list(rotations[-1]))
+    return rotations
+
+def _aimRotationsNumpy(positions, up, aimAxis, upAxis):
+    aims = numpy.diff(positions, axis = 0)
+    aims /= numpy.maximum(numpy.linalg.norm(aims, axis = 1), rigMath.EPSILON)[:, None]
+    upVector = numpy.asarray(up, dtype = float)
+    ups = upVector[None, :] - aims * numpy.dot(aims, upVector)[:, None]
+    # Вектор вверх параллелен направлению: берем любую перпендикулярную ось, как rigMath.aimMatrix
+    degenerate = numpy.linalg.norm(ups, axis = 1) < 1e-6
+    if degenerate.any():
+        fallback = numpy.where(numpy.abs(aims[degenerate, 2:3]) < 0.9, [[0.0, 0.0, 1.0]], [[1.0, 0.0, 0.0]])
+        ups[degenerate] = fallback - aims[degenerate] * numpy.sum(fallback * aims[degenerate], axis = 1)[:, None]
+    ups /= numpy.linalg.norm(ups, axis = 1)[:, None]
+    a, u = rigMath.AXIS_INDEX[aimAxis], rigMath.AXIS_INDEX[upAxis]
+    axes = [None, None, None]
+    axes[a] = aims
+    axes[u] = ups
+    axes[3 - a - u] = numpy.cross(aims, ups) if (a + 1) % 3 == u else numpy.cross(ups, aims)
+    rotations = numpy.zeros((len(positions), 4, 4))
+    rotations[:-1, :3, :3] = numpy.stack(axes, axis = 1)
+    rotations[-1] = rotations[-2]
+    rotations[:, 3, 3] = 1.0
+    return [list(m) for m in rotations.reshape(len(positions), 16)]
+
+    # Позиции и мировые ориентации count джоинтов от start до end через направляющие guides
+def placeJoints(start, end, count, guides = None, spacing = "uniform", up = (1.0, 0.0, 0.0),
+                aimAxis = "x", upAxis = "z"):
+    if spacing not in SPACING_MODES:
+        raise ValueError("Unknown spacing mode: {}".format(spacing))
+    points = controlPoints(start, end, guides)
+    if spacing == "arcLength" and len(points) > 2:
+        params = arcLengthParams(points, count)
+    else:
+        params = [n / float(count - 1) if count > 1 else 0.0 for n in range(count)]
+    positions = [tuple(float(c) for c in p) for p in splinePoints(points, params)]
+    return positions, aimRotations(positions, up, aimAxis, upAxis)
+
+    # Локальные translate и jointOrient (в градусах) для цепочки джоинтов по мировым позициям и ориентациям.
+    # Без ориентаций джоинты считаются независимыми (не цепочкой) и получают мировые позиции.
+    # parentMatrix - мировая матрица родителя первого джоинта, если он не в корне сцены
+def chainLocalTransforms(positions, rotations = None, parentMatrix = None):
+    if rotations is None:
+        return [tuple(p) for p in positions], [(0.0, 0.0, 0.0) for _ in positions]
+    if _loadNumpy() is not None:
+        translations, orients = _chainLocalTransformsNumpy(positions, rotations)
+    else:
+        translations, orients = _chainLocalTransformsPython(positions, rotations)
+    if parentMatrix is not None:
+        parentRotation = rigMath.rotationPart(parentMatrix)
+        translations[0] = rigMath.transformPoint(positions[0], rigMath.inverseMatrix(parentMatrix))
+        orients[0] = rigMath.matrixToEuler(rigMath.multMatrix(rotations[0], rigMath.inverseMatrix(parentRotation)), 0)
+    return translations, orients
+
+def _chainLocalTransformsPython(positions, rotations):
+    translations = [tuple(positions[0])]
+    orients = [rigMath.matrixToEuler(rotations[0], 0)]
+    for n in range(1, len(positions)):
+        parentInverse = rigMath.inverseMatrix(rigMath.multMatrix(rotations[n - 1],
+                                                                 rigMath.translationMatrix(positions[n - 1])))
+        translations.append(rigMath.transformPoint(positions[n], parentInverse))
+        orients.append(rigMath.matrixToEuler(rigMath.multMatrix(rotations[n], rigMath.inverseMatrix(rotations[n - 1])), 0))
+    return translations, orients
+
+def _chainLocalTransformsNumpy(positions, rotations):
+    positions = numpy.asarray(positions, dtype = float)
+    matrices = numpy.asarray(rotations, dtype = float).reshape(len(positions), 4, 4)[:, :3, :3]
+    relative = numpy.empty_like(matrices)
+    relative[0] = matrices[0]
+    relative[1:] = numpy.einsum("nij,nkj->nik", matrices[1:], matrices[:-1])
+    translations = numpy.empty_like(positions)
+    translations[0] = positions[0]
+    translations[1:] = numpy.einsum("nj,nkj->nk", positions[1:] - positions[:-1], matrices[:-1])
+    # Углы Эйлера для порядка xyz (см. rigMath.matrixToEuler)
+    sinY = numpy.clip(-relative[:, 0, 2], -1.0, 1.0)
+    orients = numpy.degrees(numpy.stack([numpy.arctan2(relative[:, 1, 2], relative[:, 2, 2]),
+                                         numpy.arcsin(sinY),
+                                         numpy.arctan2(relative[:, 0, 1], relative[:, 0, 0])], axis = 1))
+    return [tuple(t) for t in translations.tolist()], [tuple(o) for o in orients.tolist()]
+
+    # Переносит точки, заданные относительно старой цепочки джоинтов, на новую цепочку.
+    # Каждая точка привязывается к ближайшему отрезку старой цепочки и сохраняет смещение от него
+def remapPoints(points, oldChain, newChain):
+    result = []
+    for point in points:
+        best = None
+        for n in range(len(oldChain) - 1):
+            segment = rigMath.vecSub(oldChain[n + 1], oldChain[n])
+            lengthSq = rigMath.vecDot(segment, segment)
+            t = rigMath.vecDot(rigMath.vecSub(point, oldChain[n]), segment) / lengthSq if lengthSq > 0 else 0.0
+            # Крайние отрезки продолжаются за концы цепочки
+            if n > 0:
+                t = max(t, 0.0)
+            if n < len(oldChain) - 2:
+                t = min(t, 1.0)
+            closest = rigMath.vecLerp(oldChain[n], oldChain[n + 1], t)
+            distance = rigMath.vecLength(rigMath.vecSub(point, closest))
+            if best is None or distance < best[0]:
+                best = (distance, n, t, rigMath.vecSub(point, closest))
+        if best is None:
+            result.append(tuple(point))
+            continue
+        distance, n, t, offset = best
+        result.append(tuple(rigMath.vecAdd(rigMath.vecLerp(newChain[n], newChain[n + 1], t), offset)))
+    return result
+
+    # Доля следующего влияния для положения t в [0, 1] между двумя влияниями. Принимает и массивы numpy
+def falloffWeight(t, mode = "smooth"):
+    if mode == "linear":
+        return t
+    if mode == "smooth":
+        return t * t * (3.0 - 2.0 * t)
+    if mode == "smoother":
+        return t * t * t * (t * (6.0 * t - 15.0) + 10.0)
+    raise ValueError("Unknown falloff mode: {}".format(mode))
+
+    # Параметры вершин ломаной в диапазоне [0, 1] по накопленной длине
+def polylineParams(points):
+    lengths = [0.0]
+    for n in range(len(points) - 1):
+        lengths.append(lengths[-1] + rigMath.vecLength(rigMath.vecSub(points[n + 1], points[n])))
+    return [length / lengths[-1] if lengths[-1] > 0 else 0.0 for length in lengths]
+
+    # Параметр (как в polylineParams) ближайшей к point точки ломаной
+def closestPolylineParam(points, point, params = None):
+    params = params or polylineParams(points)
+    best = None
+    for n in range(len(points) - 1):
+        segment = rigMath.vecSub(points[n + 1], points[n])
+        lengthSq = rigMath.vecDot(segment, segment)
+        t = rigMath.vecDot(rigMath.vecSub(point, points[n]), segment) / lengthSq if lengthSq > 0 else 0.0
+        t = min(max(t, 0.0), 1.0)
+        distance = rigMath.vecLength(rigMath.vecSub(point, rigMath.vecLerp(points[n], points[n + 1], t)))
+        if best is None or distance < best[0]:
+            best = (distance, params[n] + (params[n + 1] - params[n]) * t)
+    return best[1] if best is not None else 0.0
+
+    # Веса скина для CV кривой points, строки в порядке drivers (позиции влияний).
+    # Параметр CV и влияний - положение вдоль ломаной CV: каждая CV делится между двумя соседними
+    # вдоль кривой влияниями по затуханию falloff, CV за крайними влияниями целиком принадлежат им.
+    # Веса зависят только от позиций, поэтому повторная сборка дает те же значения
+def curveSkinWeights(points, drivers, falloff = "smooth"):
+    params = polylineParams(points)
+    driverParams = [closestPolylineParam(points, driver, params) for driver in drivers]
+    order = sorted(range(len(drivers)), key = lambda n: (driverParams[n], n))
+    driverParams = [driverParams[n] for n in order]
+    if len(drivers) < 2:
+        return [[1.0] * len(drivers) for _ in params]
+    if _loadNumpy() is not None:
+        return _curveSkinWeightsNumpy(params, driverParams, order, falloff)
+    weights = []
+    for u in params:
+        u = min(max(u, driverParams[0]), driverParams[-1])
+        k = min(max(bisect.bisect_right(driverParams, u) - 1, 0), len(drivers) - 2)
+        gap = driverParams[k + 1] - driverParams[k]
+        weight = falloffWeight((u - driverParams[k]) / gap if gap > 0 else 1.0, falloff)
+        row = [0.0] * len(drivers)
+        row[order[k]] += 1.0 - weight
+        row[order[k + 1]] += weight
+        weights.append(row)
+    return weights
+
+def _curveSkinWeightsNumpy(params, driverParams, order, falloff):
+    driverParams = numpy.asarray(driverParams, dtype = float)
+    order = numpy.asarray(order)
+    u = numpy.clip(numpy.asarray(params, dtype = float), driverParams[0], driverParams[-1])
+    k = numpy.clip(numpy.searchsorted(driverParams, u, side = "right") - 1, 0, len(driverParams) - 2)
+    gap = driverParams[k + 1] - driverParams[k]
+    t = numpy.where(gap > 0, (u - driverParams[k]) / numpy.where(gap > 0, gap, 1.0), 1.0)
+    weight = falloffWeight(t, falloff)
+    rows = numpy.arange(len(u))
+    weights = numpy.zeros((len(u), len(driverParams)))
+    numpy.add.at(weights, (rows, order[k]), 1.0 - weight)
+    numpy.add.at(weights, (rows, order[k + 1]), weight)
+    return weights.tolist()
+
+    # Кадры, сдвинутые от кадров frames (мировые матрицы) на смещения offsets в их локальных осях.
+    # Ориентация каждого кадра сохраняется
+def offsetFrames(frames, offsets):
+    if frames and _loadNumpy() is not None:
+        matrices = numpy.asarray(frames, dtype = float).reshape(len(frames), 4, 4)
+        shifted = matrices.copy()
+        shifted[:, 3, :3] += numpy.einsum("nj,njk->nk", numpy.asarray(offsets, dtype = float), matrices[:, :3, :3])
+        return shifted.reshape(len(frames), 16).tolist()
+    result = []
+    for frame, offset in zip(frames, offsets):
+        shifted = list(frame)
+        shifted[12:15] = rigMath.transformPoint(offset, frame)
+        result.append(shifted)
+    return result
+
+    # Отражение мировых матриц matrices относительно плоскости, перпендикулярной оси axis, с сохранением
+    # правой системы координат (как mirrorJoint с mirrorBehavior): позиция отражается, оси кадра
+    # отражаются и разворачиваются. Для всех матриц это одно поэлементное умножение на маску знаков
+def mirrorFrames(matrices, axis = "x"):
+    signs = [-1.0 if n == rigMath.AXIS_INDEX[axis] else 1.0 for n in range(3)] + [1.0]
+    mask = [(signs[col] if row == 3 else -signs[col]) for row in range(4) for col in range(4)]
+    mask[15] = 1.0
+    if _loadNumpy() is not None:
+        return (numpy.asarray(matrices, dtype = float).reshape(len(matrices), 16) * mask).tolist()
+    return [[value * sign for value, sign in zip(matrix, mask)] for matrix in matrices]
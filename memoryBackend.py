@@ -0,0 +1,1212 @@
+    # coding=utf-8
+import math
+import re
+import types
+
+import rigMath
+from sceneBackend import SceneBackend
+
+    # Составные атрибуты, которые раскладываются на компоненты X, Y, Z
+COMPOUND_ATTRS = {}
+for _compound in ("translate", "rotate", "scale", "jointOrient", "rotatePivot", "scalePivot",
+                  "input1", "input2", "output", "dWorldUpVector", "dWorldUpVectorEnd", "constraintTranslate",
+                  "constraintRotate"):
+    COMPOUND_ATTRS[_compound] = tuple(_compound + axis for axis in "XYZ")
+COMPOUND_PARENTS = dict((child, compound) for compound, children in COMPOUND_ATTRS.items() for child in children)
+
+    # Короткие имена атрибутов
+SHORT_ATTRS = {"t": "translate", "r": "rotate", "s": "scale", "tx": "translateX", "ty": "translateY",
+               "tz": "translateZ", "rx": "rotateX", "ry": "rotateY", "rz": "rotateZ", "sx": "scaleX",
+               "sy": "scaleY", "sz": "scaleZ", "v": "visibility", "ro": "rotateOrder", "jo": "jointOrient",
+               "rp": "rotatePivot", "sp": "scalePivot", "opm": "offsetParentMatrix"}
+
+    # Атрибуты, которые Maya вычисляет из иерархии, а не хранит
+MATRIX_ATTRS = ("matrix", "worldMatrix", "worldInverseMatrix", "parentMatrix", "parentInverseMatrix")
+
+    # Типы узлов, которые являются трансформами, и типы шейпов
+TRANSFORM_TYPES = ("transform", "joint")
+SHAPE_TYPES = ("nurbsCurve", "locator", "mesh")
+DAG_TYPES = TRANSFORM_TYPES + SHAPE_TYPES + ("ikHandle", "ikEffector", "parentConstraint")
+
+    # Ноды истории построения, которые удаляются вместе с последним шейпом, который они создают
+HISTORY_TYPES = ("makeNurbCircle",)
+
+    # Атрибуты трансформа, которые по умолчанию доступны для анимации
+KEYABLE_TRANSFORM_ATTRS = ("translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ",
+                           "scaleX", "scaleY", "scaleZ", "visibility")
+
+    # Значения атрибутов по умолчанию для типов узлов
+_TRANSFORM_DEFAULTS = {"translateX": 0.0, "translateY": 0.0, "translateZ": 0.0,
+                       "rotateX": 0.0, "rotateY": 0.0, "rotateZ": 0.0,
+                       "scaleX": 1.0, "scaleY": 1.0, "scaleZ": 1.0,
+                       "rotatePivotX": 0.0, "rotatePivotY": 0.0, "rotatePivotZ": 0.0,
+                       "scalePivotX": 0.0, "scalePivotY": 0.0, "scalePivotZ": 0.0,
+                       "rotateOrder": 0, "visibility": 1, "inheritsTransform": 1,
+                       "overrideEnabled": 0, "overrideColor": 0}
+NODE_DEFAULTS = {"transform": _TRANSFORM_DEFAULTS,
+                 "joint": dict(_TRANSFORM_DEFAULTS, jointOrientX=0.0, jointOrientY=0.0, jointOrientZ=0.0,
+                               radius=1.0),
+                 "ikHandle": dict(_TRANSFORM_DEFAULTS, dTwistControlEnable=0, dWorldUpType=0, dForwardAxis=0,
+                                  dWorldUpAxis=0, dWorldUpVectorX=0.0, dWorldUpVectorY=1.0, dWorldUpVectorZ=0.0,
+                                  dWorldUpVectorEndX=0.0, dWorldUpVectorEndY=1.0, dWorldUpVectorEndZ=0.0),
+                 "ikEffector": _TRANSFORM_DEFAULTS,
+                 "parentConstraint": _TRANSFORM_DEFAULTS,
+                 "multiplyDivide": {"operation": 1, "input1X": 0.0, "input1Y": 0.0, "input1Z": 0.0,
+                                    "input2X": 1.0, "input2Y": 1.0, "input2Z": 1.0},
+                 "frameCache": {"varyTime": 0.0},
+                 "displayLayer": {"color": 0, "visibility": 1, "displayType": 0},
+                 "nurbsCurve": {"overrideEnabled": 0, "overrideColor": 0, "intermediateObject": 0},
+                 "locator": {"overrideEnabled": 0, "overrideColor": 0, "intermediateObject": 0}}
+
+    # Управляющие точки кривой: shape.cv[3] или shape.cv[*]
+_CV_PLUG = re.compile(r"^(?:cv|controlPoints)\[(\d+|\*)\]$")
+
+    # Векторы вторичной оси для ориентации джоинтов
+SECONDARY_AXES = {"xup": (1.0, 0.0, 0.0), "xdown": (-1.0, 0.0, 0.0), "yup": (0.0, 1.0, 0.0),
+                  "ydown": (0.0, -1.0, 0.0), "zup": (0.0, 0.0, 1.0), "zdown": (0.0, 0.0, -1.0)}
+
+_TRAILING_DIGITS = re.compile(r"\d+$")
+
+    # Узел сцены в памяти
+class SceneNode(object):
+    __slots__ = ("uuid", "name", "type", "parent", "children", "attrs", "locked", "keyable",
+                 "channelBox", "aliases", "userAttrs")
+
+    def __init__(self, uuid, name, nodeType):
+        self.uuid = uuid
+        self.name = name
+        self.type = nodeType
+        self.parent = None
+        self.children = []
+        self.attrs = dict(NODE_DEFAULTS.get(nodeType, {}))
+        self.locked = set()
+        self.keyable = set(KEYABLE_TRANSFORM_ATTRS) if nodeType in TRANSFORM_TYPES else set()
+        self.channelBox = set()
+        self.aliases = {}
+        self.userAttrs = []
+
+    def isTransform(self):
+        return self.type in TRANSFORM_TYPES or self.type in ("ikHandle", "ikEffector", "parentConstraint")
+
+    def isShape(self):
+        return self.type in SHAPE_TYPES
+
+    # Сцена в памяти, повторяющая используемое сетапом подмножество maya.cmds.
+    # Нужна для сборки и проверки рига без Maya: хранит узлы, иерархию, атрибуты и связи,
+    # считает мировые матрицы и простые ноды (multiplyDivide, curveInfo, frameCache, animCurve)
+class MemoryBackend(SceneBackend):
+
+    mode = "memory"
+
+    def __init__(self):
+        self.nodes = {}
+        self.names = {}
+        self.inputs = {}
+        self.outputs = {}
+        self.selection = []
+        self.time = 1.0
+        self._nextUuid = 1
+        self._worldCache = {}
+        self._evalCache = {}
+        self._callbacks = {}
+        self._curveCallbacks = {}
+        self._constraints = set()
+        self._offsetDriven = set()
+        # Сколько раз вычислялись анимационные кривые (для замеров)
+        self.curveEvaluations = 0
+
+    # ---------------------------------------------------------------- служебные функции
+
+    def _materialize(self, value):
+        if isinstance(value, (list, tuple, types.GeneratorType)):
+            return [self._materialize(x) for x in value]
+        return value
+
+    def _flatten(self, objs):
+        result = []
+        for item in objs:
+            if item is None:
+                continue
+            if isinstance(item, (list, tuple, types.GeneratorType)):
+                result.extend(self._flatten(list(item)))
+            else:
+                result.append(item)
+        return result
+
+    def _flag(self, kwargs, longName, shortName=None, default=None):
+        if longName in kwargs:
+            return kwargs[longName]
+        if shortName is not None and shortName in kwargs:
+            return kwargs[shortName]
+        return default
+
+    def _uniqueName(self, name):
+        if name not in self.names:
+            return name
+        match = _TRAILING_DIGITS.search(name)
+        base = name[:match.start()] if match else name
+        index = int(match.group()) + 1 if match else 1
+        while "{}{}".format(base, index) in self.names:
+            index += 1
+        return "{}{}".format(base, index)
+
+    def _node(self, name):
+        shortName = str(name).split("|")[-1]
+        if shortName not in self.names:
+            raise ValueError("No object matches name: {}".format(name))
+        return self.nodes[self.names[shortName]]
+
+    def _newNode(self, nodeType, name=None, parent=None):
+        name = self._uniqueName(name or "{}1".format(nodeType))
+        node = SceneNode(self._nextUuid, name, nodeType)
+        self._nextUuid += 1
+        self.nodes[node.uuid] = node
+        self.names[name] = node.uuid
+        if parent is not None:
+            node.parent = parent.uuid
+            parent.children.append(node.uuid)
+        for callback in list(self._callbacks.values()):
+            callback(node.name)
+        return node
+
+    def _shapeOf(self, node):
+        for child in node.children:
+            if self.nodes[child].isShape():
+                return self.nodes[child]
+        return None
+
+    def _resolveAttr(self, node, attr):
+        attr = node.aliases.get(attr, attr)
+        return SHORT_ATTRS.get(attr, attr)
+
+    def _splitPlug(self, plug):
+        nodeName, attr = str(plug).split(".", 1)
+        node = self._node(nodeName)
+        return node, self._resolveAttr(node, attr)
+
+    def _compoundParent(self, attr):
+        return COMPOUND_PARENTS.get(attr)
+
+    def _isConnected(self, node, attr):
+        if (node.uuid, attr) in self.inputs:
+            return True
+        compound = self._compoundParent(attr)
+        return compound is not None and (node.uuid, compound) in self.inputs
+
+    def _invalidate(self, node):
+        self._evalCache.clear()
+        # Пока мировые матрицы не запрашивались (загрузка, пакетная установка значений), сбрасывать нечего
+        if not self._worldCache:
+            return
+        if node.isTransform() or node.isShape():
+            stack = [node.uuid]
+            # Ограничиваемые объекты и трансформы со связью в offsetParentMatrix зависят от цели,
+            # а не от родителя, поэтому сбрасываются всегда
+            stack.extend(self.nodes[uuid].parent for uuid in self._constraints)
+            stack.extend(self._offsetDriven)
+            while stack:
+                uuid = stack.pop()
+                # Матрица потомка считается через матрицу родителя: если родителя нет в кэше,
+                # в нем нет и зависящих от него потомков
+                if self._worldCache.pop(uuid, None) is not None or uuid == node.uuid:
+                    stack.extend(self.nodes[uuid].children)
+        else:
+            self._worldCache.clear()
+
+    def _dirtyAll(self):
+        self._worldCache.clear()
+        self._evalCache.clear()
+
+    # ---------------------------------------------------------------- вычисление значений
+
+    def _getValue(self, node, attr):
+        source = self.inputs.get((node.uuid, attr))
+        if source is None:
+            compound = self._compoundParent(attr)
+            if compound is not None and (node.uuid, compound) in self.inputs:
+                srcUuid, srcAttr = self.inputs[(node.uuid, compound)]
+                srcNode = self.nodes[srcUuid]
+                children = COMPOUND_ATTRS.get(srcAttr)
+                if children is not None:
+                    source = (srcUuid, children[COMPOUND_ATTRS[compound].index(attr)])
+        if source is not None:
+            srcNode = self.nodes[source[0]]
+            value = self._computeOrStored(srcNode, source[1])
+            if value is not None:
+                return value
+        if attr in COMPOUND_ATTRS and attr not in node.attrs:
+            return tuple(self._getValue(node, child) for child in COMPOUND_ATTRS[attr])
+        value = self._computeOrStored(node, attr)
+        if value is None:
+            raise ValueError("No attribute '{}' on node {}".format(attr, node.name))
+        return value
+
+    def _computeOrStored(self, node, attr):
+        compute = getattr(self, "_compute_" + node.type, None)
+        if compute is not None:
+            key = (node.uuid, attr)
+            if key in self._evalCache:
+                return self._evalCache[key]
+            value = compute(node, attr)
+            if value is not None:
+                self._evalCache[key] = value
+                return value
+        if attr in MATRIX_ATTRS or attr.split("[")[0] in MATRIX_ATTRS:
+            return self._matrixAttr(node, attr.split("[")[0])
+        return node.attrs.get(attr)
+
+    def _compute_multiplyDivide(self, node, attr):
+        if not attr.startswith("output"):
+            return None
+        if attr == "output":
+            return tuple(self._compute_multiplyDivide(node, "output" + axis) for axis in "XYZ")
+        axis = attr[-1]
+        a = self._getValue(node, "input1" + axis)
+        b = self._getValue(node, "input2" + axis)
+        operation = self._getValue(node, "operation")
+        if operation == 1:
+            return a * b
+        if operation == 2:
+            return a / b if b != 0 else 0.0
+        if operation == 3:
+            try:
+                return math.pow(a, b)
+            except (ValueError, ZeroDivisionError):
+                return 0.0
+        return a
+
+    def _compute_curveInfo(self, node, attr):
+        if attr != "arcLength":
+            return None
+        source = self.inputs.get((node.uuid, "inputCurve"))
+        if source is None:
+            return 0.0
+        shape = self.nodes[source[0]]
+        return rigMath.curveLength(self._worldCvs(shape), shape.attrs.get("degree", 1))
+
+    # Ограничение без смещения: ограничиваемый объект сохраняет положение относительно цели,
+    # которое было у него в момент создания ограничения
+    def _compute_parentConstraint(self, node, attr):
+        if not attr.startswith(("constraintTranslate", "constraintRotate")) or "restOffset" not in node.attrs:
+            return None
+        if attr in COMPOUND_ATTRS:
+            return tuple(self._compute_parentConstraint(node, child) for child in COMPOUND_ATTRS[attr])
+        source = self.inputs.get((node.uuid, "target[0].targetParentMatrix"))
+        if source is None:
+            return None
+        driven = self.nodes[node.parent]
+        world = rigMath.multMatrix(node.attrs["restOffset"], self._worldMatrix(self.nodes[source[0]]))
+        local = rigMath.multMatrix(world, rigMath.inverseMatrix(self._parentWorldMatrix(driven)))
+        axis = "XYZ".index(attr[-1])
+        rotation = rigMath.rotationPart(local)
+        if driven.type == "joint":
+            orient = [driven.attrs.get("jointOrient" + a, 0.0) for a in "XYZ"]
+            rotation = rigMath.multMatrix(rotation, rigMath.inverseMatrix(rigMath.eulerToMatrix(orient, 0)))
+        rotate = rigMath.matrixToEuler(rotation, int(driven.attrs.get("rotateOrder", 0)))
+        if attr.startswith("constraintTranslate"):
+            scale = tuple(self._getValue(driven, "scale" + a) for a in "XYZ")
+            return rigMath.vecSub(rigMath.matrixTranslation(local), self._pivotOffset(driven, rotate, scale))[axis]
+        return rotate[axis]
+
+    def _compute_frameCache(self, node, attr):
+        if attr != "varying":
+            return None
+        source = self.inputs.get((node.uuid, "stream"))
+        if source is None:
+            return 0.0
+        return self._evalAnimCurve(self.nodes[source[0]], self._getValue(node, "varyTime"))
+
+    def _compute_animCurveTU(self, node, attr):
+        if attr != "output":
+            return None
+        return self._evalAnimCurve(node, self.time)
+
+    # Значение анимационной кривой во времени (линейная интерполяция между ключами)
+    def _evalAnimCurve(self, node, time):
+        self.curveEvaluations += 1
+        keys = sorted(node.attrs.get("keys", {}).items())
+        if not keys:
+            return 0.0
+        if time <= keys[0][0]:
+            return keys[0][1]
+        for n in range(len(keys) - 1):
+            (t0, v0), (t1, v1) = keys[n], keys[n + 1]
+            if t0 <= time <= t1:
+                return v0 + (v1 - v0) * (time - t0) / float(t1 - t0)
+        return keys[-1][1]
+
+    # ---------------------------------------------------------------- трансформы
+
+    def _localMatrix(self, node):
+        if not node.isTransform():
+            return rigMath.identityMatrix()
+        value = lambda attr: self._getValue(node, attr)
+        jointOrient = None
+        if node.type == "joint":
+            jointOrient = (value("jointOrientX"), value("jointOrientY"), value("jointOrientZ"))
+        rotate = (value("rotateX"), value("rotateY"), value("rotateZ"))
+        scale = (value("scaleX"), value("scaleY"), value("scaleZ"))
+        matrix = rigMath.composeMatrix((value("translateX"), value("translateY"), value("translateZ")), rotate, scale,
+                                       int(value("rotateOrder")), jointOrient)
+        matrix[12:15] = rigMath.vecAdd(matrix[12:15], self._pivotOffset(node, rotate, scale))
+        return matrix
+
+    # Сдвиг трансформа из-за пивотов, как в матрице трансформа Maya: масштаб вокруг scalePivot,
+    # затем вращение вокруг rotatePivot, (sp - sp·S - rp)·R + rp. Для пивотов в нуле - нулевой
+    def _pivotOffset(self, node, rotate, scale):
+        rotatePivot = tuple(node.attrs.get("rotatePivot" + a, 0.0) for a in "XYZ")
+        scalePivot = tuple(node.attrs.get("scalePivot" + a, 0.0) for a in "XYZ")
+        if not any(rotatePivot) and not any(scalePivot):
+            return (0.0, 0.0, 0.0)
+        jointOrient = None
+        if node.type == "joint":
+            jointOrient = tuple(node.attrs.get("jointOrient" + a, 0.0) for a in "XYZ")
+        rotation = rigMath.composeMatrix(rotate = rotate, rotateOrder = int(node.attrs.get("rotateOrder", 0)),
+                                         jointOrient = jointOrient)
+        scaled = tuple(scalePivot[n] - scalePivot[n] * scale[n] - rotatePivot[n] for n in range(3))
+        return rigMath.vecAdd(rigMath.transformVector(scaled, rotation), rotatePivot)
+
+    # offsetParentMatrix трансформа (значение или входящая связь), None - единичная матрица
+    def _offsetParentMatrix(self, node):
+        if node.uuid not in self._offsetDriven and "offsetParentMatrix" not in node.attrs:
+            return None
+        return list(self._getValue(node, "offsetParentMatrix"))
+
+    def _worldMatrix(self, node):
+        cached = self._worldCache.get(node.uuid)
+        if cached is not None:
+            return cached
+        local = self._localMatrix(node)
+        offset = self._offsetParentMatrix(node)
+        if offset is not None:
+            local = rigMath.multMatrix(local, offset)
+        if node.parent is not None and node.attrs.get("inheritsTransform", 1):
+            world = rigMath.multMatrix(local, self._worldMatrix(self.nodes[node.parent]))
+        else:
+            world = local
+        self._worldCache[node.uuid] = world
+        return world
+
+    def _parentWorldMatrix(self, node):
+        if node.parent is None or not node.attrs.get("inheritsTransform", 1):
+            return rigMath.identityMatrix()
+        return self._worldMatrix(self.nodes[node.parent])
+
+    def _matrixAttr(self, node, attr):
+        if attr == "matrix":
+            return list(self._localMatrix(node))
+        if attr == "worldMatrix":
+            return list(self._worldMatrix(node))
+        if attr == "worldInverseMatrix":
+            return rigMath.inverseMatrix(self._worldMatrix(node))
+        if attr == "parentMatrix":
+            return list(self._parentWorldMatrix(node))
+        return rigMath.inverseMatrix(self._parentWorldMatrix(node))
+
+    def _setLocalMatrix(self, node, matrix):
+        rotateOrder = int(node.attrs.get("rotateOrder", 0))
+        if node.type == "joint":
+            # Вращение джоинта, как и в Maya при перепривязке, уходит в jointOrient
+            translate, orient, scale = rigMath.decomposeMatrix(matrix, 0)
+            rotate = (0.0, 0.0, 0.0)
+            for n, axis in enumerate("XYZ"):
+                node.attrs["jointOrient" + axis] = orient[n]
+        else:
+            translate, rotate, scale = rigMath.decomposeMatrix(matrix, rotateOrder)
+        translate = rigMath.vecSub(translate, self._pivotOffset(node, rotate, scale))
+        for n, axis in enumerate("XYZ"):
+            node.attrs["translate" + axis] = translate[n]
+            node.attrs["rotate" + axis] = rotate[n]
+            node.attrs["scale" + axis] = scale[n]
+        self._invalidate(node)
+
+    def _setWorldMatrix(self, node, matrix):
+        local = rigMath.multMatrix(matrix, rigMath.inverseMatrix(self._parentWorldMatrix(node)))
+        offset = self._offsetParentMatrix(node)
+        if offset is not None:
+            local = rigMath.multMatrix(local, rigMath.inverseMatrix(offset))
+        self._setLocalMatrix(node, local)
+
+    def _worldPivot(self, node):
+        pivot = (node.attrs.get("rotatePivotX", 0.0), node.attrs.get("rotatePivotY", 0.0),
+                 node.attrs.get("rotatePivotZ", 0.0))
+        return rigMath.transformPoint(pivot, self._worldMatrix(node))
+
+    def _worldCvs(self, shape):
+        cvs = shape.attrs.get("cvs", [])
+        if shape.parent is None:
+            return [tuple(cv) for cv in cvs]
+        world = self._worldMatrix(self.nodes[shape.parent])
+        return [rigMath.transformPoint(cv, world) for cv in cvs]
+
+    def _reparent(self, node, newParent, preserveWorld=True):
+        world = self._worldMatrix(node) if preserveWorld and node.isTransform() else None
+        if node.parent is not None:
+            self.nodes[node.parent].children.remove(node.uuid)
+        node.parent = newParent.uuid if newParent is not None else None
+        if newParent is not None:
+            newParent.children.append(node.uuid)
+        self._invalidate(node)
+        if world is not None:
+            self._setWorldMatrix(node, world)
+
+    def _descendants(self, node):
+        result = []
+        stack = list(node.children)
+        while stack:
+            uuid = stack.pop()
+            result.append(self.nodes[uuid])
+            stack.extend(self.nodes[uuid].children)
+        return result
+
+    def _freeze(self, node, translate, rotate, scale):
+        value = lambda attr, default: node.attrs.get(attr, default)
+        t = tuple(value("translate" + a, 0.0) for a in "XYZ")
+        r = tuple(value("rotate" + a, 0.0) for a in "XYZ")
+        s = tuple(value("scale" + a, 1.0) for a in "XYZ")
+        rotateOrder = int(value("rotateOrder", 0))
+        if node.type == "joint":
+            # Для джоинтов вращение переносится в jointOrient, масштаб и позиция не запекаются
+            if rotate:
+                jointOrient = tuple(value("jointOrient" + a, 0.0) for a in "XYZ")
+                orient = rigMath.multMatrix(rigMath.eulerToMatrix(r, rotateOrder),
+                                            rigMath.eulerToMatrix(jointOrient, 0))
+                for n, a in enumerate(rigMath.matrixToEuler(orient, 0)):
+                    node.attrs["jointOrient" + "XYZ"[n]] = a
+                    node.attrs["rotate" + "XYZ"[n]] = 0.0
+            bake = rigMath.identityMatrix()
+        else:
+            r = r if rotate else (0.0, 0.0, 0.0)
+            s = s if scale else (1.0, 1.0, 1.0)
+            bake = rigMath.composeMatrix(t if translate else (0.0, 0.0, 0.0), r, s, rotateOrder)
+            bake[12:15] = rigMath.vecAdd(bake[12:15], self._pivotOffset(node, r, s))
+            pivot = tuple(value("rotatePivot" + a, 0.0) for a in "XYZ")
+            newPivot = rigMath.transformPoint(pivot, bake)
+            for n, a in enumerate("XYZ"):
+                if translate:
+                    node.attrs["translate" + a] = 0.0
+                if rotate:
+                    node.attrs["rotate" + a] = 0.0
+                if scale:
+                    node.attrs["scale" + a] = 1.0
+                node.attrs["rotatePivot" + a] = newPivot[n]
+                node.attrs["scalePivot" + a] = newPivot[n]
+        self._invalidate(node)
+        for uuid in list(node.children):
+            child = self.nodes[uuid]
+            if child.isShape():
+                child.attrs["cvs"] = [rigMath.transformPoint(cv, bake) for cv in child.attrs.get("cvs", [])]
+            elif child.isTransform():
+                self._setLocalMatrix(child, rigMath.multMatrix(self._localMatrix(child), bake))
+                self._freeze(child, translate, rotate, scale)
+
+    def _orientJoint(self, node, orient, secondaryAxis, children):
+        kids = [self.nodes[uuid] for uuid in node.children]
+        kidWorlds = [(kid, self._worldMatrix(kid)) for kid in kids if kid.isTransform()]
+        jointKids = [kid for kid, _ in kidWorlds if kid.type == "joint"]
+        parentRotation = rigMath.rotationPart(self._parentWorldMatrix(node))
+        if orient == "none" or not jointKids:
+            desired = parentRotation
+        else:
+            position = rigMath.matrixTranslation(self._worldMatrix(node))
+            aim = rigMath.vecSub(rigMath.matrixTranslation(self._worldMatrix(jointKids[0])), position)
+            up = SECONDARY_AXES.get(secondaryAxis, (0.0, 1.0, 0.0))
+            desired = rigMath.aimMatrix(aim, up, orient[0], orient[1])
+        jointOrient = rigMath.matrixToEuler(rigMath.multMatrix(desired, rigMath.inverseMatrix(parentRotation)), 0)
+        for n, axis in enumerate("XYZ"):
+            node.attrs["jointOrient" + axis] = jointOrient[n]
+            node.attrs["rotate" + axis] = 0.0
+        self._invalidate(node)
+        for kid, world in kidWorlds:
+            self._setWorldMatrix(kid, world)
+        if children:
+            for kid in jointKids:
+                self._orientJoint(kid, orient, secondaryAxis, children)
+
+    def _deleteNode(self, node):
+        for child in list(node.children):
+            if child in self.nodes:
+                self._deleteNode(self.nodes[child])
+        history = []
+        for key in [k for k in self.inputs if k[0] == node.uuid]:
+            source = self.nodes[self.inputs[key][0]]
+            if source.type in HISTORY_TYPES:
+                history.append(source)
+            self._disconnect(key)
+        for key in [k for k in self.outputs if k[0] == node.uuid]:
+            for dst in list(self.outputs.get(key, ())):
+                self._disconnect(dst)
+        if node.parent is not None and node.parent in self.nodes:
+            self.nodes[node.parent].children.remove(node.uuid)
+        self._invalidate(node)
+        del self.names[node.name]
+        del self.nodes[node.uuid]
+        if node.uuid in self.selection:
+            self.selection.remove(node.uuid)
+        self._constraints.discard(node.uuid)
+        self._offsetDriven.discard(node.uuid)
+        for source in history:
+            if source.uuid in self.nodes and not any(self.outputs.get(key) for key in list(self.outputs)
+                                                     if key[0] == source.uuid):
+                self._deleteNode(source)
+
+    def _connect(self, srcNode, srcAttr, dstNode, dstAttr):
+        key = (dstNode.uuid, dstAttr)
+        if key in self.inputs:
+            self._disconnect(key)
+        self.inputs[key] = (srcNode.uuid, srcAttr)
+        self.outputs.setdefault((srcNode.uuid, srcAttr), set()).add(key)
+        if dstAttr == "offsetParentMatrix":
+            self._offsetDriven.add(dstNode.uuid)
+        self._invalidate(dstNode)
+
+    def _disconnect(self, key):
+        source = self.inputs.pop(key, None)
+        if key[1] == "offsetParentMatrix":
+            self._offsetDriven.discard(key[0])
+        if source is not None:
+            targets = self.outputs.get(source)
+            if targets is not None:
+                targets.discard(key)
+                if not targets:
+                    del self.outputs[source]
+
+    def _select(self, nodes):
+        self.selection = [node.uuid for node in nodes]
+
+    def _createCurveShape(self, transform, cvs, degree, shapeName=None, periodic=False):
+        shape = self._newNode("nurbsCurve", shapeName or transform.name + "Shape", transform)
+        shape.attrs["cvs"] = [tuple(float(c) for c in cv) for cv in cvs]
+        shape.attrs["degree"] = degree
+        shape.attrs["form"] = 2 if periodic else 0
+        return shape
+
+    def addCurveShapes(self, parents, points, degree, periodic=False, names=None):
+        return [self._createCurveShape(self._node(parent), points[n], degree, names[n] if names else None,
+                                       periodic).name for n, parent in enumerate(parents)]
+
+    def setAttrStates(self, plugs, lock=None, keyable=None, channelBox=None):
+        changed = 0
+        for plug in plugs:
+            node, attr = self._splitPlug(plug)
+            attrs = COMPOUND_ATTRS.get(attr, ()) + (attr,)
+            for state, storage in ((lock, node.locked), (keyable, node.keyable), (channelBox, node.channelBox)):
+                if state is None or all((a in storage) == state for a in attrs):
+                    continue
+                for a in attrs:
+                    if state:
+                        storage.add(a)
+                    else:
+                        storage.discard(a)
+                changed += 1
+        return changed
+
+    def getSkinWeights(self, skin):
+        node = self._node(skin)
+        shape = self.nodes[sorted(self.outputs[(node.uuid, "outputGeometry[0]")])[0][0]]
+        return shape.name, self.skinCluster(skin, query=True), [list(row) for row in node.attrs["weights"]]
+
+    def setSkinWeights(self, skin, weights):
+        node = self._node(skin)
+        node.attrs["weights"] = [[float(w) for w in row] for row in weights]
+
+    def evalAnimCurve(self, curve, times):
+        node = self._node(curve)
+        return [self._evalAnimCurve(node, float(t)) for t in times]
+
+    def _addCallback(self, callbacks, func):
+        callbackId = len(self._callbacks) + len(self._curveCallbacks) + 1
+        while callbackId in self._callbacks or callbackId in self._curveCallbacks:
+            callbackId += 1
+        callbacks[callbackId] = func
+        return callbackId
+
+    def addNodeAddedCallback(self, func):
+        return self._addCallback(self._callbacks, func)
+
+    def addAnimCurveEditedCallback(self, func):
+        return self._addCallback(self._curveCallbacks, func)
+
+    def removeCallback(self, callbackId):
+        self._callbacks.pop(callbackId, None)
+        self._curveCallbacks.pop(callbackId, None)
+
+    # Сообщает подписчикам об изменении ключей кривых
+    def _curvesEdited(self, curves):
+        names = [curve.name for curve in curves]
+        for callback in list(self._curveCallbacks.values()):
+            callback(names)
+
+    # ---------------------------------------------------------------- команды maya.cmds
+
+    def objExists(self, obj):
+        return str(obj).split(".")[0].split("|")[-1] in self.names
+
+    def nodeType(self, obj):
+        return self._node(obj).type
+
+    def ls(self, *objs, **kwargs):
+        nodeType = self._flag(kwargs, "type", "typ")
+        if self._flag(kwargs, "selection", "sl"):
+            nodes = [self.nodes[uuid] for uuid in self.selection]
+        elif objs:
+            nodes = [self._node(x) for x in self._flatten(objs) if self.objExists(x)]
+        else:
+            nodes = sorted(self.nodes.values(), key=lambda n: n.uuid)
+        if nodeType is not None:
+            types = nodeType if isinstance(nodeType, (list, tuple)) else [nodeType]
+            nodes = [n for n in nodes if n.type in types]
+        if self._flag(kwargs, "dag"):
+            nodes = [n for n in nodes if n.type in DAG_TYPES]
+        return [n.name for n in nodes]
+
+    def listRelatives(self, obj, **kwargs):
+        node = self._node(obj)
+        if self._flag(kwargs, "parent", "p"):
+            return [self.nodes[node.parent].name] if node.parent is not None else None
+        if self._flag(kwargs, "allDescendents", "ad"):
+            nodes = self._descendants(node)
+        else:
+            nodes = [self.nodes[uuid] for uuid in node.children]
+        if self._flag(kwargs, "shapes", "s"):
+            nodes = [n for n in nodes if n.isShape()]
+        nodeType = self._flag(kwargs, "type")
+        if nodeType is not None:
+            nodes = [n for n in nodes if n.type == nodeType]
+        return [n.name for n in nodes] or None
+
+    def listConnections(self, obj, **kwargs):
+        source = self._flag(kwargs, "source", "s", True)
+        destination = self._flag(kwargs, "destination", "d", True)
+        plugs = self._flag(kwargs, "plugs", "p", False)
+        connections = self._flag(kwargs, "connections", "c", False)
+        if "." in str(obj):
+            node, attr = self._splitPlug(obj)
+            match = lambda key: key == (node.uuid, attr)
+        else:
+            node = self._node(obj)
+            match = lambda key: key[0] == node.uuid
+        result = []
+        # С connections=True перед каждым найденным атрибутом идет свой атрибут связи, как в Maya
+        own = lambda key: ["{}.{}".format(node.name, key[1])] if connections else []
+        if source:
+            for key, src in sorted(self.inputs.items()):
+                if match(key):
+                    srcNode = self.nodes[src[0]]
+                    result.extend(own(key) + ["{}.{}".format(srcNode.name, src[1]) if plugs or connections
+                                              else srcNode.name])
+        if destination:
+            for key, dsts in sorted(self.outputs.items()):
+                if match(key):
+                    for dst in sorted(dsts):
+                        dstNode = self.nodes[dst[0]]
+                        result.extend(own(key) + ["{}.{}".format(dstNode.name, dst[1]) if plugs or connections
+                                                  else dstNode.name])
+        return result or None
+
+    def listAttr(self, obj, **kwargs):
+        node = self._node(obj)
+        if self._flag(kwargs, "userDefined", "ud"):
+            attrs = list(node.userAttrs)
+        else:
+            attrs = sorted(set(node.attrs) | node.locked | node.keyable | node.channelBox)
+        for flag, storage in (("locked", node.locked), ("keyable", node.keyable), ("channelBox", node.channelBox)):
+            if self._flag(kwargs, flag, {"locked": "l", "keyable": "k", "channelBox": "cb"}[flag]):
+                attrs = [a for a in attrs if a in storage]
+        return attrs or None
+
+    def select(self, *objs, **kwargs):
+        if self._flag(kwargs, "clear", "cl"):
+            self.selection = []
+            return
+        nodes = [self._node(x) for x in self._flatten(objs)]
+        if self._flag(kwargs, "add", "add"):
+            self.selection.extend(n.uuid for n in nodes if n.uuid not in self.selection)
+        elif self._flag(kwargs, "deselect", "d"):
+            self.selection = [uuid for uuid in self.selection if uuid not in [n.uuid for n in nodes]]
+        else:
+            self._select(nodes)
+
+    def createNode(self, nodeType, name=None, parent=None, skipSelect=False, **kwargs):
+        name = self._flag(kwargs, "n", default=name)
+        parentNode = self._node(parent) if parent else None
+        if nodeType in SHAPE_TYPES and parentNode is None:
+            parentNode = self._newNode("transform", "{}1".format(nodeType))
+        node = self._newNode(nodeType, name, parentNode)
+        if not skipSelect:
+            self._select([node])
+        return node.name
+
+    def rename(self, old, new):
+        node = self._node(old)
+        del self.names[node.name]
+        node.name = self._uniqueName(str(new).split("|")[-1])
+        self.names[node.name] = node.uuid
+        for uuid in node.children:
+            child = self.nodes[uuid]
+            if child.isShape():
+                self.rename(child.name, node.name + "Shape")
+        return node.name
+
+    def delete(self, *objs, **kwargs):
+        for name in self._flatten(objs):
+            if self.objExists(name):
+                self._deleteNode(self._node(name))
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, attr = self._splitPlug(plug)
+        values = self._flatten(self._materialize(list(values)))
+        cv = _CV_PLUG.match(attr)
+        if cv is not None:
+            shape = node if node.isShape() else self._shapeOf(node)
+            shape.attrs["cvs"][int(cv.group(1))] = tuple(float(v) for v in values)
+            self._invalidate(shape)
+            return
+        attrs = COMPOUND_ATTRS.get(attr, (attr,))
+        if values:
+            if any(self._isConnected(node, a) for a in attrs):
+                raise RuntimeError("setAttr: The attribute '{}.{}' is locked or connected and cannot be "
+                                   "modified.".format(node.name, attr))
+            if any(a in node.locked for a in attrs):
+                raise RuntimeError("setAttr: The attribute '{}.{}' is locked or connected and cannot be "
+                                   "modified.".format(node.name, attr))
+            if len(attrs) > 1 and len(values) == len(attrs):
+                for a, v in zip(attrs, values):
+                    node.attrs[a] = v
+            elif kwargs.get("type") in (None, "double", "float", "long", "bool", "enum") and len(values) == 1:
+                node.attrs[attr] = values[0]
+            else:
+                node.attrs[attr] = tuple(values)
+            self._invalidate(node)
+        for flag, storage in (("lock", node.locked), ("keyable", node.keyable), ("channelBox", node.channelBox)):
+            state = self._flag(kwargs, flag, {"lock": "l", "keyable": "k", "channelBox": "cb"}[flag])
+            if state is None:
+                continue
+            for a in attrs + ((attr,) if len(attrs) > 1 else ()):
+                if state:
+                    storage.add(a)
+                else:
+                    storage.discard(a)
+
+    def getAttr(self, plug, **kwargs):
+        node, attr = self._splitPlug(plug)
+        for flag, storage in (("lock", node.locked), ("keyable", node.keyable), ("channelBox", node.channelBox)):
+            if self._flag(kwargs, flag, {"lock": "l", "keyable": "k", "channelBox": "cb"}[flag]):
+                return attr in storage
+        cv = _CV_PLUG.match(attr)
+        if cv is not None:
+            cvs = (node if node.isShape() else self._shapeOf(node)).attrs["cvs"]
+            return list(cvs) if cv.group(1) == "*" else [cvs[int(cv.group(1))]]
+        if attr.split("[")[0] in MATRIX_ATTRS:
+            return self._matrixAttr(node, attr.split("[")[0])
+        value = self._getValue(node, attr)
+        if attr in COMPOUND_ATTRS:
+            return [tuple(value)]
+        return value
+
+    def addAttr(self, obj, **kwargs):
+        node = self._node(obj)
+        longName = self._flag(kwargs, "longName", "ln")
+        if longName in node.attrs:
+            raise RuntimeError("Found conflicting attribute name '{}' on {}".format(longName, node.name))
+        node.attrs[longName] = self._flag(kwargs, "defaultValue", "dv", 0.0)
+        node.userAttrs.append(longName)
+        if self._flag(kwargs, "keyable", "k"):
+            node.keyable.add(longName)
+
+    def aliasAttr(self, alias=None, plug=None, **kwargs):
+        if self._flag(kwargs, "query", "q"):
+            node = self._node(alias)
+            result = []
+            for key, value in sorted(node.aliases.items()):
+                result.extend([key, value])
+            return result or None
+        node, attr = self._splitPlug(plug)
+        node.aliases[alias] = attr
+
+    def connectAttr(self, src, dst, force=False, **kwargs):
+        force = force or self._flag(kwargs, "f", default=False)
+        srcNode, srcAttr = self._splitPlug(src)
+        dstNode, dstAttr = self._splitPlug(dst)
+        if dstAttr in dstNode.locked:
+            raise RuntimeError("connectAttr: The destination attribute '{}' is locked".format(dst))
+        if (dstNode.uuid, dstAttr) in self.inputs and not force:
+            raise RuntimeError("connectAttr: '{}' already has an incoming connection".format(dst))
+        self._connect(srcNode, srcAttr, dstNode, dstAttr)
+
+    def disconnectAttr(self, src, dst):
+        dstNode, dstAttr = self._splitPlug(dst)
+        self._disconnect((dstNode.uuid, dstAttr))
+        self._invalidate(dstNode)
+
+    def xform(self, obj, **kwargs):
+        node = self._node(obj)
+        query = self._flag(kwargs, "query", "q")
+        worldSpace = self._flag(kwargs, "worldSpace", "ws", False)
+        translation = self._flag(kwargs, "translation", "t")
+        rotation = self._flag(kwargs, "rotation", "ro")
+        matrix = self._flag(kwargs, "matrix", "m")
+        pivots = self._flag(kwargs, "pivots", "piv")
+        rotatePivot = self._flag(kwargs, "rotatePivot", "rp")
+        if query:
+            world = self._worldMatrix(node)
+            if translation:
+                if worldSpace:
+                    return list(rigMath.matrixTranslation(world))
+                return [node.attrs.get("translate" + a, 0.0) for a in "XYZ"]
+            if rotation:
+                if worldSpace:
+                    return list(rigMath.matrixToEuler(rigMath.rotationPart(world), int(node.attrs.get("rotateOrder", 0))))
+                return [node.attrs.get("rotate" + a, 0.0) for a in "XYZ"]
+            if matrix:
+                return list(world) if worldSpace else list(self._localMatrix(node))
+            if rotatePivot:
+                pivot = tuple(node.attrs.get("rotatePivot" + a, 0.0) for a in "XYZ")
+                return list(rigMath.transformPoint(pivot, world)) if worldSpace else list(pivot)
+            return None
+        if pivots is not None:
+            pivots = self._materialize(pivots)
+            if worldSpace:
+                pivots = rigMath.transformPoint(pivots, rigMath.inverseMatrix(self._worldMatrix(node)))
+            for n, a in enumerate("XYZ"):
+                node.attrs["rotatePivot" + a] = float(pivots[n])
+                node.attrs["scalePivot" + a] = float(pivots[n])
+        if matrix is not None and not isinstance(matrix, bool):
+            matrix = [float(x) for x in self._materialize(matrix)]
+            if worldSpace:
+                self._setWorldMatrix(node, matrix)
+            else:
+                self._setLocalMatrix(node, matrix)
+        if translation is not None and not isinstance(translation, bool):
+            translation = self._materialize(translation)
+            if worldSpace:
+                world = list(self._worldMatrix(node))
+                world[12:15] = [float(x) for x in translation]
+                self._setWorldMatrix(node, world)
+            else:
+                for n, a in enumerate("XYZ"):
+                    node.attrs["translate" + a] = float(translation[n])
+                self._invalidate(node)
+        if rotation is not None and not isinstance(rotation, bool):
+            rotation = self._materialize(rotation)
+            for n, a in enumerate("XYZ"):
+                node.attrs["rotate" + a] = float(rotation[n])
+            self._invalidate(node)
+
+    def spaceLocator(self, name=None, **kwargs):
+        name = self._flag(kwargs, "n", default=name)
+        transform = self._newNode("transform", name or "locator1")
+        self._newNode("locator", transform.name + "Shape", transform)
+        self._select([transform])
+        return [transform.name]
+
+    def curve(self, name=None, point=None, degree=3, **kwargs):
+        name = self._flag(kwargs, "n", default=name)
+        point = self._flag(kwargs, "p", default=point)
+        degree = self._flag(kwargs, "d", default=degree)
+        transform = self._newNode("transform", name or "curve1")
+        self._createCurveShape(transform, self._materialize(point), degree)
+        self._select([transform])
+        return transform.name
+
+    def circle(self, name=None, normal=(0, 0, 1), radius=1.0, **kwargs):
+        name = self._flag(kwargs, "n", default=name)
+        normal = rigMath.vecNormalize(self._flag(kwargs, "nr", default=normal))
+        helper = (0.0, 0.0, 1.0) if abs(normal[2]) < 0.9 else (1.0, 0.0, 0.0)
+        u = rigMath.vecNormalize(rigMath.vecCross(helper, normal))
+        v = rigMath.vecCross(normal, u)
+        cvs = []
+        for n in range(8):
+            angle = 2.0 * math.pi * n / 8
+            cvs.append(rigMath.vecAdd(rigMath.vecScale(u, math.cos(angle) * radius),
+                                      rigMath.vecScale(v, math.sin(angle) * radius)))
+        transform = self._newNode("transform", name or "nurbsCircle1")
+        shape = self._createCurveShape(transform, cvs, 3)
+        maker = self._newNode("makeNurbCircle", "makeNurbCircle1")
+        self._connect(maker, "outputCurve", shape, "create")
+        self._select([transform])
+        return [transform.name, maker.name]
+
+    def joint(self, name=None, **kwargs):
+        if self._flag(kwargs, "edit", "e"):
+            node = self._node(name)
+            orient = self._flag(kwargs, "orientJoint", "oj")
+            if orient is not None:
+                self._orientJoint(node, orient, self._flag(kwargs, "secondaryAxisOrient", "sao"),
+                                  self._flag(kwargs, "children", "ch", False))
+            radius = self._flag(kwargs, "radius", "rad")
+            if radius is not None:
+                node.attrs["radius"] = radius
+            return None
+        name = self._flag(kwargs, "n", default=name)
+        parent = None
+        if self.selection and self.nodes[self.selection[0]].type == "joint":
+            parent = self.nodes[self.selection[0]]
+        node = self._newNode("joint", name or "joint1", parent)
+        position = self._materialize(self._flag(kwargs, "position", "p", (0.0, 0.0, 0.0)))
+        local = rigMath.transformPoint([float(x) for x in position],
+                                       rigMath.inverseMatrix(self._parentWorldMatrix(node)))
+        for n, a in enumerate("XYZ"):
+            node.attrs["translate" + a] = local[n]
+        node.attrs["radius"] = self._flag(kwargs, "radius", "rad", 1.0)
+        self._select([node])
+        return node.name
+
+    def parent(self, *objs, **kwargs):
+        objs = self._flatten(objs)
+        if self._flag(kwargs, "world", "w"):
+            children, newParent = objs, None
+        else:
+            children, newParent = objs[:-1], self._node(objs[-1])
+        result = []
+        for name in children:
+            node = self._node(name)
+            relative = self._flag(kwargs, "relative", "r", False) or self._flag(kwargs, "shape", "s", False)
+            self._reparent(node, newParent, preserveWorld=not relative)
+            result.append(node.name)
+        return result
+
+    def group(self, *objs, **kwargs):
+        name = self._flag(kwargs, "name", "n")
+        objs = self._flatten(objs)
+        if not objs and not self._flag(kwargs, "empty", "em"):
+            objs = [self.nodes[uuid].name for uuid in self.selection]
+        nodes = [self._node(x) for x in objs]
+        parents = set(node.parent for node in nodes)
+        parent = self.nodes[parents.pop()] if len(parents) == 1 and None not in parents else None
+        group = self._newNode("transform", name or "group1", parent)
+        for node in nodes:
+            self._reparent(node, group)
+        self._select([group])
+        return group.name
+
+    def makeIdentity(self, obj, **kwargs):
+        node = self._node(obj)
+        translate = self._flag(kwargs, "translate", "t", False)
+        rotate = self._flag(kwargs, "rotate", "r", False)
+        scale = self._flag(kwargs, "scale", "s", False)
+        if not (translate or rotate or scale):
+            translate = rotate = scale = True
+        if self._flag(kwargs, "apply", "a"):
+            self._freeze(node, translate, rotate, scale)
+            return
+        for target in [node] + [n for n in self._descendants(node) if n.isTransform()]:
+            for a in "XYZ":
+                if translate:
+                    target.attrs["translate" + a] = 0.0
+                if rotate:
+                    target.attrs["rotate" + a] = 0.0
+                if scale:
+                    target.attrs["scale" + a] = 1.0
+            self._invalidate(target)
+
+    def duplicate(self, obj, **kwargs):
+        source = self._node(obj)
+        newName = self._flag(kwargs, "name", "n") or source.name
+        parent = self.nodes[source.parent] if source.parent is not None else None
+        copy = self._copyNode(source, newName, parent, not self._flag(kwargs, "parentOnly", "po", False))
+        self._select([copy])
+        return [copy.name]
+
+    def _copyNode(self, source, name, parent, withChildren):
+        copy = self._newNode(source.type, name, parent)
+        copy.attrs = dict(source.attrs)
+        copy.locked = set(source.locked)
+        copy.keyable = set(source.keyable)
+        copy.channelBox = set(source.channelBox)
+        copy.aliases = dict(source.aliases)
+        copy.userAttrs = list(source.userAttrs)
+        if withChildren:
+            for uuid in list(source.children):
+                child = self.nodes[uuid]
+                self._copyNode(child, child.name, copy, True)
+        return copy
+
+    def parentConstraint(self, *objs, **kwargs):
+        objs = self._flatten(objs)
+        targets, driven = [self._node(x) for x in objs[:-1]], self._node(objs[-1])
+        if not self._flag(kwargs, "maintainOffset", "mo", False):
+            target = targets[0]
+            rotation = rigMath.rotationPart(self._worldMatrix(target))
+            scale = tuple(driven.attrs.get("scale" + a, 1.0) for a in "XYZ")
+            world = rigMath.multMatrix(rigMath.scaleMatrix(scale), rotation)
+            pivot = tuple(driven.attrs.get("rotatePivot" + a, 0.0) for a in "XYZ")
+            offset = rigMath.transformPoint(pivot, world)
+            world[12:15] = list(rigMath.vecSub(self._worldPivot(target), offset))
+            self._setWorldMatrix(driven, world)
+        constraint = self._newNode("parentConstraint", self._flag(kwargs, "name", "n") or
+                                   "{}_parentConstraint1".format(driven.name), driven)
+        for n, target in enumerate(targets):
+            self._connect(target, "worldMatrix[0]", constraint, "target[{}].targetParentMatrix".format(n))
+        self._connect(driven, "parentInverseMatrix[0]", constraint, "constraintParentInverseMatrix")
+        constraint.attrs["restOffset"] = rigMath.multMatrix(self._worldMatrix(driven),
+                                                            rigMath.inverseMatrix(self._worldMatrix(targets[0])))
+        self._connect(constraint, "constraintTranslate", driven, "translate")
+        self._connect(constraint, "constraintRotate", driven, "rotate")
+        self._constraints.add(constraint.uuid)
+        return [constraint.name]
+
+    def ikHandle(self, **kwargs):
+        start = self._flag(kwargs, "startJoint", "sj")
+        end = self._flag(kwargs, "endEffector", "ee")
+        if start is None or end is None:
+            start, end = [self.nodes[uuid].name for uuid in self.selection[:2]]
+        startNode, endNode = self._node(start), self._node(end)
+        chain = [endNode]
+        while chain[-1].uuid != startNode.uuid:
+            if chain[-1].parent is None:
+                raise RuntimeError("ikHandle: {} is not a descendant of {}".format(end, start))
+            chain.append(self.nodes[chain[-1].parent])
+        chain.reverse()
+        effectorParent = self.nodes[endNode.parent] if endNode.parent is not None else endNode
+        effector = self._newNode("ikEffector", "effector1", effectorParent)
+        # Как и в Maya, эффектор повторяет положение последнего джоинта через связь
+        self._connect(endNode, "translate", effector, "translate")
+        handle = self._newNode("ikHandle", self._flag(kwargs, "name", "n") or "ikHandle1")
+        position = rigMath.matrixTranslation(self._worldMatrix(endNode))
+        for n, a in enumerate("XYZ"):
+            handle.attrs["translate" + a] = position[n]
+        self._connect(startNode, "message", handle, "startJoint")
+        self._connect(effector, "handlePath[0]", handle, "endEffector")
+        result = [handle.name, effector.name]
+        if self._flag(kwargs, "solver", "sol") == "ikSplineSolver":
+            existing = self._flag(kwargs, "curve", "c")
+            if existing is not None and not self._flag(kwargs, "createCurve", "ccv", True):
+                # Готовая кривая: Maya не возвращает ее в результате
+                curveNode = self._node(existing)
+                shape = curveNode if curveNode.isShape() else self._shapeOf(curveNode)
+                self._connect(shape, "worldSpace[0]", handle, "inCurve")
+            else:
+                points = [rigMath.matrixTranslation(self._worldMatrix(j)) for j in chain]
+                curve = self._newNode("transform", "curve1")
+                shape = self._createCurveShape(curve, points, 3 if len(points) > 3 else 1)
+                self._connect(shape, "worldSpace[0]", handle, "inCurve")
+                result.append(curve.name)
+        self._select([handle])
+        return result
+
+    def skinCluster(self, *objs, **kwargs):
+        if self._flag(kwargs, "query", "q"):
+            node = self._node(objs[0])
+            keys = sorted((k for k in self.inputs if k[0] == node.uuid and k[1].startswith("matrix[")),
+                          key=lambda k: int(k[1][7:-1]))
+            return [self.nodes[self.inputs[k][0]].name for k in keys]
+        nodes = [self._node(x) for x in self._flatten(objs)]
+        joints = [n for n in nodes if n.type == "joint"]
+        geometry = [n for n in nodes if n.type != "joint"][0]
+        shape = geometry if geometry.isShape() else self._shapeOf(geometry)
+        skin = self._newNode("skinCluster", self._flag(kwargs, "name", "n") or "skinCluster1")
+        for n, jointNode in enumerate(joints):
+            self._connect(jointNode, "worldMatrix[0]", skin, "matrix[{}]".format(n))
+        self._connect(skin, "outputGeometry[0]", shape, "create")
+        # Веса считаются по удаленности от джоинтов с заданным затуханием
+        dropoff = float(self._flag(kwargs, "dropoffRate", "dr", 4.0))
+        maxInfluences = int(self._flag(kwargs, "maximumInfluences", "mi", len(joints)))
+        positions = [rigMath.matrixTranslation(self._worldMatrix(j)) for j in joints]
+        weights = []
+        for cv in self._worldCvs(shape):
+            raw = [1.0 / max(rigMath.vecLength(rigMath.vecSub(cv, p)), 1e-6) ** dropoff for p in positions]
+            keep = sorted(range(len(raw)), key=lambda n: -raw[n])[:maxInfluences]
+            total = sum(raw[n] for n in keep)
+            weights.append([raw[n] / total if n in keep else 0.0 for n in range(len(raw))])
+        skin.attrs["weights"] = weights
+        return [skin.name]
+
+    def arclen(self, curve, constructionHistory=False, **kwargs):
+        constructionHistory = constructionHistory or self._flag(kwargs, "ch", default=False)
+        node = self._node(curve)
+        shape = node if node.isShape() else self._shapeOf(node)
+        if not constructionHistory:
+            return rigMath.curveLength(self._worldCvs(shape), shape.attrs.get("degree", 1))
+        info = self._newNode("curveInfo", "curveInfo1")
+        self._connect(shape, "worldSpace[0]", info, "inputCurve")
+        return info.name
+
+    def setKeyframe(self, obj, **kwargs):
+        node = self._node(obj)
+        attr = self._resolveAttr(node, self._flag(kwargs, "attribute", "at"))
+        times = self._materialize(self._flag(kwargs, "time", "t", self.time))
+        times = times if isinstance(times, list) else [times]
+        value = self._flag(kwargs, "value", "v")
+        if value is None:
+            value = self._getValue(node, attr)
+        source = self.inputs.get((node.uuid, attr))
+        if source is not None and self.nodes[source[0]].type.startswith("animCurve"):
+            curve = self.nodes[source[0]]
+        else:
+            curve = self._newNode("animCurveTU", "{}_{}".format(node.name, attr))
+            curve.attrs["keys"] = {}
+            self._connect(curve, "output", node, attr)
+        for time in times:
+            curve.attrs["keys"][float(time)] = float(value)
+        self._dirtyAll()
+        self._curvesEdited([curve])
+        return len(times)
+
+    def _animCurveOf(self, name, attr):
+        node = self._node(name)
+        if node.type.startswith("animCurve"):
+            return node
+        source = self.inputs.get((node.uuid, self._resolveAttr(node, attr)))
+        if source is None:
+            return None
+        return self.nodes[source[0]]
+
+    def keyframe(self, obj, **kwargs):
+        curve = self._animCurveOf(obj, self._flag(kwargs, "attribute", "at"))
+        if curve is None:
+            return None
+        keys = curve.attrs.get("keys", {})
+        times = self._flag(kwargs, "time", "t")
+        if times is not None:
+            times = self._materialize(times)
+            times = [float(t) for t in (times if isinstance(times, list) else [times])]
+        if self._flag(kwargs, "query", "q"):
+            if self._flag(kwargs, "name", "n"):
+                return [curve.name]
+            if self._flag(kwargs, "eval", "ev"):
+                return [self._evalAnimCurve(curve, t) for t in (times or [self.time])]
+            selected = [t for t in sorted(keys) if times is None or t in times]
+            if self._flag(kwargs, "valueChange", "vc"):
+                return [keys[t] for t in selected]
+            if self._flag(kwargs, "timeChange", "tc"):
+                return selected
+            if self._flag(kwargs, "keyframeCount", "kc"):
+                return len(keys)
+            return None
+        value = self._flag(kwargs, "valueChange", "vc")
+        if value is not None:
+            for t in sorted(keys):
+                if times is None or t in times:
+                    keys[t] = float(value)
+            self._curvesEdited([curve])
+        self._dirtyAll()
+        return len(keys)
+
+    def createDisplayLayer(self, name=None, **kwargs):
+        name = self._flag(kwargs, "n", default=name)
+        layer = self._newNode("displayLayer", name or "layer1")
+        if not self._flag(kwargs, "empty", "e"):
+            self._addLayerMembers(layer, [self.nodes[uuid] for uuid in self.selection])
+        return layer.name
+
+    def editDisplayLayerMembers(self, layer, *objs, **kwargs):
+        layerNode = self._node(layer)
+        nodes = [self._node(x) for x in self._flatten(objs)]
+        self._addLayerMembers(layerNode, nodes)
+        return len(nodes)
+
+    def _addLayerMembers(self, layer, nodes):
+        for node in nodes:
+            self._connect(layer, "drawInfo", node, "drawOverride")
+
+    def currentTime(self, *args, **kwargs):
+        if self._flag(kwargs, "query", "q"):
+            return self.time
+        if args:
+            self.time = float(args[0])
+            self._dirtyAll()
+        return self.time
+
+    def undoInfo(self, *args, **kwargs):
+        return None
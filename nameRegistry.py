@@ -0,0 +1,163 @@
+    # coding=utf-8
+import collections
+import contextlib
+import re
+
+from sceneBackend import STRING_TYPES, WrapperBackend, getBackend, useBackend
+
+    # Сокращения сторон в именах нод
+SIDES = {"left": "L_", "right": "R_", "center": ""}
+
+    # Сколько готовых имен хранится в кэше resolveName
+NAME_CACHE_SIZE = 4096
+
+    # Команды, которые создают ноды и возвращают их имена (первое имя, если нод несколько)
+NAMED_COMMANDS = ("createNode", "spaceLocator", "curve", "circle", "joint", "group", "duplicate",
+                  "createDisplayLayer", "ikHandle", "parentConstraint", "skinCluster", "arclen")
+
+_TRAILING_DIGITS = re.compile(r"\d+$")
+
+    # Скомпилированное соглашение об именах для одного сочетания assetName, side, suffix:
+    # готовые префикс и окончание, между которыми встает base
+class NameTemplate(object):
+    __slots__ = ("assetName", "side", "suffix", "prefix")
+
+    def __init__(self, assetName, side, suffix):
+        self.side = SIDES.get(side.lower(), side)
+        self.assetName = assetName + "_" if assetName != "" else assetName
+        self.suffix = "_" + suffix if suffix != "" else suffix
+        self.prefix = self.assetName + self.side
+
+    # Имя ноды для base, None - если base пустой
+    def name(self, base):
+        if base:
+            return self.prefix + base + self.suffix
+        return None
+
+_templates = {}
+_names = collections.OrderedDict()
+
+    # Шаблон для соглашения, строится один раз за сессию
+def nameTemplate(assetName, side, suffix):
+    key = (assetName, side, suffix)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = NameTemplate(assetName, side, suffix)
+    return template
+
+    # Имя ноды по соглашению. Готовые имена кэшируются, самые старые вытесняются после NAME_CACHE_SIZE
+def resolveName(assetName, side, base, suffix):
+    key = (assetName, side, base, suffix)
+    name = _names.get(key)
+    if name is None and key not in _names:
+        if len(_names) >= NAME_CACHE_SIZE:
+            _names.popitem(last = False)
+        name = _names[key] = nameTemplate(assetName, side, suffix).name(base)
+    return name
+
+    # Реестр имен, выданных сценой за сборку. Проверки занятости имени - поиск в словаре, без запросов к сцене.
+    # Если сцена дала ноде не то имя, которое просили (Maya молча добавляет цифры при совпадении),
+    # пара (запрошенное, выданное) попадает в renames
+class NameRegistry(object):
+
+    def __init__(self):
+        # {выданное имя: запрошенное имя}
+        self.issued = {}
+        self.renames = []
+
+    # Запоминает имя, выданное сценой на запрос requested
+    def issue(self, requested, actual = None):
+        actual = actual or requested
+        shortName = actual.split("|")[-1]
+        self.issued[shortName] = requested
+        if requested and shortName != requested.split("|")[-1]:
+            self.renames.append((requested, actual))
+        return actual
+
+    def discard(self, name):
+        self.issued.pop(str(name).split("|")[-1], None)
+
+    def isIssued(self, name):
+        return str(name).split("|")[-1] in self.issued
+
+    # Свободное имя по правилам Maya: при совпадении увеличивается число в конце имени
+    def uniqueName(self, name):
+        if name not in self.issued:
+            return name
+        match = _TRAILING_DIGITS.search(name)
+        base = name[:match.start()] if match else name
+        index = int(match.group()) + 1 if match else 1
+        while "{}{}".format(base, index) in self.issued:
+            index += 1
+        return "{}{}".format(base, index)
+
+    def clear(self):
+        self.issued.clear()
+        self.renames = []
+
+    # Сцена-обертка, которая заносит в реестр имена создаваемых и переименованных нод
+class NameTrackingBackend(WrapperBackend):
+
+    def __init__(self, inner, registry):
+        WrapperBackend.__init__(self, inner)
+        self.registry = registry
+
+    def wrap(self, command, func):
+
+        def tracked(*args, **kwargs):
+            result = func(*args, **kwargs)
+            self.track(command, args, kwargs, result)
+            return result
+
+        return tracked
+
+    def track(self, command, args, kwargs, result):
+        if kwargs.get("query") or kwargs.get("q") or kwargs.get("edit") or kwargs.get("e"):
+            return
+        if command in NAMED_COMMANDS:
+            requested = kwargs.get("name") or kwargs.get("n")
+            actual = result[0] if isinstance(result, (list, tuple)) and result else result
+            # arclen без истории построения возвращает длину, а не ноду
+            if isinstance(actual, STRING_TYPES):
+                self.registry.issue(requested, actual)
+        elif command == "rename" and len(args) > 1:
+            self.registry.discard(args[0])
+            self.registry.issue(args[1], result)
+        elif command == "delete":
+            for obj in args:
+                for name in (obj if isinstance(obj, (list, tuple)) else [obj]):
+                    self.registry.discard(name)
+
+    def applyBatch(self, command, calls):
+        results = self.inner.applyBatch(command, calls)
+        for (args, kwargs), result in zip(calls, results):
+            self.track(command, args, kwargs, result)
+        return results
+
+    def createJointChain(self, names, *args, **kwargs):
+        created = self.inner.createJointChain(names, *args, **kwargs)
+        for requested, actual in zip(names, created):
+            self.registry.issue(requested, actual)
+        return created
+
+    def createTransformChain(self, names, *args, **kwargs):
+        created = self.inner.createTransformChain(names, *args, **kwargs)
+        for requested, actual in zip(names, created):
+            self.registry.issue(requested, actual)
+        return created
+
+    def addCurveShapes(self, parents, points, degree, periodic = False, names = None):
+        shapes = self.inner.addCurveShapes(parents, points, degree, periodic, names)
+        for n, actual in enumerate(shapes):
+            self.registry.issue(names[n] if names else parents[n] + "Shape", actual)
+        return shapes
+
+    # Заносит в registry имена нод, созданных внутри блока. Вложенный вызов с тем же реестром ничего не добавляет
+@contextlib.contextmanager
+def trackedNames(registry):
+    backend = getBackend()
+    if isinstance(backend, NameTrackingBackend) and backend.registry is registry:
+        yield registry
+        return
+    with useBackend(NameTrackingBackend(backend, registry)):
+        yield registry
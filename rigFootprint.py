@@ -0,0 +1,124 @@
+    # coding=utf-8
+    # Учет следа сетапа в сцене: ноды по типам, связи, анимационные кривые с ключами и заблокированные атрибуты,
+    # и оценка памяти, которую они занимают. По оценке сборка укладывается в бюджет (TorsoRig.fitBudget),
+    # чтобы сцены с десятками персонажей предсказуемо помещались в память
+import rigGraph
+
+    # Примерный объем памяти ноды Maya по типу, в байтах. Это оценка для сравнения сетапов и бюджетов,
+    # а не точный замер: реальный объем зависит от версии Maya и количества элементов в массивах атрибутов
+NODE_BYTES = {"transform": 2400,
+              "joint": 3600,
+              "nurbsCurve": 4000,
+              "locator": 1600,
+              "parentConstraint": 5200,
+              "ikHandle": 3200,
+              "ikEffector": 2400,
+              "skinCluster": 9000,
+              "multiplyDivide": 1400,
+              "curveInfo": 1200,
+              "frameCache": 1200,
+              "animCurveTU": 1000,
+              "displayLayer": 1200}
+DEFAULT_NODE_BYTES = 1500
+    # Память на связь атрибутов, ключ анимационной кривой и заблокированный атрибут
+CONNECTION_BYTES = 96
+KEY_BYTES = 48
+LOCKED_ATTR_BYTES = 8
+
+    # Показатели следа, которые можно ограничить бюджетом
+BUDGET_FIELDS = ("nodes", "connections", "keyedCurves", "keys", "lockedAttrs", "memory")
+
+    # След части сетапа. Разность следов сцены до и после этапа сборки - то, что этап добавил
+class Footprint(object):
+    __slots__ = ("nodeTypes", "connections", "keyedCurves", "keys", "lockedAttrs")
+
+    def __init__(self):
+        # {тип ноды: количество}
+        self.nodeTypes = {}
+        self.connections = 0
+        self.keyedCurves = 0
+        self.keys = 0
+        self.lockedAttrs = 0
+
+    def nodes(self):
+        return sum(self.nodeTypes.values())
+
+    # Оценка памяти в байтах (см. NODE_BYTES)
+    def memory(self):
+        nodes = sum(NODE_BYTES.get(nodeType, DEFAULT_NODE_BYTES) * count for nodeType, count in self.nodeTypes.items())
+        return (nodes + self.connections * CONNECTION_BYTES + self.keys * KEY_BYTES +
+                self.lockedAttrs * LOCKED_ATTR_BYTES)
+
+    def value(self, field):
+        if field == "nodes":
+            return self.nodes()
+        if field == "memory":
+            return self.memory()
+        return getattr(self, field)
+
+    # Прибавляет след other, умноженный на sign (-1 - вычитает)
+    def add(self, other, sign = 1):
+        for nodeType, count in other.nodeTypes.items():
+            count = self.nodeTypes.get(nodeType, 0) + sign * count
+            if count:
+                self.nodeTypes[nodeType] = count
+            else:
+                self.nodeTypes.pop(nodeType, None)
+        self.connections += sign * other.connections
+        self.keyedCurves += sign * other.keyedCurves
+        self.keys += sign * other.keys
+        self.lockedAttrs += sign * other.lockedAttrs
+        return self
+
+    def difference(self, other):
+        return Footprint().add(self).add(other, -1)
+
+    def asDict(self):
+        return {"nodes": self.nodes(),
+                "nodeTypes": dict(self.nodeTypes),
+                "connections": self.connections,
+                "keyedCurves": self.keyedCurves,
+                "keys": self.keys,
+                "lockedAttrs": self.lockedAttrs,
+                "memory": self.memory()}
+
+    # След нод nodes в сцене scene. Связи считаются по входам нод, поэтому каждая связь учитывается один раз.
+    # Служебные ноды, которые не попадают в rigGraph, пропускаются
+def sceneFootprint(scene, nodes):
+    footprint = Footprint()
+    for node in nodes:
+        nodeType = scene.nodeType(node)
+        if nodeType in rigGraph.SKIP_TYPES:
+            continue
+        footprint.nodeTypes[nodeType] = footprint.nodeTypes.get(nodeType, 0) + 1
+        inputs = scene.listConnections(node, source = True, destination = False, connections = True, plugs = True)
+        footprint.connections += len(inputs or []) // 2
+        footprint.lockedAttrs += len(scene.listAttr(node, locked = True) or [])
+        if nodeType.startswith("animCurve"):
+            footprint.keyedCurves += 1
+            footprint.keys += scene.keyframe(node, query = True, keyframeCount = True) or 0
+    return footprint
+
+    # Показатели footprint (словарь из Footprint.asDict), превышающие бюджет: [(показатель, значение, предел)].
+    # budget - {показатель из BUDGET_FIELDS: предел}
+def overBudget(footprint, budget):
+    exceeded = []
+    for field, limit in sorted(budget.items()):
+        if field not in BUDGET_FIELDS:
+            raise ValueError("Unknown budget field: {}".format(field))
+        if limit is not None and footprint[field] > limit:
+            exceeded.append((field, footprint[field], limit))
+    return exceeded
+
+    # След сборки по этапам (отчет BuildProfiler с footprint=True) в виде текстовой таблицы
+def formatFootprint(report):
+    lines = ["{:<32}{:>8}{:>8}{:>8}{:>8}{:>8}{:>10}".format("stage", "nodes", "conns", "curves", "keys", "locked",
+                                                            "memory KB")]
+    rows = [("  " * stage["depth"] + stage["name"], stage["footprint"]) for stage in report["stages"]]
+    for name, footprint in rows + [("total", report["footprint"])]:
+        lines.append("{:<32}{:>8}{:>8}{:>8}{:>8}{:>8}{:>10.1f}".format(name, footprint["nodes"],
+                                                                       footprint["connections"],
+                                                                       footprint["keyedCurves"], footprint["keys"],
+                                                                       footprint["lockedAttrs"],
+                                                                       footprint["memory"] / 1024.0))
+    return "\n".join(lines)
@@ -0,0 +1,531 @@
+    # coding=utf-8
+    # Компактный двоичный формат собранного сетапа: типы и имена нод, трансформы и ориентация джоинтов,
+    # значения и пользовательские атрибуты, связи, блокировки, веса скина и слои. Загрузка воссоздает сетап
+    # в текущей сцене одним проходом пакетных команд, без повторной сборки.
+    #
+    # Файл: заголовок, таблица секций и секции, выровненные по 8 байт. Секция - массив записей одного
+    # формата (RECORDS), строки хранятся один раз в секции STRS и в записях заменены индексами.
+    # Числовые данные (точки кривых, веса, ключи) лежат сплошными массивами double, записи ссылаются
+    # на них номером первого элемента и количеством. Файл читается через mmap (RigGraph), поэтому
+    # инструменты могут просматривать большие библиотеки сетапов, не загружая файлы целиком
+import mmap
+import struct
+
+from sceneBackend import cmds
+
+MAGIC = b"RGRF"
+VERSION = 1
+
+    # Заголовок: magic, версия, количество секций, флаги
+_HEADER = struct.Struct("<4sHHI4x")
+    # Запись таблицы секций: тег, количество записей, смещение и размер данных
+_SECTION = struct.Struct("<4sIQQ")
+_STRING_OFFSET = struct.Struct("<I")
+ALIGNMENT = 8
+
+    # Форматы записей по секциям. Индексы нод и строк - номера записей в NODE и STRS
+RECORDS = {
+    # имя, тип, индекс родителя (-1 - без родителя), вид ноды (NODE_PLAIN, NODE_CONSTRUCTED, NODE_IMPLICIT)
+    "NODE": struct.Struct("<IIiB3x"),
+    # нода, translate, rotate, scale, jointOrient, rotatePivot, scalePivot, rotateOrder
+    "XFRM": struct.Struct("<I18dI"),
+    # нода, атрибут, значение
+    "VALS": struct.Struct("<IId"),
+    # нода, атрибут, значение, флаги (LOCK_FLAGS)
+    "UATR": struct.Struct("<IIdB3x"),
+    # нода, псевдоним, атрибут
+    "ALIA": struct.Struct("<III"),
+    # шейп, степень, форма (2 - периодическая), количество точек, первая точка в PNTS
+    "CURV": struct.Struct("<IBB2xII"),
+    "PNTS": struct.Struct("<3d"),
+    # ограничение, цель, ограничиваемая нода
+    "CONS": struct.Struct("<III"),
+    # ikHandle, эффектор, начальный и конечный джоинты, шейп кривой
+    "IKHD": struct.Struct("<IIIII"),
+    # curveInfo, шейп кривой
+    "CINF": struct.Struct("<II"),
+    # анимационная кривая, нода и атрибут, которые она анимирует, количество ключей, первый ключ в KEYS
+    "ANIM": struct.Struct("<IIIII"),
+    # время, значение
+    "KEYS": struct.Struct("<2d"),
+    # скин, шейп, количество влияний, первое влияние в INFL, количество точек, первый вес в WGTS
+    "SKIN": struct.Struct("<IIIIII"),
+    "INFL": struct.Struct("<I"),
+    "WGTS": struct.Struct("<d"),
+    # нода и атрибут источника, нода и атрибут приемника
+    "CONN": struct.Struct("<IIII"),
+    # нода, атрибут, флаги (LOCK_FLAGS)
+    "LOCK": struct.Struct("<IIB3x"),
+    # слой, нода
+    "LAYR": struct.Struct("<II"),
+}
+    # Порядок секций в файле
+SECTIONS = ("STRS", "NODE", "XFRM", "VALS", "UATR", "ALIA", "CURV", "PNTS", "CONS", "IKHD", "CINF", "ANIM",
+            "KEYS", "SKIN", "INFL", "WGTS", "CONN", "LOCK", "LAYR")
+
+    # Виды нод: создаются createNode, создаются своей командой (ikHandle, parentConstraint, skinCluster...),
+    # появляются вместе с другой нодой (эффектор вместе с ikHandle)
+NODE_PLAIN, NODE_CONSTRUCTED, NODE_IMPLICIT = 0, 1, 2
+IMPLICIT_TYPES = ("ikEffector",)
+CONSTRUCTED_TYPES = ("ikHandle", "parentConstraint", "skinCluster", "curveInfo", "displayLayer")
+
+    # Флаги атрибутов в LOCK и UATR
+LOCK_FLAGS = (("lock", 1), ("keyable", 2), ("channelBox", 4))
+
+    # Служебные ноды, которые Maya создает сама вместе с деформерами, решателями и слоями
+SKIP_TYPES = ("groupId", "groupParts", "tweak", "objectSet", "dagPose", "displayLayerManager", "ikSplineSolver",
+              "time", "shadingEngine", "hyperLayout")
+
+    # Трансформы, у которых сохраняются положение и состояние атрибутов
+TRANSFORM_TYPES = ("transform", "joint", "ikHandle")
+    # Атрибуты трансформа, которые Maya создает доступными для анимации: их состояние сохраняется всегда,
+    # чтобы при загрузке восстановилась и снятая доступность
+KEYABLE_DEFAULTS = ("visibility", "translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ",
+                    "scaleX", "scaleY", "scaleZ")
+
+_DISPLAY_ATTRS = ("visibility", "overrideEnabled", "overrideColor")
+    # Числовые атрибуты, значения которых сохраняются, по типам нод
+VALUE_ATTRS = {"transform": _DISPLAY_ATTRS + ("inheritsTransform",),
+               "joint": _DISPLAY_ATTRS + ("inheritsTransform", "radius"),
+               "nurbsCurve": _DISPLAY_ATTRS,
+               "ikHandle": ("inheritsTransform", "dTwistControlEnable", "dWorldUpType", "dForwardAxis",
+                            "dWorldUpAxis", "dWorldUpVectorX", "dWorldUpVectorY", "dWorldUpVectorZ",
+                            "dWorldUpVectorEndX", "dWorldUpVectorEndY", "dWorldUpVectorEndZ"),
+               "multiplyDivide": ("operation", "input1X", "input1Y", "input1Z", "input2X", "input2Y", "input2Z"),
+               "frameCache": ("varyTime",),
+               "displayLayer": ("color", "visibility", "displayType"),
+               "unitConversion": ("conversionFactor",)}
+
+    # Связи, которые команда создания ноды делает сама: по типу ноды - начала имен ее атрибутов.
+    # Связь анимационной кривой с анимируемым атрибутом сохраняется как обычная: при загрузке
+    # setKeyframe создает ее, а connectAttr с force повторяет без изменений
+CONSTRUCTED_PLUGS = {"ikHandle": ("startJoint", "endEffector", "inCurve"),
+                     "ikEffector": ("handlePath", "translate"),
+                     "parentConstraint": ("target", "constraint"),
+                     "skinCluster": ("matrix", "bindPreMatrix", "lockWeights", "influenceColor", "outputGeometry",
+                                     "input", "originalGeometry"),
+                     "curveInfo": ("inputCurve",)}
+
+def _isAnimCurve(nodeType):
+    return nodeType.startswith("animCurve")
+
+def _splitPlug(plug):
+    node, attr = plug.split(".", 1)
+    return node.split("|")[-1], attr
+
+    # Сделала ли связь сама команда создания ноды
+def _isConstructedPlug(nodeType, attr):
+    prefixes = CONSTRUCTED_PLUGS.get(nodeType)
+    return prefixes is not None and attr.split("[")[0].split(".")[0].startswith(prefixes)
+
+def _flags(lock, keyable, channelBox):
+    return sum(bit for (flag, bit), state in zip(LOCK_FLAGS, (lock, keyable, channelBox)) if state)
+
+    # Накопитель записей и таблицы строк при экспорте
+class GraphWriter(object):
+
+    def __init__(self):
+        self.strings = []
+        self.stringIndex = {}
+        self.sections = dict((tag, []) for tag in SECTIONS if tag != "STRS")
+
+    def string(self, value):
+        index = self.stringIndex.get(value)
+        if index is None:
+            index = self.stringIndex[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def add(self, tag, *values):
+        self.sections[tag].append(values)
+        return len(self.sections[tag]) - 1
+
+    def count(self, tag):
+        return len(self.strings) if tag == "STRS" else len(self.sections[tag])
+
+    def packStrings(self):
+        blob = [value.encode("utf-8") for value in self.strings]
+        offsets = [0]
+        for data in blob:
+            offsets.append(offsets[-1] + len(data))
+        return struct.pack("<{}I".format(len(offsets)), *offsets) + b"".join(blob)
+
+    # Записывает непустые секции в файл, возвращает количество записей по секциям
+    def write(self, path):
+        chunks = []
+        for tag in SECTIONS:
+            if not self.count(tag):
+                continue
+            if tag == "STRS":
+                data = self.packStrings()
+            else:
+                record = RECORDS[tag]
+                data = b"".join(record.pack(*values) for values in self.sections[tag])
+            chunks.append((tag, self.count(tag), data))
+        offset = _HEADER.size + _SECTION.size * len(chunks)
+        table = []
+        for tag, count, data in chunks:
+            offset += -offset % ALIGNMENT
+            table.append(_SECTION.pack(tag.encode("ascii"), count, offset, len(data)))
+            offset += len(data)
+        with open(path, "wb") as output:
+            output.write(_HEADER.pack(MAGIC, VERSION, len(chunks), 0))
+            output.write(b"".join(table))
+            position = _HEADER.size + _SECTION.size * len(chunks)
+            for tag, count, data in chunks:
+                output.write(b"\0" * (-position % ALIGNMENT))
+                position += -position % ALIGNMENT
+                output.write(data)
+                position += len(data)
+        return dict((tag, count) for tag, count, data in chunks)
+
+    # Сохраняет сетап под корнями roots в файл path. DAG-ноды берутся из иерархий корней, остальные
+    # ноды находятся по связям с ними. Возвращает количество записей по секциям
+def exportGraph(path, roots):
+    writer = GraphWriter()
+    nodes = []
+    index = {}
+
+    def addNode(name, parent):
+        nodeType = cmds.nodeType(name)
+        kind = NODE_IMPLICIT if nodeType in IMPLICIT_TYPES else NODE_PLAIN
+        if nodeType in CONSTRUCTED_TYPES or _isAnimCurve(nodeType):
+            kind = NODE_CONSTRUCTED
+        index[name] = len(nodes)
+        nodes.append((name, nodeType, kind))
+        writer.add("NODE", writer.string(name), writer.string(nodeType), index.get(parent, -1), kind)
+
+    # DAG-ноды в порядке обхода в глубину: родитель всегда записан раньше потомков
+    stack = [(root, None) for root in reversed(roots)]
+    while stack:
+        name, parent = stack.pop()
+        addNode(name, parent)
+        shapes = set(cmds.listRelatives(name, shapes = True) or [])
+        children = [child for child in cmds.listRelatives(name, children = True) or []
+                    if child not in shapes or not cmds.getAttr("{}.intermediateObject".format(child))]
+        stack.extend((child, name) for child in reversed(children))
+
+    # DG-ноды, связанные с сетапом напрямую или через другие DG-ноды
+    pending = [name for name, nodeType, kind in nodes]
+    while pending:
+        name = pending.pop(0)
+        for other in cmds.listConnections(name) or []:
+            other = other.split("|")[-1]
+            if other in index or cmds.nodeType(other) in SKIP_TYPES or cmds.ls(other, dag = True):
+                continue
+            addNode(other, None)
+            pending.append(other)
+
+    layers = {}
+    for n, (name, nodeType, kind) in enumerate(nodes):
+        if nodeType in TRANSFORM_TYPES:
+            _exportTransform(writer, n, name, nodeType)
+        if kind != NODE_IMPLICIT:
+            for attr in VALUE_ATTRS.get(nodeType, ()):
+                try:
+                    value = cmds.getAttr("{}.{}".format(name, attr))
+                except ValueError:
+                    continue
+                writer.add("VALS", n, writer.string(attr), float(value))
+        if kind == NODE_PLAIN:
+            _exportUserAttrs(writer, n, name)
+        if nodeType == "nurbsCurve":
+            points = cmds.getAttr("{}.cv[*]".format(name))
+            writer.add("CURV", n, cmds.getAttr("{}.degree".format(name)), cmds.getAttr("{}.form".format(name)),
+                       len(points), writer.count("PNTS"))
+            for point in points:
+                writer.add("PNTS", *[float(x) for x in point])
+        elif nodeType == "ikHandle":
+            effector = _source(name, "endEffector")
+            endJoint = [x for x in cmds.listConnections(effector, source = True, destination = False) or []
+                        if cmds.nodeType(x) == "joint"][0]
+            writer.add("IKHD", n, index[effector], index[_source(name, "startJoint")], index[endJoint],
+                       index[_source(name, "inCurve", shapes = True)])
+        elif nodeType == "parentConstraint":
+            driven = cmds.listRelatives(name, parent = True)[0]
+            pairs = cmds.listConnections(name, source = True, destination = False, connections = True,
+                                         plugs = True) or []
+            for own, other in zip(pairs[::2], pairs[1::2]):
+                attr = _splitPlug(own)[1]
+                if attr.startswith("target[") and attr.endswith(".targetParentMatrix"):
+                    writer.add("CONS", n, index[_splitPlug(other)[0]], index[driven])
+        elif nodeType == "curveInfo":
+            writer.add("CINF", n, index[_source(name, "inputCurve", shapes = True)])
+        elif nodeType == "skinCluster":
+            shape, influences, weights = cmds.getSkinWeights(name)
+            writer.add("SKIN", n, index[shape], len(influences), writer.count("INFL"), len(weights),
+                       writer.count("WGTS"))
+            for influence in influences:
+                writer.add("INFL", index[influence])
+            for row in weights:
+                for weight in row:
+                    writer.add("WGTS", float(weight))
+        elif _isAnimCurve(nodeType):
+            # Анимируемый атрибут - на DAG-ноде, остальные приемники кривой (frameCache) только читают ее
+            plugs = cmds.listConnections("{}.output".format(name), source = False, destination = True,
+                                         plugs = True)
+            keyed, attr = _splitPlug(([plug for plug in plugs if cmds.ls(_splitPlug(plug)[0], dag = True)] or
+                                      plugs)[0])
+            times = cmds.keyframe(name, query = True, timeChange = True) or []
+            values = cmds.keyframe(name, query = True, valueChange = True) or []
+            writer.add("ANIM", n, index[keyed], writer.string(attr), len(times), writer.count("KEYS"))
+            for time, value in zip(times, values):
+                writer.add("KEYS", float(time), float(value))
+
+        # Входящие связи: каждая связь записывается один раз, со стороны приемника
+        pairs = cmds.listConnections(name, source = True, destination = False, connections = True,
+                                     plugs = True) or []
+        for own, other in zip(pairs[::2], pairs[1::2]):
+            srcNode, srcAttr = _splitPlug(other)
+            dstAttr = _splitPlug(own)[1]
+            if srcNode not in index:
+                continue
+            srcType = nodes[index[srcNode]][1]
+            if srcType == "displayLayer" and dstAttr == "drawOverride":
+                layers.setdefault(index[srcNode], []).append(n)
+            elif not (_isConstructedPlug(nodeType, dstAttr) or _isConstructedPlug(srcType, srcAttr)):
+                writer.add("CONN", index[srcNode], writer.string(srcAttr), n, writer.string(dstAttr))
+
+    for layer in sorted(layers):
+        for member in layers[layer]:
+            writer.add("LAYR", layer, member)
+    return writer.write(path)
+
+    # Нода на другом конце входящей связи атрибута
+def _source(name, attr, shapes = False):
+    return cmds.listConnections("{}.{}".format(name, attr), source = True, destination = False,
+                                shapes = shapes)[0].split("|")[-1]
+
+def _exportTransform(writer, n, name, nodeType):
+    values = []
+    for attr in ("translate", "rotate", "scale", "jointOrient", "rotatePivot", "scalePivot"):
+        if attr == "jointOrient" and nodeType != "joint":
+            values.extend((0.0, 0.0, 0.0))
+        else:
+            values.extend(float(x) for x in cmds.getAttr("{}.{}".format(name, attr))[0])
+    writer.add("XFRM", n, *(values + [int(cmds.getAttr("{}.rotateOrder".format(name)))]))
+
+    locked = set(cmds.listAttr(name, locked = True) or [])
+    keyable = set(cmds.listAttr(name, keyable = True) or [])
+    channelBox = set(cmds.listAttr(name, channelBox = True) or [])
+    userAttrs = set(cmds.listAttr(name, userDefined = True) or [])
+    for attr in sorted((locked | keyable | channelBox | set(KEYABLE_DEFAULTS)) - userAttrs):
+        writer.add("LOCK", n, writer.string(attr), _flags(attr in locked, attr in keyable, attr in channelBox))
+
+    # Пользовательские числовые атрибуты и псевдонимы атрибутов
+def _exportUserAttrs(writer, n, name):
+    for attr in cmds.listAttr(name, userDefined = True) or []:
+        plug = "{}.{}".format(name, attr)
+        writer.add("UATR", n, writer.string(attr), float(cmds.getAttr(plug)),
+                   _flags(cmds.getAttr(plug, lock = True), cmds.getAttr(plug, keyable = True),
+                          cmds.getAttr(plug, channelBox = True)))
+    aliases = cmds.aliasAttr(name, query = True) or []
+    for alias, attr in zip(aliases[::2], aliases[1::2]):
+        writer.add("ALIA", n, writer.string(alias), writer.string(attr))
+
+    # Файл сетапа, открытый через mmap. Записи читаются по требованию, без разбора файла целиком
+class RigGraph(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        # Пустой файл mmap открыть не может: файл закрываем сами
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        if len(self._data) < _HEADER.size:
+            self.close()
+            raise ValueError("Not a rig graph file: {}".format(path))
+        magic, self.version, count, self.flags = _HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a rig graph file: {}".format(path))
+        if self.version > VERSION:
+            self.close()
+            raise ValueError("Unsupported rig graph version {} in {}".format(self.version, path))
+        # {тег: (количество записей, смещение, размер)}
+        self.sections = {}
+        for n in range(count):
+            tag, records, offset, size = _SECTION.unpack_from(self._data, _HEADER.size + n * _SECTION.size)
+            self.sections[tag.decode("ascii")] = (records, offset, size)
+        self._strings = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        self._file.close()
+
+    def count(self, tag):
+        return self.sections.get(tag, (0, 0, 0))[0]
+
+    # Количество записей по секциям, читается только таблица секций
+    def summary(self):
+        return dict((tag, section[0]) for tag, section in self.sections.items())
+
+    def record(self, tag, index):
+        records, offset, size = self.sections[tag]
+        if not 0 <= index < records:
+            raise IndexError("{} record {} out of range".format(tag, index))
+        record = RECORDS[tag]
+        return record.unpack_from(self._data, offset + index * record.size)
+
+    # Записи секции с first по first + count (по умолчанию - до конца секции)
+    def records(self, tag, first = 0, count = None):
+        records, offset, size = self.sections.get(tag, (0, 0, 0))
+        record = RECORDS[tag]
+        last = records if count is None else min(records, first + count)
+        for n in range(first, last):
+            yield record.unpack_from(self._data, offset + n * record.size)
+
+    def string(self, index):
+        value = self._strings.get(index)
+        if value is None:
+            records, offset, size = self.sections["STRS"]
+            start = _STRING_OFFSET.unpack_from(self._data, offset + index * _STRING_OFFSET.size)[0]
+            end = _STRING_OFFSET.unpack_from(self._data, offset + (index + 1) * _STRING_OFFSET.size)[0]
+            blob = offset + (records + 1) * _STRING_OFFSET.size
+            value = self._strings[index] = self._data[blob + start:blob + end].decode("utf-8")
+        return value
+
+    # Ноды файла: [(имя, тип, индекс родителя, вид)]
+    def nodes(self):
+        return [(self.string(name), self.string(nodeType), parent, kind)
+                for name, nodeType, parent, kind in self.records("NODE")]
+
+    # Воссоздает сетап из файла в текущей сцене. Ноды создаются, заполняются и соединяются пакетами
+    # однотипных команд. Возвращает словарь переименований: имя в файле -> имя, которое нода получила в сцене.
+    # path - путь к файлу или уже открытый RigGraph, если из одного файла загружается много копий
+def loadGraph(path):
+    if isinstance(path, RigGraph):
+        return _loadGraph(path)
+    with RigGraph(path) as graph:
+        return _loadGraph(graph)
+
+def _loadGraph(graph):
+    nodes = graph.nodes()
+    names = [name for name, nodeType, parent, kind in nodes]
+    string = graph.string
+    curves = dict((record[0], record) for record in graph.records("CURV"))
+
+    # Ноды, которые создаются createNode, - пакетом на каждый уровень иерархии: имя родителя в сцене
+    # известно только после его создания (Maya переименовывает ноду, если имя занято)
+    depth = []
+    for name, nodeType, parent, kind in nodes:
+        depth.append(depth[parent] + 1 if parent >= 0 else 0)
+    levels = {}
+    for n, (name, nodeType, parent, kind) in enumerate(nodes):
+        if kind == NODE_PLAIN and n not in curves:
+            levels.setdefault(depth[n], []).append(n)
+    for level in sorted(levels):
+        calls = []
+        for n in levels[level]:
+            name, nodeType, parent, kind = nodes[n]
+            if parent >= 0:
+                calls.append(((nodeType,), {"name": name, "parent": names[parent], "skipSelect": True}))
+            else:
+                calls.append(((nodeType,), {"name": name, "skipSelect": True}))
+        for n, created in zip(levels[level], cmds.applyBatch("createNode", calls)):
+            names[n] = created
+    layers = [n for n, node in enumerate(nodes) if node[1] == "displayLayer"]
+    created = cmds.applyBatch("createDisplayLayer", [((), {"name": names[n], "empty": True}) for n in layers])
+    for n, layer in zip(layers, created):
+        names[n] = layer
+
+    # Шейпы кривых - по одному пакету на сочетание степени и формы
+    groups = {}
+    for shape, degree, form, count, first in curves.values():
+        points = [tuple(point) for point in graph.records("PNTS", first, count)]
+        groups.setdefault((degree, form), []).append((shape, points))
+    for (degree, form), shapes in sorted(groups.items()):
+        created = cmds.addCurveShapes([names[nodes[shape][2]] for shape, points in shapes],
+                                      [points for shape, points in shapes], degree, periodic = form == 2,
+                                      names = [names[shape] for shape, points in shapes])
+        for (shape, points), name in zip(shapes, created):
+            names[shape] = name
+
+    cmds.applyBatch("addAttr", [((names[n],), {"longName": string(attr), "attributeType": "double",
+                                               "defaultValue": value})
+                                for n, attr, value, flags in graph.records("UATR")])
+    cmds.applyBatch("aliasAttr", [((string(alias), "{}.{}".format(names[n], string(attr))), {})
+                                  for n, alias, attr in graph.records("ALIA")])
+
+    values = _valueCalls(graph, names)
+    constructed = set(n for n, node in enumerate(nodes) if node[3] != NODE_PLAIN)
+    cmds.applyBatch("setAttr", [call for n, call in values if n not in constructed])
+
+    # Ноды, которые создаются своими командами: после того, как джоинты, кривые и атрибуты готовы
+    for handle, effector, startJoint, endJoint, curve in graph.records("IKHD"):
+        created = cmds.ikHandle(startJoint = names[startJoint], endEffector = names[endJoint],
+                                solver = "ikSplineSolver", createCurve = False, curve = names[curve])
+        names[handle] = cmds.rename(created[0], names[handle])
+        names[effector] = cmds.rename(created[1], names[effector])
+        parent = nodes[handle][2]
+        if parent >= 0:
+            cmds.parent(names[handle], names[parent], relative = True)
+    constraints = {}
+    for constraint, target, driven in graph.records("CONS"):
+        constraints.setdefault(constraint, (driven, []))[1].append(names[target])
+    for constraint, (driven, targets) in sorted(constraints.items()):
+        names[constraint] = cmds.parentConstraint(targets + [names[driven]], maintainOffset = True,
+                                                  name = names[constraint])[0]
+    for skin, shape, influenceCount, firstInfluence, pointCount, firstWeight in graph.records("SKIN"):
+        influences = [names[x[0]] for x in graph.records("INFL", firstInfluence, influenceCount)]
+        names[skin] = cmds.skinCluster(influences, names[shape], toSelectedBones = True, name = names[skin])[0]
+        weights = [x[0] for x in graph.records("WGTS", firstWeight, pointCount * influenceCount)]
+        cmds.setSkinWeights(names[skin], [weights[n:n + influenceCount]
+                                          for n in range(0, len(weights), influenceCount)])
+    for info, shape in graph.records("CINF"):
+        names[info] = cmds.rename(cmds.arclen(names[shape], constructionHistory = True), names[info])
+    for curve, keyed, attr, count, first in graph.records("ANIM"):
+        for time, value in graph.records("KEYS", first, count):
+            cmds.setKeyframe(names[keyed], attribute = string(attr), time = time, value = value)
+        created = cmds.keyframe(names[keyed], attribute = string(attr), query = True, name = True)[0]
+        names[curve] = cmds.rename(created, names[curve])
+    # Имена нод, созданных своими командами, известны только теперь: в сцене с такими же нодами
+    # (загрузка рядом с исходным сетапом) сцена дает им другие имена
+    cmds.applyBatch("setAttr", [call for n, call in _valueCalls(graph, names) if n in constructed])
+
+    cmds.applyBatch("connectAttr", [(("{}.{}".format(names[src], string(srcAttr)),
+                                      "{}.{}".format(names[dst], string(dstAttr))), {"force": True})
+                                    for src, srcAttr, dst, dstAttr in graph.records("CONN")])
+    members = {}
+    for layer, member in graph.records("LAYR"):
+        members.setdefault(layer, []).append(names[member])
+    cmds.assignDisplayLayers([(names[layer], members[layer]) for layer in sorted(members)])
+
+    # Блокировки - последними, после значений и связей. Атрибуты с одинаковыми флагами - одним вызовом
+    states = {}
+    for n, attr, flags in graph.records("LOCK"):
+        states.setdefault(flags, []).append("{}.{}".format(names[n], string(attr)))
+    for n, attr, value, flags in graph.records("UATR"):
+        states.setdefault(flags, []).append("{}.{}".format(names[n], string(attr)))
+    for flags, plugs in sorted(states.items()):
+        cmds.setAttrStates(plugs, lock = bool(flags & 1), keyable = bool(flags & 2), channelBox = bool(flags & 4))
+
+    return dict((nodes[n][0], name) for n, name in enumerate(names) if name != nodes[n][0])
+
+    # Вызовы setAttr для трансформов и числовых атрибутов: [(индекс ноды, вызов)].
+    # Значения по умолчанию пропускаются
+def _valueCalls(graph, names):
+    calls = []
+    for record in graph.records("XFRM"):
+        n = record[0]
+        for attr, start, default in (("translate", 1, 0.0), ("rotate", 4, 0.0), ("scale", 7, 1.0),
+                                     ("jointOrient", 10, 0.0), ("rotatePivot", 13, 0.0), ("scalePivot", 16, 0.0)):
+            value = record[start:start + 3]
+            if any(x != default for x in value):
+                calls.append((n, (("{}.{}".format(names[n], attr),) + value, {})))
+        if record[19]:
+            calls.append((n, (("{}.rotateOrder".format(names[n]), record[19]), {})))
+    for n, attr, value in graph.records("VALS"):
+        calls.append((n, (("{}.{}".format(names[n], graph.string(attr)), value), {})))
+    return calls
@@ -0,0 +1,63 @@
+    # coding=utf-8
+    # Раскладка сетапа: все положения, нужные частям рига, рассчитанные одним проходом без запросов к сцене.
+    # Части сетапа (руки, ноги, шея) берут свои точки крепления отсюда, а не из джоинтов в сцене
+from jointPlacement import mirrorFrames, offsetFrames
+from nameRegistry import resolveName
+
+    # Опорные кадры спины, к которым крепятся части сетапа
+ANCHORS = ("hip", "neckRoot")
+
+    # Положения сетапа: джоинты спины от бедер до основания шеи, FK джоинты и кадры крепления частей.
+    # attachments - (имя, опорный кадр из ANCHORS, смещение в его локальных осях) для левой стороны;
+    # правая сторона получается отражением левой относительно плоскости, перпендикулярной оси mirrorAxis
+class RigLayout(object):
+    __slots__ = ("positions", "rotations", "fkPositions", "fkRotations", "attachments", "mirrorAxis", "frames")
+
+    def __init__(self, spine, fk = ([], []), attachments = (), mirrorAxis = "x"):
+        self.positions = [tuple(p) for p in spine[0]]
+        self.rotations = [list(m) for m in spine[1]]
+        self.fkPositions = [tuple(p) for p in fk[0]]
+        self.fkRotations = [list(m) for m in fk[1]]
+        self.attachments = [base for base, anchor, offset in attachments]
+        self.mirrorAxis = mirrorAxis
+        # Мировые матрицы кадров крепления по именам со стороной: {"L_arm": матрица, "R_arm": матрица}
+        self.frames = {}
+        if not attachments or not self.positions:
+            return
+        anchors = [self.anchorFrame(anchor) for base, anchor, offset in attachments]
+        left = offsetFrames(anchors, [offset for base, anchor, offset in attachments])
+        right = self.mirror(left)
+        for base, leftFrame, rightFrame in zip(self.attachments, left, right):
+            self.frames[resolveName("", "left", base, "")] = leftFrame
+            self.frames[resolveName("", "right", base, "")] = rightFrame
+
+    # Позиции джоинтов спины без последнего (основания шеи)
+    def jointPositions(self):
+        return self.positions[:-1]
+
+    def neckRoot(self):
+        return self.positions[-1]
+
+    def hip(self):
+        return self.positions[0]
+
+    # Мировая матрица опорного кадра: ориентация и позиция первого или последнего джоинта спины
+    def anchorFrame(self, anchor):
+        if anchor not in ANCHORS:
+            raise ValueError("Unknown anchor: {}".format(anchor))
+        n = 0 if anchor == "hip" else -1
+        frame = list(self.rotations[n])
+        frame[12:15] = self.positions[n]
+        return frame
+
+    # Мировая матрица кадра крепления base на стороне side ("left" или "right")
+    def frame(self, base, side = "left"):
+        return list(self.frames[resolveName("", side, base, "")])
+
+    # Кадры крепления одной стороны: {имя без стороны: мировая матрица}
+    def side(self, side):
+        return dict((base, self.frame(base, side)) for base in self.attachments)
+
+    # Отражает мировые матрицы, рассчитанные для левой стороны, на правую
+    def mirror(self, matrices):
+        return mirrorFrames(matrices, self.mirrorAxis)
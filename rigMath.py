@@ -0,0 +1,227 @@
+    # coding=utf-8
+import math
+
+    # Порядки вращения в том же порядке индексов, что и атрибут rotateOrder в Maya
+ROTATE_ORDERS = ("xyz", "yzx", "zxy", "xzy", "yxz", "zyx")
+
+    # Индексы осей
+AXIS_INDEX = {"x": 0, "y": 1, "z": 2}
+
+    # Допуск сравнения чисел с плавающей точкой
+EPSILON = 1e-9
+
+    # Векторные операции над тройками чисел
+def vecAdd(a, b):
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+
+def vecSub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+def vecScale(a, s):
+    return (a[0] * s, a[1] * s, a[2] * s)
+
+def vecDot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def vecCross(a, b):
+    return (a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+def vecLength(a):
+    return math.sqrt(vecDot(a, a))
+
+def vecNormalize(a):
+    length = vecLength(a)
+    if length < EPSILON:
+        return (0.0, 0.0, 0.0)
+    return vecScale(a, 1.0 / length)
+
+def vecLerp(a, b, t):
+    return (a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t, a[2] + (b[2] - a[2]) * t)
+
+    # Матрицы 4х4 хранятся как плоский список из 16 чисел по строкам,
+    # как их возвращает Maya (точка умножается на матрицу слева)
+def identityMatrix():
+    return [1.0, 0.0, 0.0, 0.0,
+            0.0, 1.0, 0.0, 0.0,
+            0.0, 0.0, 1.0, 0.0,
+            0.0, 0.0, 0.0, 1.0]
+
+def multMatrix(a, b):
+    result = [0.0] * 16
+    for row in range(4):
+        for col in range(4):
+            result[row * 4 + col] = (a[row * 4] * b[col] + a[row * 4 + 1] * b[4 + col] +
+                                     a[row * 4 + 2] * b[8 + col] + a[row * 4 + 3] * b[12 + col])
+    return result
+
+    # Обратная матрица для аффинного преобразования
+def inverseMatrix(m):
+    a, b, c = m[0], m[1], m[2]
+    d, e, f = m[4], m[5], m[6]
+    g, h, i = m[8], m[9], m[10]
+    det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+    if abs(det) < EPSILON:
+        raise ValueError("Matrix is not invertible")
+    inv = 1.0 / det
+    r = [(e * i - f * h) * inv, (c * h - b * i) * inv, (b * f - c * e) * inv,
+         (f * g - d * i) * inv, (a * i - c * g) * inv, (c * d - a * f) * inv,
+         (d * h - e * g) * inv, (b * g - a * h) * inv, (a * e - b * d) * inv]
+    t = m[12:15]
+    return [r[0], r[1], r[2], 0.0,
+            r[3], r[4], r[5], 0.0,
+            r[6], r[7], r[8], 0.0,
+            -(t[0] * r[0] + t[1] * r[3] + t[2] * r[6]),
+            -(t[0] * r[1] + t[1] * r[4] + t[2] * r[7]),
+            -(t[0] * r[2] + t[1] * r[5] + t[2] * r[8]), 1.0]
+
+def transformPoint(p, m):
+    return (p[0] * m[0] + p[1] * m[4] + p[2] * m[8] + m[12],
+            p[0] * m[1] + p[1] * m[5] + p[2] * m[9] + m[13],
+            p[0] * m[2] + p[1] * m[6] + p[2] * m[10] + m[14])
+
+def transformVector(v, m):
+    return (v[0] * m[0] + v[1] * m[4] + v[2] * m[8],
+            v[0] * m[1] + v[1] * m[5] + v[2] * m[9],
+            v[0] * m[2] + v[1] * m[6] + v[2] * m[10])
+
+def matrixTranslation(m):
+    return (m[12], m[13], m[14])
+
+def matrixAxis(m, axis):
+    return (m[axis * 4], m[axis * 4 + 1], m[axis * 4 + 2])
+
+    # Матрица из трех осей (строк) и позиции
+def matrixFromAxes(x, y, z, translation=(0.0, 0.0, 0.0)):
+    return [x[0], x[1], x[2], 0.0,
+            y[0], y[1], y[2], 0.0,
+            z[0], z[1], z[2], 0.0,
+            translation[0], translation[1], translation[2], 1.0]
+
+def translationMatrix(t):
+    m = identityMatrix()
+    m[12], m[13], m[14] = t[0], t[1], t[2]
+    return m
+
+def scaleMatrix(s):
+    m = identityMatrix()
+    m[0], m[5], m[10] = s[0], s[1], s[2]
+    return m
+
+def axisRotationMatrix(axis, degrees):
+    c = math.cos(math.radians(degrees))
+    s = math.sin(math.radians(degrees))
+    if axis == 0:
+        return [1.0, 0.0, 0.0, 0.0, 0.0, c, s, 0.0, 0.0, -s, c, 0.0, 0.0, 0.0, 0.0, 1.0]
+    if axis == 1:
+        return [c, 0.0, -s, 0.0, 0.0, 1.0, 0.0, 0.0, s, 0.0, c, 0.0, 0.0, 0.0, 0.0, 1.0]
+    return [c, s, 0.0, 0.0, -s, c, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+    # Матрица вращения по углам Эйлера (в градусах) и порядку вращения
+def eulerToMatrix(rotation, rotateOrder=0):
+    order = ROTATE_ORDERS[rotateOrder] if not isinstance(rotateOrder, str) else rotateOrder
+    m = identityMatrix()
+    for letter in order:
+        axis = AXIS_INDEX[letter]
+        m = multMatrix(m, axisRotationMatrix(axis, rotation[axis]))
+    return m
+
+    # Углы Эйлера (в градусах) по матрице вращения без масштаба
+def matrixToEuler(m, rotateOrder=0):
+    order = ROTATE_ORDERS[rotateOrder] if not isinstance(rotateOrder, str) else rotateOrder
+    i, j, k = [AXIS_INDEX[x] for x in order]
+    # Переходим к записи для векторов-столбцов: R = Rk * Rj * Ri
+    r = [[m[col * 4 + row] for col in range(3)] for row in range(3)]
+    parity = 1.0 if (i, j, k) in ((0, 1, 2), (1, 2, 0), (2, 0, 1)) else -1.0
+    sj = max(-1.0, min(1.0, -parity * r[k][i]))
+    angles = [0.0, 0.0, 0.0]
+    angles[j] = math.asin(sj)
+    if abs(sj) < 1.0 - 1e-7:
+        angles[i] = math.atan2(parity * r[k][j], r[k][k])
+        angles[k] = math.atan2(parity * r[j][i], r[i][i])
+    else:
+        # Складывание рамок: весь поворот относим к первой оси
+        angles[i] = math.atan2(-parity * r[j][k], r[j][j])
+        angles[k] = 0.0
+    return tuple(math.degrees(a) for a in angles)
+
+    # Составляет локальную матрицу трансформа (S * R * JO * T)
+def composeMatrix(translate=(0.0, 0.0, 0.0), rotate=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0),
+                  rotateOrder=0, jointOrient=None):
+    m = multMatrix(scaleMatrix(scale), eulerToMatrix(rotate, rotateOrder))
+    if jointOrient is not None:
+        m = multMatrix(m, eulerToMatrix(jointOrient, 0))
+    m[12], m[13], m[14] = translate[0], translate[1], translate[2]
+    return m
+
+    # Раскладывает матрицу на перемещение, вращение и масштаб (без сдвига)
+def decomposeMatrix(m, rotateOrder=0):
+    axes = [matrixAxis(m, n) for n in range(3)]
+    scale = [vecLength(a) for a in axes]
+    if vecDot(vecCross(axes[0], axes[1]), axes[2]) < 0:
+        scale[0] = -scale[0]
+    normalized = [vecScale(axes[n], 1.0 / scale[n]) if abs(scale[n]) > EPSILON else axes[n] for n in range(3)]
+    rotation = matrixToEuler(matrixFromAxes(*normalized), rotateOrder)
+    return matrixTranslation(m), rotation, tuple(scale)
+
+    # Только вращательная часть матрицы (оси нормализованы, без перемещения)
+def rotationPart(m):
+    return matrixFromAxes(*[vecNormalize(matrixAxis(m, n)) for n in range(3)])
+
+    # Строит ориентацию, где aimAxis смотрит вдоль aim, а upAxis по возможности вдоль up
+def aimMatrix(aim, up, aimAxis="x", upAxis="y"):
+    aimVec = vecNormalize(aim)
+    upVec = vecSub(up, vecScale(aimVec, vecDot(up, aimVec)))
+    if vecLength(upVec) < 1e-6:
+        # Вектор вверх параллелен направлению, берем любую перпендикулярную ось
+        fallback = (0.0, 0.0, 1.0) if abs(aimVec[2]) < 0.9 else (1.0, 0.0, 0.0)
+        upVec = vecSub(fallback, vecScale(aimVec, vecDot(fallback, aimVec)))
+    upVec = vecNormalize(upVec)
+    axes = [None, None, None]
+    a, u = AXIS_INDEX[aimAxis], AXIS_INDEX[upAxis]
+    third = 3 - a - u
+    axes[a] = aimVec
+    axes[u] = upVec
+    # Третья ось достраивается так, чтобы система была правой
+    if (a + 1) % 3 == u:
+        axes[third] = vecCross(aimVec, upVec)
+    else:
+        axes[third] = vecCross(upVec, aimVec)
+    return matrixFromAxes(*axes)
+
+    # Вычисляет точку на открытой B-spline кривой с равномерным зажатым узловым вектором
+def bsplinePoint(cvs, degree, t):
+    count = len(cvs)
+    degree = min(degree, count - 1)
+    spans = count - degree
+    knots = [0.0] * (degree + 1) + [float(n) / spans for n in range(1, spans)] + [1.0] * (degree + 1)
+    t = min(max(t, 0.0), 1.0)
+    span = degree
+    while span < count - 1 and t >= knots[span + 1]:
+        span += 1
+    points = [list(cvs[span - degree + n]) for n in range(degree + 1)]
+    for r in range(1, degree + 1):
+        for n in range(degree, r - 1, -1):
+            idx = span - degree + n
+            denom = knots[idx + degree - r + 1] - knots[idx]
+            alpha = 0.0 if denom == 0 else (t - knots[idx]) / denom
+            points[n] = [(1.0 - alpha) * points[n - 1][c] + alpha * points[n][c] for c in range(3)]
+    return tuple(points[degree])
+
+    # Узловой вектор в формате Maya (count + degree - 1 узлов) для открытой или периодической кривой
+def curveKnots(count, degree, periodic=False):
+    if periodic:
+        return [float(n) for n in range(1 - degree, count)]
+    spans = count - degree
+    return [0.0] * (degree - 1) + [float(n) for n in range(spans + 1)] + [float(spans)] * (degree - 1)
+
+    # Приближенная длина B-spline кривой по выборке точек
+def curveLength(cvs, degree=1, samples=64):
+    if len(cvs) < 2:
+        return 0.0
+    if degree <= 1:
+        return sum(vecLength(vecSub(cvs[n + 1], cvs[n])) for n in range(len(cvs) - 1))
+    steps = max(samples, len(cvs) * 8)
+    points = [bsplinePoint(cvs, degree, float(n) / steps) for n in range(steps + 1)]
+    return sum(vecLength(vecSub(points[n + 1], points[n])) for n in range(steps))
@@ -0,0 +1,469 @@
+    # coding=utf-8
+    # Приведение уже собранных сетапов к текущим правилам сборки без пересборки. Желаемый граф сетапа
+    # собирается по настройкам TorsoRig в отдельной сцене в памяти, затем сравнивается с сетапом в сцене,
+    # и в сцену вносится минимальный набор изменений: переименования, значения, блокировки, связи, слои,
+    # создание и удаление нод. Так изменения NAMING, блокировок cleanKAttr или цветов setLayers
+    # применяются к готовым сценам за несколько пакетов команд на сетап.
+    #
+    #   patch = reconcileRig(rig)              # rig - TorsoRig, собранный в этой сессии
+    #   patch = reconcileRig(TorsoRig("quadruped"), root = "AFrig_rootTransform_grp_ctrl1", num = 9, fkNum = 5)
+    #
+    # Оба графа сравниваются в виде файлов rigGraph. Ноды сопоставляются по иерархии, типам и связям,
+    # а не только по именам, поэтому переименованная нода остается той же нодой
+import copy
+import os
+import re
+import tempfile
+
+from sceneBackend import cmds, useBackend
+from rigGraph import KEYABLE_DEFAULTS, NODE_PLAIN, RigGraph, exportGraph
+from rigSetup import TorsoRig, _renamedNodes
+
+    # Настройки TorsoRig, по которым собирается желаемый граф
+SETTINGS = TorsoRig.SETTINGS
+
+    # Допуск при сравнении значений
+TOLERANCE = 1e-6
+
+    # Составные атрибуты трансформа в записях XFRM: (атрибут, первое значение в записи)
+_XFRM_ATTRS = (("translate", 1), ("rotate", 4), ("scale", 7), ("jointOrient", 10), ("rotatePivot", 13),
+               ("scalePivot", 16))
+_TRAILING_DIGITS = re.compile(r"\d+$")
+
+    # Состояние сетапа, прочитанное из файла rigGraph: словари по индексам нод
+class RigState(object):
+
+    def __init__(self, graph):
+        string = graph.string
+        self.nodes = graph.nodes()
+        self.names = [name for name, nodeType, parent, kind in self.nodes]
+        self.children = {}
+        for n, (name, nodeType, parent, kind) in enumerate(self.nodes):
+            self.children.setdefault(parent, []).append(n)
+        # {(нода, атрибут): значение}, составные атрибуты - кортежами
+        self.values = {}
+        for record in graph.records("XFRM"):
+            n = record[0]
+            for attr, start in _XFRM_ATTRS:
+                if attr != "jointOrient" or self.nodes[n][1] == "joint":
+                    self.values[(n, attr)] = tuple(record[start:start + 3])
+            self.values[(n, "rotateOrder")] = record[19]
+        for n, attr, value in graph.records("VALS"):
+            self.values[(n, string(attr))] = value
+        self.userAttrs = dict(((n, string(attr)), (value, flags)) for n, attr, value, flags in graph.records("UATR"))
+        self.aliases = dict(((n, string(alias)), string(attr)) for n, alias, attr in graph.records("ALIA"))
+        self.curves = dict((shape, (degree, form, tuple(graph.records("PNTS", first, count))))
+                           for shape, degree, form, count, first in graph.records("CURV"))
+        self.connections = set((src, string(srcAttr), dst, string(dstAttr))
+                               for src, srcAttr, dst, dstAttr in graph.records("CONN"))
+        self.locks = dict(((n, string(attr)), flags) for n, attr, flags in graph.records("LOCK"))
+        self.layers = set(graph.records("LAYR"))
+        self.constraints = {}
+        for constraint, target, driven in graph.records("CONS"):
+            self.constraints.setdefault(constraint, (driven, []))[1].append(target)
+        self.handles = dict((record[0], record[1:]) for record in graph.records("IKHD"))
+        self.infos = dict(graph.records("CINF"))
+        self.anims = dict((curve, (keyed, string(attr), tuple(graph.records("KEYS", first, count))))
+                          for curve, keyed, attr, count, first in graph.records("ANIM"))
+        self.skins = {}
+        for skin, shape, influenceCount, firstInfluence, pointCount, firstWeight in graph.records("SKIN"):
+            influences = [x[0] for x in graph.records("INFL", firstInfluence, influenceCount)]
+            weights = [x[0] for x in graph.records("WGTS", firstWeight, pointCount * influenceCount)]
+            self.skins[skin] = (shape, influences, weights)
+
+    # Атрибуты, значения которых задают связи и ограничения: {нода: множество атрибутов}
+    def drivenAttrs(self):
+        driven = {}
+        for src, srcAttr, dst, dstAttr in self.connections:
+            driven.setdefault(dst, set()).add(dstAttr)
+        for constraint, (node, targets) in self.constraints.items():
+            driven.setdefault(node, set()).update(("translate", "rotate"))
+        for handle, (effector, start, end, curve) in self.handles.items():
+            joint = end
+            while joint >= 0:
+                driven.setdefault(joint, set()).add("rotate")
+                if joint == start:
+                    break
+                joint = self.nodes[joint][2]
+        return driven
+
+    # Каналы, доступные для анимации: их значения - поза, а не часть сетапа
+    def isPosable(self, n, attr):
+        plugs = [attr + axis for axis in "XYZ"] if (n, attr + "X") in self.locks else [attr]
+        return any(self.locks.get((n, plug), 0) & 2 and not self.locks.get((n, plug), 0) & 1 for plug in plugs)
+
+    # Изменения, которые приводят сетап в сцене к желаемому графу. Ссылки на ноды - индексы желаемого графа,
+    # кроме удаляемых нод и связей: они заданы именами в сцене
+class RigPatch(object):
+
+    def __init__(self, desired, actual, match):
+        self.desired = desired
+        self.actual = actual
+        # {индекс в желаемом графе: индекс в сцене}
+        self.match = match
+        self.renames = []
+        self.creates = []
+        self.deletes = []
+        self.values = []
+        self.userAttrs = []
+        self.aliases = []
+        self.curves = []
+        self.disconnects = []
+        self.connects = []
+        self.layers = []
+        self.weights = []
+        self.locks = []
+        # Различия, которые нельзя исправить на месте: сетап нужно пересобрать
+        self.structural = []
+        # DG-ноды сцены без пары в желаемом графе: ноды других сетапов, анимация. Они не удаляются
+        self.foreign = []
+
+    def isEmpty(self):
+        return not any(self.summary().values())
+
+    # Количество изменений по видам
+    def summary(self):
+        return dict((key, len(getattr(self, key))) for key in ("renames", "creates", "deletes", "values", "userAttrs",
+                                                                "aliases", "curves", "disconnects", "connects",
+                                                                "layers", "weights", "locks", "structural"))
+
+    # Вносит изменения в текущую сцену пакетами однотипных команд.
+    # Возвращает словарь переименований: имя в сцене до изменений -> имя после
+    def apply(self):
+        if self.structural:
+            raise RuntimeError("Rig structure differs, rebuild required: {}".format("; ".join(self.structural)))
+        desired, actual = self.desired, self.actual
+        current = dict((d, actual.names[a]) for d, a in self.match.items())
+
+        cmds.applyBatch("disconnectAttr", [(("{}.{}".format(src, srcAttr), "{}.{}".format(dst, dstAttr)), {})
+                                           for src, srcAttr, dst, dstAttr in self.disconnects])
+        if self.deletes:
+            cmds.delete(self.deletes)
+
+        # Родители переименовываются раньше потомков; сцена может заодно переименовать шейпы,
+        # поэтому имена шейпов перечитываются после переименования их трансформа
+        for d, name in self.renames:
+            if _sameName(name, current[d]):
+                continue
+            current[d] = cmds.rename(current[d], name)
+            shapes = [n for n in desired.children.get(d, []) if n in current and desired.nodes[n][1] in _SHAPE_TYPES]
+            for n, shape in zip(shapes, _shapeNames(current[d])):
+                current[n] = shape
+
+        for d in self.creates:
+            name, nodeType, parent, kind = desired.nodes[d]
+            if d in desired.curves:
+                degree, form, points = desired.curves[d]
+                current[d] = cmds.addCurveShapes([current[parent]], [list(points)], degree, periodic = form == 2,
+                                                 names = [name])[0]
+            elif parent >= 0:
+                current[d] = cmds.createNode(nodeType, name = name, parent = current[parent], skipSelect = True)
+            elif nodeType == "displayLayer":
+                current[d] = cmds.createDisplayLayer(name = name, empty = True)
+            else:
+                current[d] = cmds.createNode(nodeType, name = name, skipSelect = True)
+
+        cmds.applyBatch("addAttr", [((current[d],), {"longName": attr, "attributeType": "double",
+                                                     "defaultValue": value})
+                                    for d, attr, value, new in self.userAttrs if new])
+        # Значения меняются при снятой блокировке, итоговые состояния атрибутов выставляются в конце
+        plugs = []
+        for d, attr, value in self.values:
+            plugs.extend("{}.{}".format(current[d], x) for x in _components(attr, value))
+        plugs.extend("{}.{}".format(current[d], attr) for d, attr, value, new in self.userAttrs if not new)
+        states = cmds.applyBatch("getAttr", [((plug,), {"lock": True}) for plug in plugs])
+        locked = [plug for plug, state in zip(plugs, states) if state]
+        if locked:
+            cmds.setAttrStates(locked, lock = False)
+        calls = []
+        for d, attr, value in self.values:
+            plug = "{}.{}".format(current[d], attr)
+            calls.append(((plug,) + value if isinstance(value, tuple) else (plug, value), {}))
+        calls.extend(((("{}.{}".format(current[d], attr), value), {}) for d, attr, value, new in self.userAttrs))
+        cmds.applyBatch("setAttr", calls)
+        cmds.applyBatch("aliasAttr", [((alias, "{}.{}".format(current[d], attr)), {})
+                                      for d, alias, attr in self.aliases])
+        cmds.applyBatch("setAttr", [(("{}.cv[{}]".format(current[d], n),) + tuple(point), {})
+                                    for d, points in self.curves for n, point in enumerate(points)])
+        if locked:
+            cmds.setAttrStates(locked, lock = True)
+
+        cmds.applyBatch("connectAttr", [(("{}.{}".format(current[src], srcAttr),
+                                          "{}.{}".format(current[dst], dstAttr)), {"force": True})
+                                        for src, srcAttr, dst, dstAttr in self.connects])
+        members = {}
+        for layer, member in self.layers:
+            members.setdefault(layer, []).append(current[member])
+        cmds.assignDisplayLayers([(current[layer], members[layer]) for layer in sorted(members)])
+        for skin, weights in self.weights:
+            count = len(desired.skins[skin][1])
+            cmds.setSkinWeights(current[skin], [weights[n:n + count] for n in range(0, len(weights), count)])
+
+        states = {}
+        for d, attr, flags in self.locks:
+            states.setdefault(flags, []).append("{}.{}".format(current[d], attr))
+        for flags, plugs in sorted(states.items()):
+            cmds.setAttrStates(plugs, lock = bool(flags & 1), keyable = bool(flags & 2), channelBox = bool(flags & 4))
+
+        return dict((actual.names[a], current[d]) for d, a in self.match.items() if current[d] != actual.names[a])
+
+_SHAPE_TYPES = ("nurbsCurve", "nurbsSurface", "mesh", "locator")
+
+    # Шейпы трансформа без промежуточных, в порядке сцены (как при экспорте в rigGraph)
+def _shapeNames(node):
+    return [shape for shape in cmds.listRelatives(node, shapes = True) or []
+            if not cmds.getAttr("{}.intermediateObject".format(shape))]
+
+    # Имена совпадают, если имя в сцене - желаемое с номерами, которые сцена добавила при совпадении имен
+    # (AFrig_torso_ctrl1, AFrig_torso_ctrl1Shape)
+def _sameName(desired, actual):
+    n = 0
+    for char in actual:
+        if n < len(desired) and char == desired[n]:
+            n += 1
+        elif not char.isdigit():
+            return False
+    return n == len(desired)
+
+    # Имя по умолчанию, которое сцена дает ноде сама (skinCluster1): такие ноды не переименовываются
+def _isDefaultName(name, nodeType):
+    return _TRAILING_DIGITS.sub("", name) == nodeType
+
+    # Простые атрибуты, из которых состоит значение
+def _components(attr, value):
+    if isinstance(value, tuple):
+        return [attr + axis for axis in "XYZ"]
+    return [attr]
+
+def _differs(a, b):
+    if isinstance(a, tuple) or isinstance(b, tuple):
+        return len(a) != len(b) or any(_differs(x, y) for x, y in zip(a, b))
+    return abs(a - b) > TOLERANCE * max(1.0, abs(a), abs(b))
+
+    # Сопоставляет ноды желаемого графа нодам сцены: корни, затем потомки сопоставленных нод
+    # (по имени, потом по типу и порядку), затем DG-ноды по имени и по связям с уже сопоставленными нодами
+def matchNodes(desired, actual):
+    match = {}
+    used = set()
+
+    def pair(d, a):
+        match[d] = a
+        used.add(a)
+
+    if desired.nodes and actual.nodes and desired.nodes[0][1] == actual.nodes[0][1]:
+        pair(0, 0)
+    queue = [0] if 0 in match else []
+    while queue:
+        d = queue.pop(0)
+        wanted = desired.children.get(d, [])
+        present = [a for a in actual.children.get(match[d], []) if a not in used]
+        for rule in (lambda x, y: _sameName(desired.names[x], actual.names[y]), lambda x, y: True):
+            for child in wanted:
+                if child in match:
+                    continue
+                for a in present:
+                    if a not in used and desired.nodes[child][1] == actual.nodes[a][1] and rule(child, a):
+                        pair(child, a)
+                        break
+        queue.extend(child for child in wanted if child in match)
+
+    # DG-ноды: сначала по имени, потом по связям и записям нод с уже сопоставленными нодами
+    roots = [d for d in desired.children.get(-1, []) if d not in match]
+    free = [a for a in actual.children.get(-1, []) if a not in used]
+    for d in roots:
+        for a in free:
+            if a not in used and desired.nodes[d][1] == actual.nodes[a][1] and \
+                    _sameName(desired.names[d], actual.names[a]):
+                pair(d, a)
+                break
+    inverse = dict((a, d) for d, a in match.items())
+    changed = True
+    while changed:
+        changed = False
+        for d in roots:
+            if d in match:
+                continue
+            for a in _candidates(desired, actual, match, d):
+                if a not in used and actual.nodes[a][1] == desired.nodes[d][1] and a not in inverse:
+                    pair(d, a)
+                    inverse[a] = d
+                    changed = True
+                    break
+    return match
+
+    # Ноды сцены, которые связаны с сопоставленными нодами так же, как нода d желаемого графа
+def _candidates(desired, actual, match, d):
+    result = []
+    for src, srcAttr, dst, dstAttr in desired.connections:
+        if src == d and dst in match:
+            result.extend(s for s, sa, t, ta in actual.connections
+                          if t == match[dst] and ta == dstAttr and sa == srcAttr)
+        elif dst == d and src in match:
+            result.extend(t for s, sa, t, ta in actual.connections
+                          if s == match[src] and sa == srcAttr and ta == dstAttr)
+    if d in desired.skins and desired.skins[d][0] in match:
+        result.extend(skin for skin, record in actual.skins.items() if record[0] == match[desired.skins[d][0]])
+    if d in desired.infos and desired.infos[d] in match:
+        result.extend(info for info, curve in actual.infos.items() if curve == match[desired.infos[d]])
+    if d in desired.anims and desired.anims[d][0] in match:
+        keyed, attr = match[desired.anims[d][0]], desired.anims[d][1]
+        result.extend(curve for curve, record in actual.anims.items() if record[:2] == (keyed, attr))
+    members = [member for layer, member in desired.layers if layer == d and member in match]
+    if members:
+        result.extend(layer for layer, member in actual.layers if member == match[members[0]])
+    return result
+
+    # Различия между желаемым графом и сетапом в сцене
+def diffStates(desired, actual):
+    match = matchNodes(desired, actual)
+    inverse = dict((a, d) for d, a in match.items())
+    patch = RigPatch(desired, actual, match)
+
+    # Ноды: новые создаются, лишние ноды иерархии сетапа удаляются (вместе с потомками)
+    for d, (name, nodeType, parent, kind) in enumerate(desired.nodes):
+        if d in match:
+            if not _sameName(name, actual.names[match[d]]) and not _isDefaultName(name, nodeType):
+                patch.renames.append((d, name))
+        elif kind != NODE_PLAIN:
+            patch.structural.append("missing {} {}".format(nodeType, name))
+        else:
+            patch.creates.append(d)
+    for a, (name, nodeType, parent, kind) in enumerate(actual.nodes):
+        if a in inverse:
+            continue
+        if parent < 0:
+            patch.foreign.append(name)
+        elif parent in inverse:
+            if kind != NODE_PLAIN:
+                patch.structural.append("unexpected {} {}".format(nodeType, name))
+            patch.deletes.append(name)
+
+    # Ноды, которые создаются своими командами, должны быть устроены так же
+    for d, (driven, targets) in desired.constraints.items():
+        record = actual.constraints.get(match.get(d))
+        if record is not None and (record[0] != match.get(driven) or
+                                   sorted(record[1]) != sorted(match.get(x) for x in targets)):
+            patch.structural.append("constraint {} targets differ".format(desired.names[d]))
+    for d, record in desired.handles.items():
+        other = actual.handles.get(match.get(d))
+        if other is not None and tuple(match.get(x) for x in record) != tuple(other):
+            patch.structural.append("ikHandle {} differs".format(desired.names[d]))
+    for d, (keyed, attr, keys) in desired.anims.items():
+        other = actual.anims.get(match.get(d))
+        if other is not None and (other[:2] != (match.get(keyed), attr) or _differs(other[2], keys)):
+            patch.structural.append("animation curve {} differs".format(desired.names[d]))
+    for d, (shape, influences, weights) in desired.skins.items():
+        other = actual.skins.get(match.get(d))
+        if other is None:
+            continue
+        if other[0] != match.get(shape) or other[1] != [match.get(x) for x in influences]:
+            patch.structural.append("skinCluster {} influences differ".format(desired.names[d]))
+        elif _differs(tuple(other[2]), tuple(weights)):
+            patch.weights.append((d, weights))
+
+    # Значения: каналы позы и атрибуты, которые задаются связями, не трогаются
+    drivenDesired = desired.drivenAttrs()
+    drivenActual = actual.drivenAttrs()
+    for (d, attr), value in sorted(desired.values.items()):
+        a = match.get(d)
+        driven = drivenDesired.get(d, set()) | drivenActual.get(a, set())
+        if any(x in driven for x in [attr] + _components(attr, value)):
+            continue
+        if a is None:
+            patch.values.append((d, attr, value))
+            continue
+        current = actual.values.get((a, attr))
+        if current is not None and _differs(current, value) and not actual.isPosable(a, attr):
+            patch.values.append((d, attr, value))
+    for (d, attr), (value, flags) in sorted(desired.userAttrs.items()):
+        current = actual.userAttrs.get((match.get(d), attr))
+        if current is None:
+            patch.userAttrs.append((d, attr, value, True))
+        elif _differs(current[0], value) and not current[1] & 2:
+            patch.userAttrs.append((d, attr, value, False))
+    for (d, alias), attr in sorted(desired.aliases.items()):
+        if actual.aliases.get((match.get(d), alias)) != attr:
+            patch.aliases.append((d, alias, attr))
+    for d, (degree, form, points) in sorted(desired.curves.items()):
+        other = actual.curves.get(match.get(d))
+        if other is None:
+            continue
+        if other[:2] != (degree, form) or len(other[2]) != len(points):
+            patch.structural.append("curve {} topology differs".format(desired.names[d]))
+        elif _differs(tuple(x for p in other[2] for x in p), tuple(x for p in points for x in p)):
+            patch.curves.append((d, points))
+
+    # Связи между нодами сетапа. Связи с чужими нодами (не сопоставленными DG-нодами) сохраняются
+    wanted = set((match.get(src), srcAttr, match.get(dst), dstAttr)
+                 for src, srcAttr, dst, dstAttr in desired.connections)
+    for src, srcAttr, dst, dstAttr in sorted(desired.connections):
+        if (match.get(src), srcAttr, match.get(dst), dstAttr) not in actual.connections or \
+                src not in match or dst not in match:
+            patch.connects.append((src, srcAttr, dst, dstAttr))
+    wantedInputs = set((dst, dstAttr) for src, srcAttr, dst, dstAttr in wanted)
+    for src, srcAttr, dst, dstAttr in sorted(actual.connections):
+        if src not in inverse or dst not in inverse or (src, srcAttr, dst, dstAttr) in wanted:
+            continue
+        if (dst, dstAttr) not in wantedInputs:
+            patch.disconnects.append((actual.names[src], srcAttr, actual.names[dst], dstAttr))
+
+    # Слои: ноды, которые должны оказаться в другом слое
+    actualLayers = set((inverse.get(layer), inverse.get(member)) for layer, member in actual.layers)
+    patch.layers = sorted(x for x in desired.layers if x not in actualLayers)
+
+    # Состояния атрибутов: блокировка, доступность для анимации и видимость в channel box
+    for (d, attr), flags in sorted(desired.locks.items()):
+        if actual.locks.get((match.get(d), attr), 0 if d in match else None) != flags:
+            patch.locks.append((d, attr, flags))
+    for (a, attr), flags in sorted(actual.locks.items()):
+        d = inverse.get(a)
+        if d is not None and flags and (d, attr) not in desired.locks and attr not in KEYABLE_DEFAULTS:
+            patch.locks.append((d, attr, 0))
+    for (d, attr), (value, flags) in sorted(desired.userAttrs.items()):
+        current = actual.userAttrs.get((match.get(d), attr))
+        if current is None or current[1] != flags:
+            patch.locks.append((d, attr, flags))
+    return patch
+
+    # Собирает желаемый граф сетапа по настройкам rig в отдельной сцене в памяти и сохраняет его в path.
+    # Текущая сцена не затрагивается
+def exportDesiredGraph(rig, path, num = None, fkNum = None):
+    from memoryBackend import MemoryBackend
+
+    desired = TorsoRig(rig.rigType)
+    for slot in SETTINGS:
+        setattr(desired, slot, copy.deepcopy(getattr(rig, slot)))
+    desired.resetState()
+    with useBackend(MemoryBackend()):
+        desired.build(num or rig.jointCount, fkNum or rig.fkJointCount)
+        exportGraph(path, [desired.rootGrp])
+
+    # Изменения, которые приводят сетап с корнем root в текущей сцене к графу, который сейчас собрал бы rig.
+    # root по умолчанию - корень самого рига, у несобранного рига root обязателен; num и fkNum - количество
+    # джоинтов, если rig не собирался в этой сессии. С apply=True изменения вносятся в сцену, а имена нод в риге
+    # обновляются
+def reconcileRig(rig, root = None, num = None, fkNum = None, apply = True):
+    root = root or rig.rootGrp
+    if not root:
+        raise ValueError("Rig is not built and no root is given")
+    paths = []
+    try:
+        for role in ("desired", "actual"):
+            handle, path = tempfile.mkstemp(suffix = ".rgrf")
+            os.close(handle)
+            paths.append(path)
+        exportDesiredGraph(rig, paths[0], num, fkNum)
+        exportGraph(paths[1], [root])
+        with RigGraph(paths[0]) as desiredGraph, RigGraph(paths[1]) as actualGraph:
+            patch = diffStates(RigState(desiredGraph), RigState(actualGraph))
+    finally:
+        for path in paths:
+            os.remove(path)
+    if apply and not patch.isEmpty():
+        renames = patch.apply()
+        for slot in rig.NODE_STATE:
+            setattr(rig, slot, _renamedNodes(getattr(rig, slot), renames))
+        for old, new in renames.items():
+            rig.names.discard(old)
+            rig.names.issue(new)
+    return patch
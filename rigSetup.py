@@ -1,5 +1,21 @@
     # coding=utf-8
-from maya import cmds
+import contextlib
+import copy
+import os
+import sys
+import tempfile
+
+import rigMath
+from sceneBackend import cmds, undoChunk, useBackend
+from buildProfiler import BuildProfiler, buildStage
+from controlShapes import shapeTemplate
+from rigFootprint import formatFootprint, overBudget, sceneFootprint
+from nameRegistry import NameRegistry, nameTemplate, resolveName, trackedNames
+from rigGraph import RigGraph, exportGraph, loadGraph
+from squashFalloff import PREVIEW_WIDTH, FalloffSampler
+from jointPlacement import chainLocalTransforms, curveSkinWeights, placeJoints, remapPoints
+from rigLayout import RigLayout
+from transformCache import cachedTransforms
 
     # Глобальный словарь наименования различных элементов сетапа
 NAMING = {"spineJointName" : "spine",
@@ -23,6 +39,8 @@ NAMING = {"spineJointName" : "spine",
           "squashSuffix" : "sqsh",
           "DNTName" : "DoNotTouch",
           "allGrpName" : "rootTransform",
+          "segmentName" : "seg",
+          "midName" : "mid",
           "layer" : "LYR"}
 
     # Словарь сокращений принятых для блокировки аттрибутов
@@ -30,47 +48,65 @@ ATTRIB = {"rad":"radius", "tx":"translateX","ty":"translateY","tz":"translateZ",
 
     # Функция для блокировки аттрибутов
 def setLimitedKeyability(name, parm):
-    for item in parm:
-        cmds.setAttr("{}.{}".format(name, ATTRIB[item]), keyable=False, lock=True, channelBox = False)
-
-    # Класс генерации имени
-class NamingAgreementHandler:
-
-    assetName = None
-    side = None
-    base = None
-    suffix = None
-    nodeName = None
+    lockAttributes({name: parm})
+
+    # Блокирует и прячет аттрибуты сразу у многих нод: {нода: сокращения из ATTRIB} или список пар.
+    # Все аттрибуты уходят в сцену одним вызовом, уже заблокированные сцена пропускает
+def lockAttributes(nodeAttrs):
+    items = nodeAttrs.items() if isinstance(nodeAttrs, dict) else nodeAttrs
+    plugs = []
+    seen = set()
+    for name, parm in items:
+        for item in parm:
+            plug = "{}.{}".format(name, ATTRIB[item])
+            if plug not in seen:
+                seen.add(plug)
+                plugs.append(plug)
+    return cmds.setAttrStates(plugs, lock = True, keyable = False, channelBox = False)
+
+    # Включает цвет отображения нод одним пакетом setAttr
+def setOverrideColor(nodes, color):
+    calls = []
+    for node in nodes:
+        calls.append((("{}.overrideEnabled".format(node), 1), {}))
+        calls.append((("{}.overrideColor".format(node), color), {}))
+    cmds.applyBatch("setAttr", calls)
+
+    # Неизменяемая копия значения для сравнения входных данных этапов сборки
+def freezeValue(value):
+    if isinstance(value, dict):
+        return tuple(freezeValue(x) for x in value.values())
+    if isinstance(value, (list, tuple)):
+        return tuple(freezeValue(x) for x in value)
+    return value
+
+    # Класс генерации имени. Соглашение (assetName, side, suffix) компилируется в шаблон один раз за сессию,
+    # готовые имена берутся из кэша (см. nameRegistry)
+class NamingAgreementHandler(object):
+    __slots__ = ("assetName", "side", "base", "suffix", "nodeName")
 
     def __init__(self, assetName = "AFrig", side = "center", base = "", suffix = ""):
 
-        self.side = side
+        template = nameTemplate(assetName, side, suffix)
+        self.assetName = template.assetName
+        self.side = template.side
         self.base = base
-        self.suffix = suffix
-        self.assetName = assetName
-        self.resolveSide()
-        self.resolveAssetName()
-        self.resolveSuffix()
-        self.createName()
+        self.suffix = template.suffix
+        self.nodeName = resolveName(assetName, side, base, suffix)
 
+    # Методы соглашения для кода, который меняет поля и собирает имя заново. Поля после __init__ уже
+    # приведены к виду шаблона, поэтому методы, как и раньше, рассчитаны на исходные значения полей
     def resolveSide(self):
 
-        if self.side.lower() == "left":
-            self.side = "L_"
-        elif self.side.lower() == "right":
-            self.side = "R_"
-        elif self.side.lower() == "center":
-            self.side = ""
+        self.side = nameTemplate("", self.side, "").side
 
     def resolveAssetName(self):
 
-        if self.assetName != "":
-            self.assetName += "_"
+        self.assetName = nameTemplate(self.assetName, "", "").assetName
 
     def resolveSuffix(self):
 
-        if self.suffix != "":
-            self.suffix = "_" + self.suffix
+        self.suffix = nameTemplate("", "", self.suffix).suffix
 
     def createName(self):
 
@@ -78,14 +114,8 @@ class NamingAgreementHandler:
             self.nodeName = self.assetName + self.side + self.base + self.suffix
 
     # Класс генерации контроллера
-class ControllerAgreementHandler:
-
-    controlName = None
-    sdkNode = None
-    conNode = None
-    posNode = None
-    driven = None
-    lastNode = None
+class ControllerAgreementHandler(object):
+    __slots__ = ("controlName", "sdkNode", "conNode", "posNode", "driven", "lastNode")
 
     ROTATE_ORDER = {"xyz" : 0, "yzx" : 1, "zxy" : 2, "xzy"  : 3, "yxz" : 4, "zyx" : 5}
 
@@ -103,39 +133,60 @@ class ControllerAgreementHandler:
                    "circleZ": {"normal": (0, 0, 1)}
                    }
 
+    # Стек SDK/CON/POS и положение контроллера рассчитываются заранее: трансформы создаются одной операцией
+    # уже вложенными друг в друга, а CV и пивоты сразу получают значения, которые раньше давали совмещение
+    # с driven и заморозка (makeIdentity)
     def __init__(self, name = "control", shape = "cube", driven = None, scale = 1, pos = True,
                  sdk = False, con = False, suffix = NAMING["controlSuffix"], toOrign = False):
+        self.controlName = self.sdkNode = self.conNode = self.posNode = self.lastNode = None
         self.driven = driven
-        self.createControl(shape = shape, name = name, suffix = suffix)
+        offset = self.offsetMatrix(scale, toOrign)
+        self.createControl(shape = shape, name = name, suffix = suffix, scale = scale,
+                           offset = offset if scale > 0 else None)
         self.resolveotherNodes(sdk = sdk, con = con, pos = pos)
-        self.setPosition()
-        self.setScale(scale,toOrign)
+        self.setPosition(offset, scale)
 
-    def createControl(self, shape, name,suffix):
+    # Создает трансформ контроллера и добавляет в него шейп из шаблона, сразу в нужном масштабе.
+    # С offset CV переносятся этой матрицей, как после заморозки контроллера в ее положении
+    def createControl(self, shape, name,suffix, scale = 1, offset = None):
 
         name = NamingAgreementHandler(assetName = "", side = "", base = name,
                                                                     suffix = suffix).nodeName
-        if(not "circle" in shape):
-            self.controlName = cmds.curve(name =  name,
-                                      point = self.CONTROL_LIB[shape]["cvsList"],
-                                      degree = self.CONTROL_LIB[shape]["degree"])
+        template = shapeTemplate(shape, self.CONTROL_LIB[shape])
+        if offset is not None:
+            points = template.transformedPoints(offset, scale)
         else:
-            self.controlName = cmds.circle(normal = self.CONTROL_LIB[shape]["normal"], name = name)[0]
+            points = template.points(scale if scale > 0 else 1)
+        self.controlName = cmds.createNode("transform", name = name)
+        cmds.addCurveShapes([self.controlName], [points], template.degree, template.periodic)
 
         self.lastNode = self.controlName
 
-    def setPosition(self):
-
-        if self.driven != None:
-            cmds.delete(cmds.parentConstraint(self.driven, self.lastNode, maintainOffset = False))
-
-    def setScale(self, scale, toOrign):
-
-        if scale > 0:
-            cmds.setAttr("{}.scale".format(self.lastNode), scale, scale, scale)
-            if toOrign == True:
-                cmds.setAttr("{}.translate".format(self.lastNode), 0,0,0,)
-            cmds.makeIdentity(self.lastNode, apply=True, translate=True, scale=True, rotate=True)
+    # Положение контроллера, совмещенного с driven так же, как parentConstraint без смещения:
+    # ориентация берется из мировой матрицы driven, позиция - из его пивота (с toOrign - в начале координат).
+    # None - контроллер без driven
+    def offsetMatrix(self, scale, toOrign):
+
+        if self.driven == None:
+            return None
+        matrix = rigMath.rotationPart(cmds.xform(self.driven, query = True, matrix = True, worldSpace = True))
+        if not (toOrign == True and scale > 0):
+            matrix[12:15] = cmds.xform(self.driven, query = True, rotatePivot = True, worldSpace = True)
+        return matrix
+
+    # Масштаб и смещение уже заложены в CV, трансформы стека остаются единичными, как после заморозки:
+    # пивоты всех нод стека переносятся в позицию driven. Без масштаба стек просто совмещается с driven
+    def setPosition(self, offset, scale):
+
+        if offset is None:
+            return
+        if scale <= 0:
+            cmds.xform(self.lastNode, worldSpace = True, matrix = offset)
+        elif any(offset[12:15]):
+            pivot = tuple(offset[12:15])
+            nodes = [x for x in (self.controlName, self.sdkNode, self.conNode, self.posNode) if x != None]
+            cmds.applyBatch("setAttr", [(("{}.{}".format(node, attr),) + pivot, {})
+                                        for node in nodes for attr in ("rotatePivot", "scalePivot")])
 
     def setRotateOrder(self, rotateOrder):
 
@@ -148,37 +199,19 @@ class ControllerAgreementHandler:
 
         setLimitedKeyability(self.controlName, parm)
 
+    # Создает стек POS > CON > SDK над контроллером одной операцией (см. SceneBackend.createTransformChain)
     def resolveotherNodes(self, sdk, con, pos):
 
-        if sdk:
-            self.sdkNode = cmds.createNode("transform",
-                                           name = NamingAgreementHandler(assetName = "", side = "", base = self.controlName,
-                                                                                 suffix = NAMING["sdkNodeSuffix"]).nodeName)
-            cmds.parent(self.controlName, self.sdkNode)
-            self.lastNode = self.sdkNode
-        if con:
-            self.conNode = cmds.createNode("transform",
-                                           name=NamingAgreementHandler(assetName="", side="", base=self.controlName,
-                                                                       suffix=NAMING["constraintNodeSuffix"]).nodeName)
-            if sdk:
-                cmds.parent(self.sdkNode, self.conNode)
-            else:
-                cmds.parent(self.controlName, self.conNode)
-
-            self.lastNode = self.conNode
-
-        if pos:
-            self.posNode = cmds.createNode("transform",
-                                        name=NamingAgreementHandler(assetName="", side="", base=self.controlName,
-                                                                       suffix=NAMING["positionNodeSuffix"]).nodeName)
-            if con:
-                cmds.parent(self.conNode, self.posNode)
-            elif sdk:
-                cmds.parent(self.sdkNode, self.posNode)
-            else:
-                cmds.parent(self.controlName, self.posNode)
-
-            self.lastNode = self.posNode
+        slots = [slot for slot, enabled in (("posNode", pos), ("conNode", con), ("sdkNode", sdk)) if enabled]
+        if not slots:
+            return
+        suffixes = {"posNode": NAMING["positionNodeSuffix"], "conNode": NAMING["constraintNodeSuffix"],
+                    "sdkNode": NAMING["sdkNodeSuffix"]}
+        names = [NamingAgreementHandler(assetName = "", side = "", base = self.controlName,
+                                        suffix = suffixes[slot]).nodeName for slot in slots]
+        for slot, node in zip(slots, cmds.createTransformChain(names, child = self.controlName)):
+            setattr(self, slot, node)
+        self.lastNode = getattr(self, slots[0])
 
 
     def deleteAll(self):
@@ -191,116 +224,233 @@ class ControllerAgreementHandler:
         if(self.posNode != None):
             cmds.delete(self.posNode)
 
-    # Класс для создания экземпляра сетапа спины
-class TorsoRig:
+    # Дополнительный участок сегментированной IK spline системы (TorsoRig.IK_SEGMENTS > 1): свои ikHandle,
+    # кривая, скин и ноды растяжения и сжатия. Первый участок хранится в основных полях рига
+class SplineSegment(object):
+    __slots__ = ("ikSystemObjs", "skinCluster", "arclenNode", "baseStretch", "baseSquash", "scaleCompNode")
+
+    def __init__(self, ikSystemObjs = None, skinCluster = "", arclenNode = "", baseStretch = "", baseSquash = "",
+                 scaleCompNode = ""):
+        self.ikSystemObjs = ikSystemObjs or []
+        self.skinCluster = skinCluster
+        self.arclenNode = arclenNode
+        self.baseStretch = baseStretch
+        self.baseSquash = baseSquash
+        self.scaleCompNode = scaleCompNode
 
-    # Внутренние переменные определяющие систему
-    LOCATORS = {}
+    # Класс для создания экземпляра сетапа спины
+class TorsoRig(object):
+    # Состояние каждого экземпляра хранится в нем самом, поэтому в одной сессии можно собрать
+    # сколько угодно независимых сетапов (см. buildRigs)
+    __slots__ = ("LOCATORS", "locatorNodes", "ROTATE_ORDER", "ROTATE_FK_ORDER", "twistUp", "rigType",
+                 "SQUASH_MODE", "SKIN_WEIGHTS", "SKIN_FALLOFF", "JOINT_SPACING", "GUIDES", "IK_SEGMENTS",
+                 "MID_DRIVERS", "CONTROL_DRIVE", "jointCount", "fkJointCount", "stageInputs",
+                 "previousSpine", "joints", "fkJoints", "bindJoints", "ikControls", "ikSystemObjs", "skinCluster",
+                 "ikSegments", "arclenNode", "baseStretch", "baseSquash", "scaleCompNode", "squashCurve", "squashNodes",
+                 "falloffSampler", "neckRootPosition", "bodyCtrl", "DNTGrp", "torsoGrp", "rootGrp", "fkLayer", "ikLayer",
+                 "torsoBaseLayer", "profiler", "names", "rigLayout", "layoutInputs")
+
+    # Внутренние константы, определяющие систему
     LOCK_SCALE = 20
-    ROTATE_ORDER = ""
-    ROTATE_FK_ORDER = ""
     CONTROL_SCALE = 30
     J_RADIUS = 3
-    twistUp =()
-
-    # Основные составляющие сетапа спины
-    # Основные джоинты спины
-    joints = []
-    # Джоинты для FK системы
-    fkJoints = []
-    # Джоинты для управления IK системой через кривую
-    bindJoints = []
-    # Контроллеры IK системы
-    ikControls = []
-    # Список из ikHandle, effector, curve системы IK spline
-    ikSystemObjs = []
-    # Нода рассчета длины кривой
-    arclenNode = ""
-    # Нода расчета маштабирования системы джоинтов вдоль основоного направления
-    baseStretch = ""
-    # Нода расчета маштабирования системы джоинтов вдоль второстепенных осей
-    baseSquash = ""
-
-    # Выходные данные для других частей сетапа
-    # Позиция основания шеи
-    neckRootPosition = []
-    # Контроллер спины целиком
-    bodyCtrl = ""
-    # Группа для объектов, которые не нужно трогать
-    DNTGrp = ""
-    # Группа для bodyCtrl, DNTGrp
-    torsoGrp = ""
-    # Группа позиционирования всей системы рига
-    rootGrp = ""
-
-    # Визуальные слои для сетапа спины
-    # FK слой
-    fkLayer = ""
-    # IK слой
-    ikLayer = ""
-    # Слой для контроллера спины
-    torsoBaseLayer = ""
+
+    # Точки крепления частей сетапа к спине для каждого типа рига: (имя, опорный кадр, смещение в его осях).
+    # Смещения заданы для левой стороны, правая сторона - ее отражение (см. rigLayout)
+    ATTACHMENTS = {"biped": (("arm", "neckRoot", (-5.0, 0.0, 15.0)), ("leg", "hip", (-5.0, 0.0, 10.0))),
+                   "quadruped": (("frontLeg", "neckRoot", (0.0, 5.0, 10.0)), ("backLeg", "hip", (0.0, 5.0, 10.0)))}
+
+    # Этапы полной сборки в порядке выполнения
+    BUILD_STAGES = ("createLocators", "updateLocators", "createPositionJoints", "createSpineJoints",
+                    "createBindJoints", "createIkControls", "createIkSpineSystem", "setupStretch", "setupSquash",
+                    "setupTwist", "createFkCtrlJoints", "createBodyControl", "cleanScene")
+    # Данные, от которых зависит положение джоинтов спины
+    LAYOUT_INPUTS = ("LOCATORS", "GUIDES", "JOINT_SPACING", "jointCount")
+    # Входные данные каждого этапа: по ним update() определяет, какие этапы нужно пересчитать
+    STAGE_INPUTS = {"createLocators": ("LOCATORS",),
+                    "updateLocators": (),
+                    "createPositionJoints": LAYOUT_INPUTS,
+                    "createSpineJoints": LAYOUT_INPUTS,
+                    "createBindJoints": LAYOUT_INPUTS + ("IK_SEGMENTS", "MID_DRIVERS"),
+                    "createIkControls": LAYOUT_INPUTS + ("IK_SEGMENTS", "MID_DRIVERS", "CONTROL_DRIVE"),
+                    "createIkSpineSystem": LAYOUT_INPUTS + ("IK_SEGMENTS", "MID_DRIVERS", "SKIN_WEIGHTS",
+                                                            "SKIN_FALLOFF"),
+                    "setupStretch": LAYOUT_INPUTS + ("IK_SEGMENTS",),
+                    "setupSquash": ("jointCount", "SQUASH_MODE", "IK_SEGMENTS"),
+                    "setupTwist": ("twistUp", "IK_SEGMENTS"),
+                    "createFkCtrlJoints": LAYOUT_INPUTS + ("fkJointCount", "ROTATE_FK_ORDER"),
+                    "createBodyControl": LAYOUT_INPUTS + ("IK_SEGMENTS", "MID_DRIVERS"),
+                    "cleanScene": ()}
+    # Методы, которые обновляют уже созданные ноды этапа на месте
+    STAGE_UPDATES = {"createLocators": "moveLocators",
+                     "createPositionJoints": "movePositionJoints",
+                     "createSpineJoints": "moveSpineJoints",
+                     "createBindJoints": "moveBindJoints",
+                     "createIkControls": "moveIkControls",
+                     "createIkSpineSystem": "moveIkCurve",
+                     "setupStretch": "updateStretchRest",
+                     "setupTwist": "setTwistVectors",
+                     "createFkCtrlJoints": "moveFkJoints",
+                     "createBodyControl": "moveBodyControl"}
+    # Входные данные, от которых зависит количество нод: при их изменении сетап пересобирается целиком
+    STRUCTURAL_INPUTS = ("jointCount", "fkJointCount", "SQUASH_MODE", "IK_SEGMENTS", "MID_DRIVERS", "CONTROL_DRIVE")
+    # Данные рига, в которых хранятся имена нод сцены (см. cloneState)
+    NODE_STATE = ("locatorNodes", "joints", "fkJoints", "bindJoints", "ikControls", "ikSystemObjs", "skinCluster", "ikSegments",
+                  "arclenNode", "baseStretch", "baseSquash", "scaleCompNode", "squashCurve", "squashNodes", "bodyCtrl",
+                  "DNTGrp", "torsoGrp", "rootGrp", "fkLayer", "ikLayer", "torsoBaseLayer")
+    # Настройки рига, с которыми собирается такой же сетап в другой сцене (см. estimateFootprint, rigReconcile)
+    SETTINGS = ("LOCATORS", "ROTATE_ORDER", "ROTATE_FK_ORDER", "twistUp", "SQUASH_MODE", "SKIN_WEIGHTS", "SKIN_FALLOFF",
+                "JOINT_SPACING", "GUIDES", "IK_SEGMENTS", "MID_DRIVERS", "CONTROL_DRIVE")
+    # Меньше FK джоинтов при подборе сетапа под бюджет не бывает: бедра, плечи и один FK контроллер
+    MIN_FK_JOINTS = 3
 
     # Инициализация определяющих переменных в зависимости от типа рига
     def __init__(self, type = "biped"):
         self.ROTATE_ORDER = "zxy"
+        self.ROTATE_FK_ORDER = ""
+        self.twistUp = ()
+        self.setRigType(type)
+        # Режим системы сжатия: "perJoint" - frameCache и multiplyDivide на каждый джоинт,
+        # "compact" - значения кривой считываются один раз, одна multiplyDivide на три джоинта
+        self.SQUASH_MODE = "perJoint"
+        # Веса кривой IK spline: "dropoff" - считает Maya по удаленности CV от джоинтов,
+        # "analytic" - по положению CV вдоль кривой между джоинтами скина (jointPlacement.curveSkinWeights)
+        self.SKIN_WEIGHTS = "dropoff"
+        # Затухание веса между соседними джоинтами скина для "analytic" (см. jointPlacement.FALLOFF_MODES)
+        self.SKIN_FALLOFF = "smooth"
+        # Распределение джоинтов вдоль спины: "uniform" или "arcLength" (см. jointPlacement.SPACING_MODES)
+        self.JOINT_SPACING = "uniform"
+        # Промежуточные точки изгиба спины между бедрами и шеей, пустой список - прямая спина
+        self.GUIDES = []
+        # Количество участков IK spline системы. Каждый участок - свой ikHandle с кривой, растяжением и сжатием,
+        # на границах участков - джоинты кривых со своими IK контроллерами. Длинные цепочки (хвосты, шеи)
+        # решаются участками ограниченной длины, скручивание распределяется между границами
+        self.IK_SEGMENTS = 1
+        # Количество промежуточных джоинтов кривой (например, контроллер середины спины) на каждом участке.
+        # Они делят участок поровну, получают свои IK контроллеры и входят в скин кривой участка
+        self.MID_DRIVERS = 0
+        # Как IK контроллеры ведут джоинты кривых: "constraint" - parentConstraint на каждый джоинт,
+        # "matrix" - мировая матрица контроллера напрямую в offsetParentMatrix джоинта (Maya 2020+),
+        # без нод ограничений, которые вычисляются на каждом кадре
+        self.CONTROL_DRIVE = "constraint"
+        # Количество джоинтов позиционирования и FK джоинтов, с которыми собран сетап
+        self.jointCount = 0
+        self.fkJointCount = 0
+        # Профайлер этапов сборки, None - замеры отключены
+        self.profiler = None
+        # Имена нод, выданные сценой за сборку, и переименования из-за совпадений
+        self.names = NameRegistry()
+        # Кэш кривой splineStretch по джоинтам спины (см. squashFalloffSampler)
+        self.falloffSampler = None
+        # Раскладка сетапа и входные данные, по которым она рассчитана (см. layout)
+        self.rigLayout = None
+        self.layoutInputs = None
 
         if type == "biped":
             self.LOCATORS = {"neckRoot": [0, 150, 0], "hip": [0, 90, 0]}
+        elif type == "quadruped":
+            self.LOCATORS = {"neckRoot": [0, 30, 30], "hip": [0, 30, -30]}
+        self.resetState()
+
+    # Настройки, зависящие от типа рига, кроме положения направляющих. Поддерживаются "biped" и "quadruped"
+    def setRigType(self, type):
+        if type == "biped":
             self.twistUp =(0,0,-1)
             self.ROTATE_FK_ORDER = "yzx"
         elif type == "quadruped":
-            self.LOCATORS = {"neckRoot": [0, 30, 30], "hip": [0, 30, -30]}
             self.twistUp = (0, 1, 0)
             self.ROTATE_FK_ORDER = "zxy"
+        else:
+            raise ValueError("Unknown rig type: {}".format(type))
+        self.rigType = type
 
     # Функция для быстрой очистки выделения
     def clearSelection(self):
         cmds.select(clear=True)
 
-    # Создает локатор в области таза и в области начала шеи
+    # Создает локатор в области таза и в области начала шеи. Позиции в LOCATORS остаются под именами
+    # "neckRoot" и "hip", имена локаторов в сцене хранятся отдельно в locatorNodes
+    @buildStage
     def createLocators(self):
-        locators = {}
-
-        for item in self.LOCATORS:
-            locators[cmds.spaceLocator(name = NamingAgreementHandler(base = item, suffix=NAMING["locatorSuffix"]).nodeName)[0]] = self.LOCATORS[item]
-        self.LOCATORS = locators
         for item in self.LOCATORS:
-            cmds.setAttr("{}.scale".format(item), self.LOCK_SCALE, self.LOCK_SCALE, self.LOCK_SCALE)
-            cmds.setAttr("{}.overrideEnabled".format(item), 1)
-            cmds.setAttr("{}.overrideColor".format(item), 17)
-            cmds.setAttr("{}.translate".format(item), self.LOCATORS[item][0], self.LOCATORS[item][1], self.LOCATORS[item][2])
-            self.clearSelection()
+            self.locatorNodes[item] = cmds.spaceLocator(name = NamingAgreementHandler(base = item, suffix=NAMING["locatorSuffix"]).nodeName)[0]
+        for item, node in self.locatorNodes.items():
+            cmds.setAttr("{}.scale".format(node), self.LOCK_SCALE, self.LOCK_SCALE, self.LOCK_SCALE)
+            cmds.setAttr("{}.translate".format(node), self.LOCATORS[item][0], self.LOCATORS[item][1], self.LOCATORS[item][2])
+        setOverrideColor(list(self.locatorNodes.values()), 17)
+        self.clearSelection()
 
     # Сохраняет новые позиции локатора после модификации пользователем их во Вьюпорте
+    @buildStage
     def updateLocators(self):
-        for item in self.LOCATORS:
-            self.LOCATORS[item] = cmds.xform(item, query = True, translation = True, worldSpace = True)
+        for item, node in self.locatorNodes.items():
+            self.LOCATORS[item] = cmds.xform(node, query = True, translation = True, worldSpace = True)
+
+    # Переносит локаторы в сохраненные позиции, если они еще есть в сцене
+    def moveLocators(self):
+        for item, node in self.locatorNodes.items():
+            if cmds.objExists(node):
+                cmds.setAttr("{}.translate".format(node), *self.LOCATORS[item])
 
     # Удаляет локаторы
     def delLocators(self):
-        for item in self.LOCATORS:
-            cmds.delete(item)
+        for node in self.locatorNodes.values():
+            cmds.delete(node)
+        self.locatorNodes = {}
 
     # Согласно позициям локаторов создает джоинты для позиционирования их пользователем
-    def createPositionJoints(self, num = 2):
+    @buildStage
+    def createPositionJoints(self, num = 2, guides = None, spacing = None):
         self.delLocators()
         self.clearSelection()
-        delta = [(self.LOCATORS[self.LOCATORS.keys()[0]][z] - self.LOCATORS[self.LOCATORS.keys()[1]][z]) / (num - 1 ) for z in range(0,3)]
-        for n in range(num):
-            self.joints.append(cmds.joint(position = (delta[x] * n  + self.LOCATORS[self.LOCATORS.keys()[1]][x] for x in range(0,3) ),
-                                          radius = self.J_RADIUS,
-                                          name = NamingAgreementHandler(base = "joint_" + str(n + 1),
-                                                                         suffix = NAMING["jointSuffix"]).nodeName))
-            cmds.setAttr("{}.overrideEnabled".format(self.joints[n]), 1)
-            cmds.setAttr("{}.overrideColor".format(self.joints[n]), 17)
-            self.clearSelection()
+        self.setLayout(guides, spacing)
+        self.jointCount = num
+        translations = chainLocalTransforms(self.layout().positions)[0]
+        names = [NamingAgreementHandler(base = "joint_" + str(n + 1), suffix = NAMING["jointSuffix"]).nodeName
+                 for n in range(num)]
+        self.joints.extend(cmds.createJointChain(names, translations, radius = self.J_RADIUS, chain = False))
+        setOverrideColor(self.joints[-num:], 17)
+
+    # Запоминает направляющие и способ распределения джоинтов, если они заданы
+    def setLayout(self, guides = None, spacing = None):
+        if guides is not None:
+            self.GUIDES = [list(guide) for guide in guides]
+        if spacing is not None:
+            self.JOINT_SPACING = spacing
+
+    # Мировые позиции и ориентации num джоинтов от бедер до шеи (ориентация как у orientJoint="xzy", "xup")
+    def spineLayout(self, num):
+        return placeJoints(self.LOCATORS["hip"], self.LOCATORS["neckRoot"], num, self.GUIDES,
+                           self.JOINT_SPACING, up = (1.0, 0.0, 0.0), aimAxis = "x", upAxis = "z")
+
+    # Мировые позиции и ориентации num FK джоинтов от бедер до end
+    def fkLayout(self, num, end):
+        return placeJoints(self.LOCATORS["hip"], end, num, self.GUIDES,
+                           self.JOINT_SPACING, up = (1.0, 0.0, 0.0), aimAxis = "x", upAxis = "z")
+
+    # Раскладка сетапа для текущих направляющих (rigLayout.RigLayout): джоинты спины, FK джоинты, основание шеи,
+    # бедра и кадры крепления частей с обеих сторон. Рассчитывается без запросов к сцене один раз
+    # на каждое сочетание входных данных, этапы обновления и части сетапа берут положения из нее
+    def layout(self):
+        inputs = freezeValue([getattr(self, name) for name in self.LAYOUT_INPUTS + ("fkJointCount", "rigType")])
+        if self.rigLayout is None or inputs != self.layoutInputs:
+            spine = self.spineLayout(self.jointCount)
+            fk = self.fkLayout(self.fkJointCount, spine[0][-2]) if self.fkJointCount and self.jointCount > 1 else ([], [])
+            self.rigLayout = RigLayout(spine, fk, self.ATTACHMENTS.get(self.rigType, ()))
+            self.layoutInputs = inputs
+        return self.rigLayout
+
+    # Переносит джоинты позиционирования, пока по ним еще не созданы джоинты спины
+    def movePositionJoints(self):
+        if "createSpineJoints" in self.stageInputs:
+            return
+        for joint, position in zip(self.joints, self.layout().positions):
+            cmds.setAttr("{}.translate".format(joint), *position)
 
     # Сброс изменений, выполненных пользователем над управляющими джоинтами
     def resetPositionJoints(self):
-        for n in self.joints:
-            cmds.setAttr("{}.overrideEnabled".format(n), 0)
-            cmds.setAttr("{}.radius".format(n) , self.J_RADIUS)
+        cmds.applyBatch("setAttr", [(("{}.overrideEnabled".format(n), 0), {}) for n in self.joints] +
+                        [(("{}.radius".format(n), self.J_RADIUS), {}) for n in self.joints])
 
     # Соединяет джоинты
     def connectJoints(self, joints):
@@ -308,6 +458,7 @@ class TorsoRig:
             cmds.parent(joints[n + 1], joints[n])
 
     # Создает рабочие джоинты по джоинтам позиционирования
+    @buildStage
     def createSpineJoints(self):
         self.resetPositionJoints()
         self.connectJoints(self.joints)
@@ -326,7 +477,24 @@ class TorsoRig:
         self.neckRootPosition = cmds.xform(self.joints[-1], query=True, translation=True, worldSpace=True)
         cmds.delete(self.joints.pop())
 
-    # Создает 2 джоинта, контролирующие кривую IK spline системы
+    # Переносит джоинты спины на месте: выставляет translate и jointOrient по новым направляющим
+    def moveSpineJoints(self):
+        layout = self.layout()
+        self.neckRootPosition = list(layout.neckRoot())
+        translations, jointOrients = chainLocalTransforms(layout.jointPositions(), layout.rotations[:-1],
+                                                          self.parentWorldMatrix(self.joints[0]))
+        cmds.applyBatch("setAttr", _transformCalls(self.joints, translations, jointOrients))
+
+    # Мировая матрица родителя объекта, None - объект в корне сцены
+    def parentWorldMatrix(self, node):
+        parent = cmds.listRelatives(node, parent = True)
+        if not parent:
+            return None
+        return cmds.xform(parent[0], query = True, matrix = True, worldSpace = True)
+
+    # Создает джоинты, контролирующие кривые IK spline системы: начало и конец спины, затем границы участков
+    # и промежуточные джоинты по порядку вдоль спины
+    @buildStage
     def createBindJoints(self):
         self.bindJoints.append(cmds.duplicate(self.joints[0], parentOnly=True,
                                                    name=NamingAgreementHandler(base=NAMING["hipName"],
@@ -335,12 +503,82 @@ class TorsoRig:
                                                    name=NamingAgreementHandler(base=NAMING["shoulderName"],
                                                                                suffix=NAMING["jointSuffix"]).nodeName)[0])
         cmds.parent(self.bindJoints[1], world=True)
+        for bound, base in self.innerDrivers():
+            name = NamingAgreementHandler(base = base, suffix = NAMING["jointSuffix"]).nodeName
+            self.bindJoints.append(cmds.duplicate(self.joints[bound], parentOnly = True, name = name)[0])
+            cmds.parent(self.bindJoints[-1], world = True)
 
         # Сброс ориентации джоинтов
         for x in self.bindJoints:
             cmds.joint(x, edit = True,  orientJoint = "none", zeroScaleOrient = True)
 
+    # Переносит джоинты кривой в начало и конец спины и на границы участков. После createIkControls их ведут
+    # контроллеры
+    def moveBindJoints(self):
+        if "createIkControls" in self.stageInputs:
+            return
+        for joint, position in zip(self.bindJoints, self.bindPositions(self.layout().positions)):
+            cmds.xform(joint, worldSpace = True, translation = position)
+
+    # Границы участков IK spline системы: индексы джоинтов спины от первого до последнего
+    def segmentBounds(self):
+        last = len(self.joints) - 1
+        count = max(1, min(self.IK_SEGMENTS, last))
+        return [int(round(float(k * last) / count)) for k in range(count + 1)]
+
+    # Основа имен нод участка: первый участок называется как вся система
+    def segmentBase(self, segment):
+        if segment == 0:
+            return NAMING["spineJointName"]
+        return "{}_{}{}".format(NAMING["spineJointName"], NAMING["segmentName"], segment + 1)
+
+    # Индексы джоинтов спины, на которых стоят джоинты кривой каждого участка: концы участка и MID_DRIVERS
+    # промежуточных между ними. Промежуточных не больше, чем джоинтов спины внутри участка
+    def segmentDriverBounds(self):
+        bounds = self.segmentBounds()
+        result = []
+        for start, end in zip(bounds, bounds[1:]):
+            count = max(1, min(self.MID_DRIVERS + 1, end - start))
+            result.append([start + int(round(float(k * (end - start)) / count)) for k in range(count + 1)])
+        return result
+
+    # Джоинты кривых между началом и концом спины по порядку: (индекс джоинта спины, основа имени)
+    def innerDrivers(self):
+        drivers = []
+        for k, bounds in enumerate(self.segmentDriverBounds()):
+            if k > 0:
+                drivers.append((bounds[0], self.segmentBase(k)))
+            drivers.extend((bound, "{}_{}{}".format(self.segmentBase(k), NAMING["midName"], n))
+                           for n, bound in enumerate(bounds[1:-1], 1))
+        return drivers
+
+    # Джоинты кривых по порядку вдоль спины
+    def segmentDrivers(self):
+        return [self.bindJoints[0]] + self.bindJoints[2:] + [self.bindJoints[1]]
+
+    # Джоинты кривой каждого участка по порядку вдоль спины: джоинты на концах участка и промежуточные между ними
+    def curveDrivers(self):
+        drivers = self.segmentDrivers()
+        result = []
+        start = 0
+        for bounds in self.segmentDriverBounds():
+            result.append(drivers[start:start + len(bounds)])
+            start += len(bounds) - 1
+        return result
+
+    # Мировые позиции джоинтов кривых (в порядке bindJoints) для позиций джоинтов спины positions
+    def bindPositions(self, positions):
+        bounds = self.segmentBounds()
+        return ([positions[bounds[0]], positions[bounds[-1]]] +
+                [positions[bound] for bound, base in self.innerDrivers()])
+
+    # Все участки IK spline системы. Первый участок собирается из основных полей рига
+    def splineSegments(self):
+        return [SplineSegment(self.ikSystemObjs, self.skinCluster, self.arclenNode, self.baseStretch,
+                              self.baseSquash, self.scaleCompNode)] + self.ikSegments
+
     # Создает IK Spline систему, для управления джоинтами спины
+    @buildStage
     def createIkControls(self):
         for n in self.bindJoints:
             num = -len(NAMING["jointSuffix"]) - 1
@@ -349,83 +587,209 @@ class TorsoRig:
         for x in self.ikControls:
             x.setRotateOrder(self.ROTATE_ORDER)
             x.setLimitedKeyability(("vis","sx","sy","sz"))
-            conName = cmds.parentConstraint(x.controlName, x.driven)[0]
-            cmds.rename(conName, NamingAgreementHandler(assetName="", side="", base = x.driven,
-                                                                       suffix = NAMING["parentConstraintSuffix"]).nodeName)
-
-    # Создает Ik Spline систему
+        if self.CONTROL_DRIVE == "matrix":
+            self.connectControlMatrices()
+        else:
+            for x in self.ikControls:
+                cmds.parentConstraint(x.controlName, x.driven,
+                                      name = NamingAgreementHandler(assetName="", side="", base = x.driven,
+                                                                    suffix = NAMING["parentConstraintSuffix"]).nodeName)
+
+    # Ведет джоинты кривых мировыми матрицами IK контроллеров через offsetParentMatrix. Джоинты не наследуют
+    # трансформ родителя: их положение задает только контроллер, как и при parentConstraint. Контроллеры
+    # заморожены в позиции джоинтов, поэтому в исходной позе их мировые матрицы единичные и джоинты не сдвигаются
+    def connectControlMatrices(self):
+        cmds.applyBatch("setAttr", [(("{}.inheritsTransform".format(x.driven), 0), {}) for x in self.ikControls])
+        cmds.applyBatch("connectAttr", [(("{}.worldMatrix[0]".format(x.controlName),
+                                          "{}.offsetParentMatrix".format(x.driven)), {})
+                                        for x in self.ikControls])
+
+    # Сдвигает группы IK контроллеров так, чтобы контроллеры привели джоинты кривой в начало и конец спины.
+    # Ориентация контроллеров не меняется
+    def moveIkControls(self):
+        positions = self.bindPositions(self.layout().positions)
+        for control, joint, position in zip(self.ikControls, self.bindJoints, positions):
+            delta = rigMath.vecSub(position, cmds.xform(joint, query = True, translation = True, worldSpace = True))
+            matrix = cmds.xform(control.lastNode, query = True, matrix = True, worldSpace = True)
+            matrix[12:15] = rigMath.vecAdd(matrix[12:15], delta)
+            with self.unlockedTransform(control.lastNode):
+                cmds.xform(control.lastNode, worldSpace = True, matrix = matrix)
+
+    # Создает Ik Spline систему: по ikHandle на каждый участок между границами segmentBounds
+    @buildStage
     def createIkSpineSystem(self):
+        bounds = self.segmentBounds()
+        drivers = self.curveDrivers()
+        self.ikSystemObjs, self.skinCluster = self.createSplineIk(self.joints[bounds[0]], self.joints[bounds[1]],
+                                                                  drivers[0], self.segmentBase(0))
+        for n in range(1, len(bounds) - 1):
+            segment = SplineSegment()
+            segment.ikSystemObjs, segment.skinCluster = self.createSplineIk(self.joints[bounds[n]],
+                                                                            self.joints[bounds[n + 1]],
+                                                                            drivers[n], self.segmentBase(n))
+            self.ikSegments.append(segment)
+        if self.SKIN_WEIGHTS == "analytic":
+            self.setCurveWeights()
+
+    # ikHandle с кривой от startJoint до endJoint, кривая привязана к джоинтам drivers. Каждая CV зависит
+    # не больше чем от двух соседних джоинтов, так же делит веса и setCurveWeights.
+    # Возвращает ([ikHandle, effector, curve], skinCluster)
+    def createSplineIk(self, startJoint, endJoint, drivers, base):
         self.clearSelection()
-        cmds.select(self.joints[0], self.joints[-1], add = True)
-        self.ikSystemObjs = cmds.ikHandle(solver = "ikSplineSolver", simplifyCurve = False)
+        cmds.select(startJoint, endJoint, add = True)
+        ikSystemObjs = cmds.ikHandle(solver = "ikSplineSolver", simplifyCurve = False)
         newObjs = []
-        for x in range(len(self.ikSystemObjs)):
+        skinCluster = ""
+        for x in range(len(ikSystemObjs)):
             if x == 0:
-                newObjs.append(cmds.rename(self.ikSystemObjs[x], NamingAgreementHandler(base=NAMING["spineJointName"],
+                newObjs.append(cmds.rename(ikSystemObjs[x], NamingAgreementHandler(base=base,
                                                                    suffix=NAMING["ikHandleSuffix"]).nodeName))
             elif x == 2:
 
-                newObjs.append(cmds.rename(self.ikSystemObjs[x], NamingAgreementHandler(base=NAMING["spineJointName"],
+                newObjs.append(cmds.rename(ikSystemObjs[x], NamingAgreementHandler(base=base,
                                                       suffix=NAMING["curveSuffix"]).nodeName))
 
                 self.clearSelection()
 
-                cmds.skinCluster(self.bindJoints, newObjs[-1], bindMethod = 0, normalizeWeights = 1, weightDistribution = 0,
+                skinCluster = cmds.skinCluster(drivers, newObjs[-1], bindMethod = 0, normalizeWeights = 1, weightDistribution = 0,
                                  maximumInfluences =  2, obeyMaxInfluences = True, dropoffRate = 4,
-                                 removeUnusedInfluence = True )
+                                 removeUnusedInfluence = True )[0]
 
             if x == 1:
-                newObjs.append(cmds.rename(self.ikSystemObjs[x], NamingAgreementHandler(base=NAMING["spineJointName"],
+                newObjs.append(cmds.rename(ikSystemObjs[x], NamingAgreementHandler(base=base,
                                                       suffix=NAMING["effectorSuffix"]).nodeName))
-        self.ikSystemObjs = newObjs
-
-    # Создает систему маштабирования основных джоинтов вдоль оси X
+        return newObjs, skinCluster
+
+    # Выставляет аналитические веса кривой IK spline всем джоинтам скина одним вызовом.
+    # Джоинты, добавленные в скин после сборки (например, контроллер середины спины), тоже учитываются
+    def setCurveWeights(self):
+        for segment in self.splineSegments():
+            curve = segment.ikSystemObjs[2]
+            world = cmds.xform(curve, query = True, matrix = True, worldSpace = True)
+            points = [rigMath.transformPoint(cv, world)
+                      for cv in cmds.getAttr("{}.cv[*]".format(self.curveRestShape(curve)))]
+            drivers = [cmds.xform(x, query = True, translation = True, worldSpace = True)
+                       for x in cmds.skinCluster(segment.skinCluster, query = True, influence = True)]
+            cmds.setSkinWeights(segment.skinCluster, curveSkinWeights(points, drivers, self.SKIN_FALLOFF))
+
+    # Переносит исходную форму кривых IK spline вслед за джоинтами спины и заново привязывает скины
+    # к текущему положению джоинтов кривых
+    def moveIkCurve(self):
+        spine = self.layout().jointPositions()
+        segments = self.splineSegments()
+        calls = []
+        for segment in segments:
+            shape = self.curveRestShape(segment.ikSystemObjs[2])
+            points = remapPoints(cmds.getAttr("{}.cv[*]".format(shape)), self.previousSpine, spine)
+            calls.extend(_curveCalls(shape, points))
+        cmds.applyBatch("setAttr", calls)
+        drivers = self.curveDrivers()
+        for k, segment in enumerate(segments):
+            for n, joint in enumerate(drivers[k]):
+                cmds.setAttr("{}.bindPreMatrix[{}]".format(segment.skinCluster, n),
+                             cmds.getAttr("{}.worldInverseMatrix[0]".format(joint)), type = "matrix")
+        if self.SKIN_WEIGHTS == "analytic":
+            self.setCurveWeights()
+
+    # Шейп с исходной формой кривой: промежуточный шейп под скином, если он есть
+    def curveRestShape(self, curve):
+        shapes = cmds.listRelatives(curve, shapes = True) or []
+        for shape in shapes:
+            if cmds.getAttr("{}.intermediateObject".format(shape)):
+                return shape
+        return shapes[0]
+
+    # Создает систему маштабирования основных джоинтов вдоль оси X, отдельно на каждом участке
+    @buildStage
     def setupStretch(self):
+        bounds = self.segmentBounds()
+        self.arclenNode, self.baseStretch = self.createStretch(self.ikSystemObjs[2],
+                                                               self.joints[bounds[0]:bounds[1]], self.segmentBase(0))
+        for n, segment in enumerate(self.ikSegments, 1):
+            segment.arclenNode, segment.baseStretch = self.createStretch(segment.ikSystemObjs[2],
+                                                                         self.joints[bounds[n]:bounds[n + 1]],
+                                                                         self.segmentBase(n))
+
+    # Растяжение джоинтов joints по длине кривой curve. Возвращает (curveInfo, multiplyDivide растяжения)
+    def createStretch(self, curve, joints, base):
 
         # Создаем ноду для вычисления длины управляющей кривой
-        self.arclenNode = cmds.arclen(self.ikSystemObjs[2], constructionHistory = True)
-        self.arclenNode = cmds.rename(self.arclenNode, NamingAgreementHandler(base=NAMING["spineJointName"],
+        arclenNode = cmds.arclen(curve, constructionHistory = True)
+        arclenNode = cmds.rename(arclenNode, NamingAgreementHandler(base=base,
                                                       suffix=NAMING["curveInfoSuffix"]).nodeName)
 
         # Сохраняем исходную длину кривой для дальнейших вычислений
-        curveLength = cmds.getAttr("{}.arcLength".format(self.arclenNode))
+        curveLength = cmds.getAttr("{}.arcLength".format(arclenNode))
 
         # Создаем ноду, где вычисляем во сколько раз изменилась длина кривой по сравнению с исходным значением
-        self.baseStretch = cmds.createNode("multiplyDivide", name = NamingAgreementHandler(base=NAMING["spineJointName"],
+        baseStretch = cmds.createNode("multiplyDivide", name = NamingAgreementHandler(base=base,
                                                                             suffix=NAMING["stretchSuffix"]).nodeName)
         # Соединяем нужные атрибуты, выставляем еужную операции
-        cmds.setAttr("{}.operation".format(self.baseStretch), 2)
-        cmds.setAttr("{}.input2X".format(self.baseStretch), curveLength)
-        cmds.connectAttr("{}.arcLength".format(self.arclenNode), "{}.input1X".format(self.baseStretch))
-        # Возвращаем маштаб каждому джоинту спины вдоль оси Х
-        for x in range(len(self.joints) - 1):
-            cmds.connectAttr("{}.outputX".format(self.baseStretch),"{}.scaleX".format(self.joints[x]))
+        cmds.setAttr("{}.operation".format(baseStretch), 2)
+        cmds.setAttr("{}.input2X".format(baseStretch), curveLength)
+        cmds.connectAttr("{}.arcLength".format(arclenNode), "{}.input1X".format(baseStretch))
+        # Возвращаем маштаб каждому джоинту участка вдоль оси Х
+        for joint in joints:
+            cmds.connectAttr("{}.outputX".format(baseStretch),"{}.scaleX".format(joint))
+        return arclenNode, baseStretch
+
+    # Запоминает новую исходную длину кривых после их переноса
+    def updateStretchRest(self):
+        for segment in self.splineSegments():
+            cmds.setAttr("{}.input2X".format(segment.baseStretch),
+                         cmds.getAttr("{}.arcLength".format(segment.arclenNode)))
 
     # Создает систему маштабирования основных джоинтов вдоль побочных осей
+    @buildStage
     def setupSquash(self):
-        self.baseSquash = cmds.createNode("multiplyDivide", name = NamingAgreementHandler(base=NAMING["spineJointName"],
-                                                      suffix=NAMING["squashSuffix"]).nodeName)
-        cmds.setAttr("{}.operation".format(self.baseSquash), 3)
-        cmds.connectAttr("{}.outputX".format(self.baseStretch),"{}.input1X".format(self.baseSquash))
-        cmds.setAttr("{}.input2X".format(self.baseSquash),-0.5)
+        self.baseSquash = self.createSquash(self.baseStretch, self.segmentBase(0))
+        for n, segment in enumerate(self.ikSegments, 1):
+            segment.baseSquash = self.createSquash(segment.baseStretch, self.segmentBase(n))
 
         self.createSqshStchCont()
 
-    # Настраивает скручивание IK spline системы (Advanced Twist Controls)
+    # Сжатие, сохраняющее объем при растяжении baseStretch: stretch ^ -0.5
+    def createSquash(self, baseStretch, base):
+        baseSquash = cmds.createNode("multiplyDivide", name = NamingAgreementHandler(base=base,
+                                                      suffix=NAMING["squashSuffix"]).nodeName)
+        cmds.setAttr("{}.operation".format(baseSquash), 3)
+        cmds.connectAttr("{}.outputX".format(baseStretch),"{}.input1X".format(baseSquash))
+        cmds.setAttr("{}.input2X".format(baseSquash),-0.5)
+        return baseSquash
+
+    # Нода сжатия участка для каждого джоинта спины, кроме последнего
+    def squashDrivers(self):
+        bounds = self.segmentBounds()
+        drivers = []
+        for n, segment in enumerate(self.splineSegments()):
+            drivers.extend([segment.baseSquash] * (bounds[n + 1] - bounds[n]))
+        return drivers
+
+    # Настраивает скручивание IK spline системы (Advanced Twist Controls). Скручивание каждого участка
+    # задают джоинты кривой на его концах
+    @buildStage
     def setupTwist(self):
-        ikHndl = self.ikSystemObjs[0]
-
-        cmds.setAttr("{}.dTwistControlEnable".format(ikHndl), 1)
-        cmds.setAttr("{}.dWorldUpType".format(ikHndl), 4)
-        cmds.setAttr("{}.dForwardAxis".format(ikHndl), 0)
-        cmds.setAttr("{}.dWorldUpAxis".format(ikHndl), 1)
-        cmds.setAttr("{}.dWorldUpVector".format(ikHndl), self.twistUp[0], self.twistUp[1], self.twistUp[2])
-        cmds.setAttr("{}.dWorldUpVectorEnd".format(ikHndl), self.twistUp[0], self.twistUp[1], self.twistUp[2])
-        cmds.connectAttr("{}.worldMatrix".format(self.bindJoints[0]), "{}.dWorldUpMatrix".format(ikHndl))
-        cmds.connectAttr("{}.worldMatrix".format(self.bindJoints[1]), "{}.dWorldUpMatrixEnd".format(ikHndl))
+        drivers = self.curveDrivers()
+        for n, segment in enumerate(self.splineSegments()):
+            ikHndl = segment.ikSystemObjs[0]
+
+            cmds.setAttr("{}.dTwistControlEnable".format(ikHndl), 1)
+            cmds.setAttr("{}.dWorldUpType".format(ikHndl), 4)
+            cmds.setAttr("{}.dForwardAxis".format(ikHndl), 0)
+            cmds.setAttr("{}.dWorldUpAxis".format(ikHndl), 1)
+            self.setTwistVectors(ikHndl)
+            cmds.connectAttr("{}.worldMatrix".format(drivers[n][0]), "{}.dWorldUpMatrix".format(ikHndl))
+            cmds.connectAttr("{}.worldMatrix".format(drivers[n][-1]), "{}.dWorldUpMatrixEnd".format(ikHndl))
+
+    # Выставляет векторы вверх для скручивания в зависимости от типа рига, по умолчанию - всем участкам
+    def setTwistVectors(self, ikHndl = None):
+        for handle in [ikHndl] if ikHndl else [x.ikSystemObjs[0] for x in self.splineSegments()]:
+            cmds.setAttr("{}.dWorldUpVector".format(handle), self.twistUp[0], self.twistUp[1], self.twistUp[2])
+            cmds.setAttr("{}.dWorldUpVectorEnd".format(handle), self.twistUp[0], self.twistUp[1], self.twistUp[2])
 
     # Создает кривую для артистичного контролирования эффекта растяжения/сжатия
-    def createSqshStchCont(self):
+    @buildStage
+    def createSqshStchCont(self, mode = None):
         attName = "splineStretch"
 
         cmds.addAttr(self.ikControls[1].controlName, longName = attName , attributeType = "float", keyable = True)
@@ -433,9 +797,15 @@ class TorsoRig:
         joints_num = len(self.joints) - 1
         cmds.setKeyframe(self.ikControls[1].controlName, time = [1,joints_num], value = 1, attribute = attName)
         curveControl = cmds.keyframe(self.ikControls[1].controlName, attribute = attName, name = True, query = True)[0]
+        self.squashCurve = curveControl
+
+        if (mode or self.SQUASH_MODE) == "compact":
+            self.createCompactSqsh(joints_num)
+            return
 
         # Для каждого джоинта создаем систему считывания значения из кривой, соединяем соответсвующие аттрибуты,
         # выставляем нужные операции нодам
+        squashDrivers = self.squashDrivers()
         for x in range(joints_num):
             jointFrCache = cmds.createNode("frameCache", name=NamingAgreementHandler(assetName="", side="",
                                                                                      base=self.joints[x],
@@ -448,59 +818,131 @@ class TorsoRig:
                                                                                      suffix="pow").nodeName)
             cmds.setAttr("{}.operation".format(jointPow), 3)
             cmds.connectAttr("{}.varying".format(jointFrCache), "{}.input2X".format(jointPow))
-            cmds.connectAttr("{}.outputX".format(self.baseSquash), "{}.input1X".format(jointPow))
+            cmds.connectAttr("{}.outputX".format(squashDrivers[x]), "{}.input1X".format(jointPow))
 
             cmds.connectAttr("{}.outputX".format(jointPow), "{}.scaleY".format(self.joints[x]))
             cmds.connectAttr("{}.outputX".format(jointPow), "{}.scaleZ".format(self.joints[x]))
+            self.squashNodes.extend((jointFrCache, jointPow))
+
+    # Компактная система сжатия: кривая splineStretch считывается один раз в массив степеней по джоинтам.
+    # Массив хранится в сцене атрибутами exponent1..N одной ноды network и расходится по каналам X, Y, Z
+    # нод multiplyDivide - по ноде на три джоинта. На кадре кривая не вычисляется, массив обновляется
+    # только при изменении ее ключей (см. watchSquashFalloff)
+    def createCompactSqsh(self, joints_num):
+        axes = "XYZ"
+        squashDrivers = self.squashDrivers()
+        falloffNode = cmds.createNode("network", name=NamingAgreementHandler(
+            base=NAMING["spineJointName"] + "_" + NAMING["squashSuffix"], suffix="falloff").nodeName)
+        cmds.applyBatch("addAttr", [((falloffNode,), {"longName": "exponent{}".format(x + 1),
+                                                      "attributeType": "double", "defaultValue": 1.0})
+                                    for x in range(joints_num)])
+        self.squashNodes.append(falloffNode)
+        for n in range(0, joints_num, len(axes)):
+            jointPow = cmds.createNode("multiplyDivide", name=NamingAgreementHandler(
+                base=NAMING["spineJointName"] + "_" + NAMING["squashSuffix"] + "_" + str(n // len(axes) + 1),
+                suffix="pow").nodeName)
+            cmds.setAttr("{}.operation".format(jointPow), 3)
+            for axis, x in zip(axes, range(n, min(n + len(axes), joints_num))):
+                cmds.connectAttr("{}.exponent{}".format(falloffNode, x + 1), "{}.input2{}".format(jointPow, axis))
+                cmds.connectAttr("{}.outputX".format(squashDrivers[x]), "{}.input1{}".format(jointPow, axis))
+                cmds.connectAttr("{}.output{}".format(jointPow, axis), "{}.scaleY".format(self.joints[x]))
+                cmds.connectAttr("{}.output{}".format(jointPow, axis), "{}.scaleZ".format(self.joints[x]))
+            self.squashNodes.append(jointPow)
+        self.watchSquashFalloff()
+
+    # Выставляет массив степеней компактной системы сжатия из кэша кривой splineStretch и подписывает его
+    # на изменения ключей кривой: в сцену уходят только изменившиеся степени. Подписка принадлежит сцене
+    # и переживает release() рига; после загрузки сетапа из файла ее восстанавливает cloneState.
+    # Возвращает False, если сцена не сообщает об изменениях кривых
+    def watchSquashFalloff(self):
+        sampler = self.squashFalloffSampler()
+        write = _falloffWriter(self.squashNodes[0])
+        watched = sampler.watch(write)
+        write(sampler)
+        return watched
+
+    # Кэш значений кривой splineStretch в моментах 1..N - по одному на джоинт спины, кроме последнего.
+    # Создается заново, если кривая или количество джоинтов изменились
+    def squashFalloffSampler(self):
+        times = [x + 1 for x in range(len(self.joints) - 1)]
+        sampler = self.falloffSampler
+        if sampler is None or sampler.curve != self.squashCurve or sampler.times != times:
+            if sampler is not None:
+                sampler.release()
+            sampler = self.falloffSampler = FalloffSampler(self.squashCurve, times)
+            sampler.watch()
+        return sampler
+
+    # Степени сжатия по джоинтам спины из кривой splineStretch: [(джоинт, степень)]
+    def squashFalloff(self):
+        return list(zip(self.joints, self.squashFalloffSampler().values()))
+
+    # Текстовый график затухания сжатия вдоль спины: строка на джоинт, длина полосы пропорциональна степени
+    def previewSquashFalloff(self, width = PREVIEW_WIDTH):
+        return self.squashFalloffSampler().preview(width, self.joints[:-1])
 
     # Создание FK джоинтов и настройка их контроллеров
-    def createFkCtrlJoints(self, num = 4):
-        fkControls = []
-
+    @buildStage
+    def createFkCtrlJoints(self, num = 4, guides = None, spacing = None):
         self.clearSelection()
-        delta = [(cmds.xform(self.joints[-1], query = True, translation = True, worldSpace = True)[z] -
-                  self.LOCATORS[self.LOCATORS.keys()[1]][z]) / (num - 1) for z in range(0, 3)]
-        # Создаем джоинты
+        self.setLayout(guides, spacing)
+        self.fkJointCount = num
+        # Создаем джоинты сразу с ориентацией, которую дает orientJoint="xzy", secondaryAxisOrient="xup"
+        positions, rotations = self.fkLayout(num, cmds.xform(self.joints[-1], query = True, translation = True,
+                                                             worldSpace = True))
+        translations, jointOrients = chainLocalTransforms(positions, rotations)
+        names = []
         for n in range(num):
             if(n == 0):
-                self.fkJoints.append(
-                    cmds.joint(position=(delta[x] * n + self.LOCATORS[self.LOCATORS.keys()[1]][x] for x in range(0, 3)),
-                               radius=self.J_RADIUS,
-                               name=NamingAgreementHandler(base=NAMING["hipName"] + "_FK",
-                                                           suffix=NAMING["jointSuffix"]).nodeName))
+                names.append(NamingAgreementHandler(base=NAMING["hipName"] + "_FK",
+                                                    suffix=NAMING["jointSuffix"]).nodeName)
             elif(n == num - 1):
-                self.fkJoints.append(
-                    cmds.joint(position=(delta[x] * n + self.LOCATORS[self.LOCATORS.keys()[1]][x] for x in range(0, 3)),
-                               radius=self.J_RADIUS,
-                               name=NamingAgreementHandler(base=NAMING["shoulderName"] + "_FK",
-                                                           suffix=NAMING["jointSuffix"]).nodeName))
-
+                names.append(NamingAgreementHandler(base=NAMING["shoulderName"] + "_FK",
+                                                    suffix=NAMING["jointSuffix"]).nodeName)
             else:
-                self.fkJoints.append(
-                    cmds.joint(position=(delta[x] * n + self.LOCATORS[self.LOCATORS.keys()[1]][x] for x in range(0, 3)),
-                               radius=self.J_RADIUS,
-                               name=NamingAgreementHandler(base=NAMING["spineJointName"] + "_" + str(n) + "_"  + "FK",
-                                                           suffix=NAMING["controlSuffix"]).nodeName))
-
-        # Выставлем необходимую ориентацию у джоинтов
-        cmds.joint(self.fkJoints[0], edit=True, orientJoint="xzy", secondaryAxisOrient="xup",children=True,
-                   zeroScaleOrient=True)
-
-        # Создаем контроллеры для FK джоинтов
-        for n in range(num):
-            if(n > 0 and n < num-1 ):
-                fkCtrlName = self.fkJoints[n][:-5]
-                fkControls.append(ControllerAgreementHandler(name=NamingAgreementHandler(assetName="", side="",
-                                                                                         base=fkCtrlName).nodeName,
-                                                             shape="circleZ",
-                                                             driven=self.fkJoints[n], scale=self.CONTROL_SCALE,
-                                                             suffix="", toOrign = True))
-
-                fkControls[-1].setRotateOrder(self.ROTATE_FK_ORDER)
-                cmds.parent("{}Shape".format(fkControls[-1].controlName), self.fkJoints[n], shape = True, relative = True)
-                fkControls[-1].deleteAll()
+                names.append(NamingAgreementHandler(base=NAMING["spineJointName"] + "_" + str(n) + "_"  + "FK",
+                                                    suffix=NAMING["controlSuffix"]).nodeName)
+        self.fkJoints.extend(cmds.createJointChain(names, translations, jointOrients, radius = self.J_RADIUS))
+
+        # Добавляем шейпы контроллеров прямо в средние FK джоинты, без промежуточных контроллеров
+        template = shapeTemplate("circleZ", ControllerAgreementHandler.CONTROL_LIB["circleZ"])
+        ctrlJoints = self.fkJoints[1:num - 1]
+        names = [NamingAgreementHandler(assetName="", side="", base=joint[:-5]).nodeName + "Shape" for joint in ctrlJoints]
+        cmds.addCurveShapes(ctrlJoints, self.fkShapePoints(ctrlJoints), template.degree, template.periodic,
+                            names = names)
+        for joint in ctrlJoints:
+            cmds.setAttr("{}.rotateOrder".format(joint), ControllerAgreementHandler.ROTATE_ORDER[self.ROTATE_FK_ORDER])
+
+    # CV шейпов FK контроллеров joints. Шейп повторяет результат заморозки контроллера, совмещенного с джоинтом,
+    # поэтому зависит от мировой ориентации джоинта
+    def fkShapePoints(self, joints):
+        template = shapeTemplate("circleZ", ControllerAgreementHandler.CONTROL_LIB["circleZ"])
+        matrices = cmds.applyBatch("xform", [((joint,), {"query": True, "matrix": True, "worldSpace": True})
+                                             for joint in joints])
+        return [template.orientedPoints(rigMath.rotationPart(matrix), self.CONTROL_SCALE) for matrix in matrices]
+
+    # Переносит FK джоинты на месте. IK контроллеры, вложенные в них, остаются на своих местах,
+    # шейпы FK контроллеров поворачиваются вслед за новой ориентацией джоинтов
+    def moveFkJoints(self):
+        layout = self.layout()
+        translations, jointOrients = chainLocalTransforms(layout.fkPositions, layout.fkRotations,
+                                                          self.parentWorldMatrix(self.fkJoints[0]))
+        held = [(x.lastNode, cmds.xform(x.lastNode, query = True, matrix = True, worldSpace = True))
+                for x in self.ikControls]
+        with self.unlockedTransform(*(self.fkJoints + [node for node, matrix in held])):
+            cmds.applyBatch("setAttr", _transformCalls(self.fkJoints, translations, jointOrients))
+            for node, matrix in held:
+                cmds.xform(node, worldSpace = True, matrix = matrix)
+        rotateOrder = ControllerAgreementHandler.ROTATE_ORDER[self.ROTATE_FK_ORDER]
+        cmds.applyBatch("setAttr", [(("{}.rotateOrder".format(joint), rotateOrder), {})
+                                    for joint in self.fkJoints[1:-1]])
+        ctrlJoints = self.fkJoints[1:-1]
+        shapes = [(cmds.listRelatives(joint, shapes = True) or [None])[0] for joint in ctrlJoints]
+        cmds.applyBatch("setAttr", [call for shape, points in zip(shapes, self.fkShapePoints(ctrlJoints)) if shape
+                                    for call in _curveCalls(shape, points)])
 
     # Создание общего контроллера торса
+    @buildStage
     def createBodyControl(self):
         self.bodyCtrl = ControllerAgreementHandler(shape = "square", name = NamingAgreementHandler(base = NAMING["bodyCtrlName"]).nodeName, driven = self.fkJoints[0],
                                                               scale = self.CONTROL_SCALE, pos = False)
@@ -513,14 +955,39 @@ class TorsoRig:
         cmds.parent(self.fkJoints[0], self.bodyCtrl.controlName)
         cmds.parent(self.ikControls[0].lastNode, self.fkJoints[0])
         cmds.parent(self.ikControls[1].lastNode, self.fkJoints[-1])
+        # Контроллеры границ участков следуют за ближайшим FK джоинтом
+        if len(self.ikControls) > 2:
+            fkPositions = cmds.applyBatch("xform", [((x,), {"query": True, "translation": True, "worldSpace": True})
+                                                    for x in self.fkJoints])
+            for control in self.ikControls[2:]:
+                position = cmds.xform(control.lastNode, query = True, translation = True, worldSpace = True)
+                distances = [rigMath.vecLength(rigMath.vecSub(position, x)) for x in fkPositions]
+                cmds.parent(control.lastNode, self.fkJoints[distances.index(min(distances))])
+
+    # Переносит контроллер торса вслед за FK джоинтом бедер: CV и пивоты получают те же значения,
+    # что дали бы совмещение с джоинтом, поворот на -90 по X и заморозка в createBodyControl
+    def moveBodyControl(self):
+        template = shapeTemplate("square", ControllerAgreementHandler.CONTROL_LIB["square"])
+        matrix = rigMath.multMatrix(rigMath.rotationPart(cmds.xform(self.fkJoints[0], query = True, matrix = True,
+                                                                    worldSpace = True)),
+                                    rigMath.axisRotationMatrix(0, -90.0))
+        pivot = tuple(cmds.xform(self.fkJoints[0], query = True, rotatePivot = True, worldSpace = True))
+        matrix[12:15] = pivot
+        control = self.bodyCtrl.controlName
+        shape = cmds.listRelatives(control, shapes = True)[0]
+        calls = _curveCalls(shape, template.transformedPoints(matrix, self.CONTROL_SCALE))
+        calls += [(("{}.{}".format(control, attr),) + pivot, {}) for attr in ("rotatePivot", "scalePivot")]
+        cmds.applyBatch("setAttr", calls)
 
     # Чистит сцену
+    @buildStage
     def cleanScene(self):
         self.cleanOutliner()
         self.setupRigRelocation()
         self.setLayers()
 
     # Разделяет элементы рига по слоям, отключает визуализацию лишних элементов сетапа
+    @buildStage
     def setLayers(self):
         self.clearSelection()
         self.fkLayer = cmds.createDisplayLayer(name = NamingAgreementHandler(base=NAMING["bodyCtrlName"] + "_FK",
@@ -533,14 +1000,16 @@ class TorsoRig:
                                                                            suffix=NAMING["layer"]).nodeName, empty=True)
         cmds.setAttr("{}.color".format(self.torsoBaseLayer), 13)
 
-        cmds.editDisplayLayerMembers(self.torsoBaseLayer,self.rootGrp, self.bodyCtrl.controlName, noRecurse=True)
-        cmds.editDisplayLayerMembers(self.ikLayer, [self.ikControls[x].controlName for x in range(2)], noRecurse=True)
-        cmds.editDisplayLayerMembers(self.fkLayer, self.fkJoints, noRecurse=True)
+        cmds.assignDisplayLayers([(self.torsoBaseLayer, [self.rootGrp, self.bodyCtrl.controlName]),
+                                  (self.ikLayer, [x.controlName for x in self.ikControls]),
+                                  (self.fkLayer, self.fkJoints)])
 
     # Группирует элементы сетапа в Outliner
+    @buildStage
     def cleanOutliner(self):
-        self.DNTGrp = cmds.group(self.bindJoints[:], self.ikSystemObjs[0], self.ikSystemObjs[2], self.joints[0],
-                                 name=NamingAgreementHandler(base=NAMING["bodyCtrlName"] + "_" + NAMING["DNTName"],
+        segmentObjs = [x.ikSystemObjs[n] for x in self.ikSegments for n in (0, 2)]
+        self.DNTGrp = cmds.group(self.bindJoints[:], self.ikSystemObjs[0], self.ikSystemObjs[2], segmentObjs,
+                                 self.joints[0], name=NamingAgreementHandler(base=NAMING["bodyCtrlName"] + "_" + NAMING["DNTName"],
                                                              suffix=NAMING["groupSuffix"]).nodeName)
         cmds.xform(self.DNTGrp, objectSpace=True, pivots=(0, 0, 0))
 
@@ -551,34 +1020,35 @@ class TorsoRig:
         self.cleanKAttr()
 
     # Отключает лишние аттрибуты элементов сетапа
+    @buildStage
     def cleanKAttr(self):
-        setLimitedKeyability(self.DNTGrp, ("sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz"))
         cmds.setAttr("{}.visibility".format(self.DNTGrp),0)
-        setLimitedKeyability(self.torsoGrp, ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz"))
+        # Собираем все блокировки и выполняем их одним вызовом
+        nodeAttrs = [(self.DNTGrp, ("sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz")),
+                     (self.torsoGrp, ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz"))]
 
         for x in self.ikControls:
-            setLimitedKeyability(x.lastNode,
-                                 ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz"))
+            nodeAttrs.append((x.lastNode, ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz")))
 
         fLen = len(self.fkJoints)
         for n in range(fLen):
             if (n == 0):
-                setLimitedKeyability(self.fkJoints[n],
-                                     ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz", "rad"))
+                nodeAttrs.append((self.fkJoints[n], ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz", "rad")))
             elif (n == fLen - 1):
-                setLimitedKeyability(self.fkJoints[n],
-                                     ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz", "rad"))
+                nodeAttrs.append((self.fkJoints[n], ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rx", "ry", "rz", "rad")))
             else:
-                setLimitedKeyability(self.fkJoints[n],
-                                     ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rad"))
+                nodeAttrs.append((self.fkJoints[n], ("vis", "sx", "sy", "sz", "tx", "ty", "tz", "rad")))
+        lockAttributes(nodeAttrs)
 
     # Создает глобальный контроллер над всем сетапом
+    @buildStage
     def setupRigRelocation(self):
         self.rootGrp = ControllerAgreementHandler( name=NamingAgreementHandler(base=NAMING["allGrpName"],
                                                               suffix=NAMING["groupSuffix"]).nodeName, shape = "circleY",
                                                 pos = False, scale=self.CONTROL_SCALE).lastNode
         cmds.parent(self.torsoGrp, self.rootGrp)
-        cmds.setAttr("{}.inheritsTransform".format(self.ikSystemObjs[2]), 0)
+        for segment in self.splineSegments():
+            cmds.setAttr("{}.inheritsTransform".format(segment.ikSystemObjs[2]), 0)
 
         # Создаем систему компенсации маштабирования глобального контроллера системы рига для кривой IK Spline
         newScaleName = "globalScale"
@@ -586,12 +1056,331 @@ class TorsoRig:
         cmds.connectAttr("{}.scaleY".format(self.rootGrp), "{}.scaleZ".format(self.rootGrp))
         setLimitedKeyability(self.rootGrp, ("sx", "sz"))
         cmds.aliasAttr(newScaleName, "{}.scaleY".format(self.rootGrp))
-        scaleCompNode = cmds.createNode("multiplyDivide", name=NamingAgreementHandler(base = newScaleName,
+        self.scaleCompNode = self.createScaleCompensation(self.arclenNode, self.baseStretch, newScaleName,
+                                                          newScaleName)
+        for n, segment in enumerate(self.ikSegments, 1):
+            base = "{}_{}{}".format(newScaleName, NAMING["segmentName"], n + 1)
+            segment.scaleCompNode = self.createScaleCompensation(segment.arclenNode, segment.baseStretch,
+                                                                 newScaleName, base)
+
+    # Делит длину кривой участка на масштаб глобального контроллера (атрибут scaleAttr корневой группы)
+    # перед расчетом растяжения
+    def createScaleCompensation(self, arclenNode, baseStretch, scaleAttr, base):
+        scaleCompNode = cmds.createNode("multiplyDivide", name=NamingAgreementHandler(base = base,
                                                                suffix="mult").nodeName)
-        cmds.connectAttr("{}.{}".format(self.rootGrp, newScaleName), "{}.input2X".format(scaleCompNode), force =True)
-        cmds.connectAttr("{}.arcLength".format(self.arclenNode), "{}.input1X".format(scaleCompNode), force =True)
-        cmds.connectAttr("{}.outputX".format(scaleCompNode), "{}.input1X".format(self.baseStretch), force =True)
+        cmds.connectAttr("{}.{}".format(self.rootGrp, scaleAttr), "{}.input2X".format(scaleCompNode), force =True)
+        cmds.connectAttr("{}.arcLength".format(arclenNode), "{}.input1X".format(scaleCompNode), force =True)
+        cmds.connectAttr("{}.outputX".format(scaleCompNode), "{}.input1X".format(baseStretch), force =True)
         cmds.setAttr("{}.operation".format(scaleCompNode), 2)
+        return scaleCompNode
+
+    # Полная сборка сетапа без участия пользователя: для пакетной сборки и записи операций.
+    # С profile=True возвращает отчет о времени, вызовах команд сцены и созданных нодах по этапам
+    # С budget сетап перед сборкой подбирается под бюджет (см. fitBudget).
+    # undoable=True - сборка из интерфейса: вся сборка отменяется одним undo
+    def build(self, num = 5, fkNum = 4, profile = False, squashMode = None, skinWeights = None, ikSegments = None,
+              controlDrive = None, budget = None, midDrivers = None, undoable = False):
+        if profile:
+            self.profiler = BuildProfiler()
+            try:
+                with self.profiler.activate():
+                    self.build(num, fkNum, squashMode = squashMode, skinWeights = skinWeights,
+                               ikSegments = ikSegments, controlDrive = controlDrive, budget = budget,
+                               midDrivers = midDrivers, undoable = undoable)
+                return self.profiler.report()
+            finally:
+                self.profiler = None
+
+        with undoChunk("TorsoRig", undoable):
+            for progress in self.buildSteps(num, fkNum, squashMode, skinWeights, ikSegments, controlDrive, budget,
+                                            midDrivers):
+                pass
+
+    # Пошаговая сборка для интерфейса: генератор выполняет этапы BUILD_STAGES по одному и после каждого
+    # отдает (количество выполненных этапов, количество этапов, имя этапа). Сборку можно прервать между
+    # этапами, закрыв генератор (close()); при прерывании или ошибке в этапе созданные ноды удаляются
+    # и риг возвращается в состояние до сборки. Между этапами сцена свободна: реестр имен и кэш трансформов
+    # ставятся только на время этапа (см. runStage), поэтому ноды, созданные между этапами другим кодом,
+    # не попадают в сетап и не удаляются при прерывании, а несколько сборок можно вести поочередно.
+    # С undoable=True каждый этап - свой блок отмены Maya, в который не попадают действия между этапами.
+    # Блок отключает быстрые пути сцены, поэтому он нужен только при сборке из интерфейса; пакетная сборка
+    # и сборка без очереди отмены идут без него
+    def buildSteps(self, num = 5, fkNum = 4, squashMode = None, skinWeights = None, ikSegments = None,
+                   controlDrive = None, budget = None, midDrivers = None, undoable = False):
+        if squashMode is not None:
+            self.SQUASH_MODE = squashMode
+        if skinWeights is not None:
+            self.SKIN_WEIGHTS = skinWeights
+        if ikSegments is not None:
+            self.IK_SEGMENTS = ikSegments
+        if midDrivers is not None:
+            self.MID_DRIVERS = midDrivers
+        if controlDrive is not None:
+            self.CONTROL_DRIVE = controlDrive
+        if budget is not None:
+            fkNum = self.fitBudget(budget, num, fkNum)[0]
+        self.jointCount = num
+        self.fkJointCount = fkNum
+
+        completed = False
+        try:
+            for n, stage in enumerate(self.BUILD_STAGES):
+                with undoChunk("TorsoRig", undoable):
+                    self.runStage(stage)
+                yield n + 1, len(self.BUILD_STAGES), stage
+            completed = True
+        finally:
+            if not completed:
+                with undoChunk("TorsoRig", undoable):
+                    self.rollback()
+
+    # След сетапа, который собрался бы с текущими настройками, по этапам сборки (отчет BuildProfiler
+    # с footprint=True). Сетап собирается в отдельной сцене в памяти, текущая сцена и риг не меняются.
+    # С stages=False след считается один раз после сборки, отчет содержит только итог ("footprint")
+    def estimateFootprint(self, num = 5, fkNum = 4, squashMode = None, stages = True):
+        from memoryBackend import MemoryBackend
+
+        desired = TorsoRig(self.rigType)
+        for slot in self.SETTINGS:
+            setattr(desired, slot, copy.deepcopy(getattr(self, slot)))
+        if squashMode is not None:
+            desired.SQUASH_MODE = squashMode
+        desired.resetState()
+        scene = MemoryBackend()
+        profiler = BuildProfiler(footprint = True)
+        try:
+            with useBackend(scene):
+                if not stages:
+                    desired.build(num, fkNum)
+                    return {"footprint": sceneFootprint(scene, scene.ls()).asDict()}
+                with profiler.activate():
+                    desired.profiler = profiler
+                    desired.build(num, fkNum)
+        finally:
+            desired.release()
+        return profiler.report()
+
+    # Подбирает сетап под бюджет budget ({показатель: предел}, см. rigFootprint.BUDGET_FIELDS). Если след
+    # сетапа с текущими настройками больше бюджета, пробуются более дешевые варианты: компактная система
+    # сжатия, затем меньше FK джоинтов, до MIN_FK_JOINTS. Подошедший режим сжатия сохраняется в риге,
+    # а каждая настройка, измененная ради бюджета, сообщается в log.
+    # Возвращает (количество FK джоинтов, итоговый след из estimateFootprint); если не подходит ни один
+    # вариант - RuntimeError с разбивкой следа самого дешевого варианта по этапам
+    def fitBudget(self, budget, num = 5, fkNum = 4, log = sys.stderr):
+        variants = [(self.SQUASH_MODE, fkNum)]
+        if self.SQUASH_MODE != "compact":
+            variants.append(("compact", fkNum))
+        variants.extend(("compact", n) for n in range(fkNum - 1, self.MIN_FK_JOINTS - 1, -1))
+        for squashMode, fkCount in variants:
+            report = self.estimateFootprint(num, fkCount, squashMode = squashMode, stages = False)
+            exceeded = overBudget(report["footprint"], budget)
+            if not exceeded:
+                if squashMode != self.SQUASH_MODE:
+                    log.write("TorsoRig: squash mode changed from {} to {} to fit the budget\n".format(
+                        self.SQUASH_MODE, squashMode))
+                if fkCount != fkNum:
+                    log.write("TorsoRig: FK joints reduced from {} to {} to fit the budget\n".format(fkNum, fkCount))
+                self.SQUASH_MODE = squashMode
+                return fkCount, report
+        report = self.estimateFootprint(num, fkCount, squashMode = squashMode)
+        raise RuntimeError("Rig footprint is over budget ({}):\n{}".format(
+            ", ".join("{} {} > {}".format(field, value, limit) for field, value, limit in exceeded),
+            formatFootprint(report)))
+
+    # Выполняет этап сборки с текущими настройками рига. Имена нод, выданные сценой за этап, попадают
+    # в реестр рига, положения трансформов кэшируются только до конца этапа
+    def runStage(self, stage):
+        with trackedNames(self.names), cachedTransforms():
+            if stage == "createPositionJoints":
+                self.createPositionJoints(self.jointCount)
+            elif stage == "createFkCtrlJoints":
+                self.createFkCtrlJoints(self.fkJointCount)
+            else:
+                getattr(self, stage)()
+
+    # Удаляет ноды прерванной сборки: известные ригу и все, чьи имена выданы сценой во время ее этапов
+    def rollback(self):
+        issued = list(self.names.issued)
+        self.delete()
+        for name in reversed(issued):
+            if cmds.objExists(name):
+                cmds.delete(name)
+        self.resetState()
+
+    # Запоминает входные данные этапа после его выполнения
+    def recordStage(self, stage):
+        if stage in self.STAGE_INPUTS:
+            self.stageInputs[stage] = self.stageInputValues(stage)
+
+    def stageInputValues(self, stage):
+        return dict((name, freezeValue(getattr(self, name))) for name in self.STAGE_INPUTS[stage])
+
+    # Выполненные этапы, чьи входные данные изменились: [(этап, [имена изменившихся данных])]
+    def changedStages(self):
+        changed = []
+        for stage in self.BUILD_STAGES:
+            recorded = self.stageInputs.get(stage)
+            if recorded is None:
+                continue
+            current = self.stageInputValues(stage)
+            inputs = [name for name in self.STAGE_INPUTS[stage] if current[name] != recorded.get(name)]
+            if inputs:
+                changed.append((stage, inputs))
+        return changed
+
+    # Обновляет собранный (полностью или частично) сетап после изменения направляющих,
+    # количества джоинтов или типа рига. Пересчитываются только этапы, чьи входные данные изменились:
+    # их ноды переносятся на месте, остальной граф остается как есть. Если изменилось количество нод
+    # (STRUCTURAL_INPUTS) или этап не умеет обновляться на месте, сетап пересобирается целиком.
+    # Обновление на месте рассчитано на сетап в исходной позе. Возвращает список пересчитанных этапов
+    def update(self, num = None, fkNum = None, neckRoot = None, hip = None, guides = None, spacing = None,
+               type = None, squashMode = None):
+        if not self.stageInputs:
+            return []
+        with trackedNames(self.names), cachedTransforms():
+            if self.locatorNodes and all(cmds.objExists(x) for x in self.locatorNodes.values()):
+                self.updateLocators()
+            if neckRoot is not None:
+                self.LOCATORS["neckRoot"] = list(neckRoot)
+            if hip is not None:
+                self.LOCATORS["hip"] = list(hip)
+            if type is not None:
+                self.setRigType(type)
+            if num is not None:
+                self.jointCount = num
+            if fkNum is not None:
+                self.fkJointCount = fkNum
+            if squashMode is not None:
+                self.SQUASH_MODE = squashMode
+            self.setLayout(guides, spacing)
+
+            changed = self.changedStages()
+            if any(self.STAGE_UPDATES.get(stage) is None or set(inputs) & set(self.STRUCTURAL_INPUTS)
+                   for stage, inputs in changed):
+                stages = [stage for stage in self.BUILD_STAGES if stage in self.stageInputs]
+                self.rebuild()
+                return stages
+
+            if "createSpineJoints" in self.stageInputs:
+                self.previousSpine = cmds.applyBatch("xform", [((x,), {"query": True, "translation": True,
+                                                                       "worldSpace": True}) for x in self.joints])
+            for stage, inputs in changed:
+                getattr(self, self.STAGE_UPDATES[stage])()
+                self.recordStage(stage)
+            return [stage for stage, inputs in changed]
+
+    # Удаляет сетап и заново выполняет те же этапы сборки с текущими настройками
+    def rebuild(self):
+        stages = [stage for stage in self.BUILD_STAGES if stage in self.stageInputs]
+        self.delete()
+        self.resetState()
+        for stage in stages:
+            self.runStage(stage)
+
+    # Удаляет из сцены ноды, созданные этапами сборки
+    def delete(self):
+        if self.falloffSampler is not None:
+            self.falloffSampler.release()
+        nodes = [self.rootGrp, self.torsoGrp, self.DNTGrp]
+        if self.bodyCtrl:
+            nodes.append(self.bodyCtrl.lastNode)
+        nodes += [x.lastNode for x in self.ikControls]
+        nodes += self.fkJoints + self.bindJoints + self.joints + self.ikSystemObjs + self.squashNodes
+        nodes += [self.skinCluster, self.arclenNode, self.baseStretch, self.baseSquash, self.scaleCompNode,
+                  self.squashCurve, self.fkLayer, self.ikLayer, self.torsoBaseLayer]
+        for segment in self.ikSegments:
+            nodes += segment.ikSystemObjs + [segment.skinCluster, segment.arclenNode, segment.baseStretch,
+                                             segment.baseSquash, segment.scaleCompNode]
+        nodes += list(self.locatorNodes.values())
+        for node in nodes:
+            if node and cmds.objExists(node):
+                cmds.delete(node)
+
+    # Возвращает риг в состояние до сборки, сохраняя позиции направляющих и настройки
+    def resetState(self):
+        # Локаторы в сцене по именам направляющих: {"neckRoot": локатор, "hip": локатор}
+        self.locatorNodes = {}
+        self.names.clear()
+        # Входные данные выполненных этапов: {этап: {имя: значение}}
+        self.stageInputs = {}
+        # Позиции джоинтов спины до обновления, по ним переносится кривая IK spline
+        self.previousSpine = []
+
+        # Основные составляющие сетапа спины
+        # Основные джоинты спины
+        self.joints = []
+        # Джоинты для FK системы
+        self.fkJoints = []
+        # Джоинты для управления IK системой через кривую: бедра, плечи, затем границы участков
+        self.bindJoints = []
+        # Контроллеры IK системы
+        self.ikControls = []
+        # Список из ikHandle, effector, curve системы IK spline
+        self.ikSystemObjs = []
+        # Скин кривой IK spline
+        self.skinCluster = ""
+        # Дополнительные участки IK spline системы (SplineSegment), первый участок - в полях выше и ниже
+        self.ikSegments = []
+        # Нода рассчета длины кривой
+        self.arclenNode = ""
+        # Нода расчета маштабирования системы джоинтов вдоль основоного направления
+        self.baseStretch = ""
+        # Нода расчета маштабирования системы джоинтов вдоль второстепенных осей
+        self.baseSquash = ""
+        # Нода компенсации маштабирования глобального контроллера
+        self.scaleCompNode = ""
+        # Анимационная кривая splineStretch, задающая затухание сжатия вдоль спины
+        self.squashCurve = ""
+        # Ноды системы сжатия джоинтов
+        self.squashNodes = []
+        # Подписку компактной системы сжатия снимает только delete(): массив степеней в сцене должен
+        # следовать за кривой и после release()
+        if self.falloffSampler is not None and self.falloffSampler.onChange is None:
+            self.falloffSampler.release()
+        self.falloffSampler = None
+
+        # Выходные данные для других частей сетапа
+        # Позиция основания шеи
+        self.neckRootPosition = []
+        # Контроллер спины целиком
+        self.bodyCtrl = ""
+        # Группа для объектов, которые не нужно трогать
+        self.DNTGrp = ""
+        # Группа для bodyCtrl, DNTGrp
+        self.torsoGrp = ""
+        # Группа позиционирования всей системы рига
+        self.rootGrp = ""
+
+        # Визуальные слои для сетапа спины
+        # FK слой
+        self.fkLayer = ""
+        # IK слой
+        self.ikLayer = ""
+        # Слой для контроллера спины
+        self.torsoBaseLayer = ""
+
+    # Освобождает служебные данные рига после сборки: списки нод, контроллеры, входные данные этапов.
+    # Ноды в сцене остаются, но update() и rebuild() для этого рига больше ничего не делают
+    def release(self):
+        self.resetState()
+        self.GUIDES = []
+        self.profiler = None
+
+    # Временно снимает блокировку с атрибутов трансформации, заблокированных на этапе cleanKAttr.
+    # Состояние всех атрибутов запрашивается и меняется пакетами
+    @contextlib.contextmanager
+    def unlockedTransform(self, *nodes):
+        plugs = ["{}.{}{}".format(node, attr, axis) for node in nodes for attr in ("translate", "rotate", "scale")
+                 for axis in "XYZ"]
+        states = cmds.applyBatch("getAttr", [((plug,), {"lock": True}) for plug in plugs])
+        locked = [plug for plug, state in zip(plugs, states) if state]
+        if locked:
+            cmds.setAttrStates(locked, lock = False)
+        try:
+            yield
+        finally:
+            if locked:
+                cmds.setAttrStates(locked, lock = True)
 
     def getNeckRootPosition(self):
         return self.neckRootPosition
@@ -599,6 +1388,108 @@ class TorsoRig:
     def getRootNode(self):
         return self.rootGrp
 
-
-
-
+    # Кадр крепления части сетапа base на стороне side ("left" или "right") из раскладки (см. ATTACHMENTS)
+    def getAttachmentFrame(self, base, side = "left"):
+        return self.layout().frame(base, side)
+
+    # Сохраняет собранный сетап в компактный файл (rigGraph), который загружается без повторной сборки
+    def export(self, path):
+        return exportGraph(path, [self.rootGrp])
+
+    # Риг для копии сетапа, загруженной из файла этого рига (loadGraph): настройки и входные данные этапов
+    # копируются, имена нод заменяются по renames (имя в файле -> имя в сцене). Копию можно обновлять
+    # через update(), как риг, собранный этапами
+    def cloneState(self, renames):
+        rig = TorsoRig(self.rigType)
+        for slot in self.__slots__:
+            if slot in ("names", "profiler", "falloffSampler", "rigLayout", "layoutInputs"):
+                continue
+            value = getattr(self, slot)
+            if slot in self.NODE_STATE:
+                setattr(rig, slot, _renamedNodes(value, renames))
+            else:
+                setattr(rig, slot, copy.deepcopy(value))
+        for name in self.names.issued:
+            rig.names.issue(name, renames.get(name, name))
+        if rig.SQUASH_MODE == "compact" and rig.squashCurve:
+            rig.watchSquashFalloff()
+        return rig
+
+    # Собирает несколько сетапов подряд в одной сессии. specs - словари с ключами type, num, fkNum,
+    # squashMode, skinWeights, ikSegments, midDrivers, controlDrive, budget, neckRoot, hip, guides, spacing
+    # (все необязательные).
+    # После сборки каждого сетапа вызывается callback(rig) - например, чтобы сохранить сцену и открыть новую, -
+    # затем служебные данные рига освобождаются. Возвращает результаты callback, без него - корневые группы сетапов
+def buildRigs(specs, callback = None):
+    results = []
+    for spec in specs:
+        rig = TorsoRig(spec.get("type", "biped"))
+        if spec.get("neckRoot") is not None:
+            rig.LOCATORS["neckRoot"] = list(spec["neckRoot"])
+        if spec.get("hip") is not None:
+            rig.LOCATORS["hip"] = list(spec["hip"])
+        rig.setLayout(spec.get("guides"), spec.get("spacing"))
+        rig.build(spec.get("num", 5), spec.get("fkNum", 4), squashMode = spec.get("squashMode"),
+                  skinWeights = spec.get("skinWeights"), ikSegments = spec.get("ikSegments"),
+                  midDrivers = spec.get("midDrivers"), controlDrive = spec.get("controlDrive"),
+                  budget = spec.get("budget"))
+        results.append(callback(rig) if callback is not None else rig.getRootNode())
+        rig.release()
+    return results
+
+    # Сетапы для новых положений направляющих по собранному сетапу-шаблону: граф шаблона один раз
+    # сохраняется в файл и для каждого сетапа загружается из него пакетными командами, затем пересчитываются
+    # только данные, зависящие от положения (джоинты и их ориентация, контроллеры, кривая IK spline,
+    # исходная длина кривой). specs - словари с ключами neckRoot, hip, guides, spacing; количество джоинтов
+    # и режимы берутся из шаблона. callback и результат - как у buildRigs
+def retargetRigs(template, specs, callback = None):
+    handle, path = tempfile.mkstemp(suffix = ".rgrf")
+    os.close(handle)
+    results = []
+    try:
+        template.export(path)
+        with RigGraph(path) as graph:
+            for spec in specs:
+                rig = template.cloneState(loadGraph(graph))
+                rig.update(neckRoot = spec.get("neckRoot"), hip = spec.get("hip"), guides = spec.get("guides"),
+                           spacing = spec.get("spacing"))
+                results.append(callback(rig) if callback is not None else rig.getRootNode())
+                rig.release()
+    finally:
+        os.remove(path)
+    return results
+
+    # Обработчик кэша кривой splineStretch: выставляет изменившиеся степени в атрибуты exponent1..N ноды node.
+    # Держит только имя ноды, а не риг, поэтому работает и после release() рига
+def _falloffWriter(node):
+    def write(sampler):
+        sampler.backend().applyBatch("setAttr", [(("{}.exponent{}".format(node, n + 1), value), {})
+                                                 for n, value in sampler.changes()])
+    return write
+
+    # Вызовы setAttr для CV кривой shape
+def _curveCalls(shape, points):
+    return [(("{}.cv[{}]".format(shape, n),) + tuple(point), {}) for n, point in enumerate(points)]
+
+    # Вызовы setAttr для translate и jointOrient джоинтов
+def _transformCalls(joints, translations, jointOrients):
+    calls = []
+    for joint, translation, jointOrient in zip(joints, translations, jointOrients):
+        calls.append((("{}.translate".format(joint),) + tuple(translation), {}))
+        calls.append((("{}.jointOrient".format(joint),) + tuple(jointOrient), {}))
+    return calls
+
+    # Имена нод в value (строка, список, словарь, контроллер, участок IK spline), замененные по renames
+def _renamedNodes(value, renames):
+    if isinstance(value, list):
+        return [_renamedNodes(x, renames) for x in value]
+    if isinstance(value, dict):
+        return dict((key, _renamedNodes(x, renames)) for key, x in value.items())
+    if isinstance(value, (ControllerAgreementHandler, SplineSegment)):
+        copied = type(value).__new__(type(value))
+        for slot in type(value).__slots__:
+            setattr(copied, slot, _renamedNodes(getattr(value, slot), renames))
+        return copied
+    if value:
+        return renames.get(value, value)
+    return value
@@ -0,0 +1,697 @@
+    # coding=utf-8
+import contextlib
+import json
+import math
+import types
+
+import rigMath
+
+try:
+    STRING_TYPES = (basestring,)
+except NameError:
+    STRING_TYPES = (str,)
+
+    # Команды, которые только читают сцену и не попадают в список операций
+QUERY_COMMANDS = ("getAttr", "objExists", "ls", "listRelatives", "listConnections", "nodeType", "about",
+                  "undoInfo", "currentTime")
+
+    # Фазы пакетного воспроизведения. Внутри отрезка между барьерами операции группируются
+    # по фазам в этом порядке: сначала создаются ноды, затем атрибуты, значения, связи и блокировки
+BATCH_PHASES = ("createNode", "addAttr", "setAttr", "connectAttr", "lockAttr")
+
+    # Базовый класс сцены, через который сетап обращается к Maya или ее заменам
+class SceneBackend(object):
+
+    # Название режима для отчетов
+    mode = "abstract"
+    # Изменения должны попадать в очередь отмены Maya (см. undoChunk)
+    undoable = False
+
+    # Выполняет пакет однотипных вызовов, возвращает список результатов.
+    # Наследники переопределяют его, если умеют выполнять пакет быстрее, чем по одному вызову
+    def applyBatch(self, command, calls):
+        func = getattr(self, command)
+        return [func(*args, **kwargs) for args, kwargs in calls]
+
+    # Создает джоинты с готовыми локальными translate и jointOrient одной операцией.
+    # При chain=True каждый джоинт вкладывается в предыдущий, первый - в parent
+    def createJointChain(self, names, translations, jointOrients = None, radius = 1.0, parent = None, chain = True):
+        created = []
+        for n, name in enumerate(names):
+            jointParent = created[-1] if chain and created else parent
+            if jointParent:
+                joint = self.createNode("joint", name = name, parent = jointParent, skipSelect = True)
+            else:
+                joint = self.createNode("joint", name = name, skipSelect = True)
+            self.setAttr("{}.translate".format(joint), *translations[n])
+            if jointOrients is not None:
+                self.setAttr("{}.jointOrient".format(joint), *jointOrients[n])
+            self.setAttr("{}.radius".format(joint), radius)
+            created.append(joint)
+        return created
+
+    # Создает вложенные друг в друга трансформы names одной операцией, первый - в parent.
+    # Уже существующая нода child переносится в последний из них с сохранением локальных значений.
+    # Возвращает имена созданных трансформов
+    def createTransformChain(self, names, parent = None, child = None):
+        created = []
+        for name in names:
+            chainParent = created[-1] if created else parent
+            if chainParent:
+                created.append(self.createNode("transform", name = name, parent = chainParent, skipSelect = True))
+            else:
+                created.append(self.createNode("transform", name = name, skipSelect = True))
+        if child and created:
+            self.parent(child, created[-1], relative = True)
+        return created
+
+    # Добавляет каждому трансформу из parents шейп-кривую с точками points[n] в его локальном пространстве.
+    # Здесь - через временную кривую, наследники создают шейпы сразу под трансформами
+    def addCurveShapes(self, parents, points, degree, periodic = False, names = None):
+        shapes = []
+        for n, parent in enumerate(parents):
+            curve = self.curve(point = points[n], degree = degree, periodic = periodic,
+                               knot = rigMath.curveKnots(len(points[n]), degree, periodic))
+            shape = self.listRelatives(curve, shapes = True)[0]
+            self.parent(shape, parent, shape = True, relative = True)
+            self.delete(curve)
+            shapes.append(self.rename(shape, names[n] if names else parent + "Shape"))
+        return shapes
+
+    # Выставляет флаги lock, keyable и channelBox сразу списку атрибутов, None - флаг не меняется.
+    # Здесь - отдельным setAttr на атрибут, наследники пропускают атрибуты, уже находящиеся в нужном состоянии.
+    # Возвращает количество измененных атрибутов
+    def setAttrStates(self, plugs, lock = None, keyable = None, channelBox = None):
+        flags = dict((flag, state) for flag, state in (("lock", lock), ("keyable", keyable), ("channelBox", channelBox))
+                     if state is not None)
+        for plug in plugs:
+            self.setAttr(plug, **flags)
+        return len(plugs)
+
+    # Добавляет ноды в слои отображения: assignments - пары (слой, список нод), без рекурсии в потомков
+    def assignDisplayLayers(self, assignments):
+        for layer, members in assignments:
+            self.editDisplayLayerMembers(layer, members, noRecurse = True)
+
+    # Веса скина: (шейп геометрии, влияния, строки весов по точкам в порядке влияний)
+    def getSkinWeights(self, skin):
+        shape = self.skinCluster(skin, query = True, geometry = True)[0]
+        influences = self.skinCluster(skin, query = True, influence = True)
+        count = len(self.getAttr("{}.cv[*]".format(shape)))
+        return shape, influences, [self.skinPercent(skin, "{}.cv[{}]".format(shape, n), query = True, value = True)
+                                   for n in range(count)]
+
+    # Выставляет веса скина по точкам, строки в порядке влияний
+    def setSkinWeights(self, skin, weights):
+        shape = self.skinCluster(skin, query = True, geometry = True)[0]
+        influences = self.skinCluster(skin, query = True, influence = True)
+        for n, row in enumerate(weights):
+            self.skinPercent(skin, "{}.cv[{}]".format(shape, n), transformValue = list(zip(influences, row)),
+                             normalize = False)
+
+    # Значения анимационной кривой в заданные моменты времени
+    def evalAnimCurve(self, curve, times):
+        return [self.keyframe(curve, query = True, eval = True, time = (t,))[0] for t in times]
+
+    # Подписка на создание нод, возвращает идентификатор подписки или None, если сцена ее не поддерживает
+    def addNodeAddedCallback(self, func):
+        return None
+
+    # Подписка на изменение ключей анимационных кривых: func(список имен измененных кривых).
+    # Возвращает идентификатор подписки или None, если сцена ее не поддерживает
+    def addAnimCurveEditedCallback(self, func):
+        return None
+
+    def removeCallback(self, callbackId):
+        pass
+
+    # Сцена-обертка над сценой inner: профайлер, реестр имен, кэш трансформов. Команды сцены проходят
+    # через wrap(command, func), который наследник переопределяет, чтобы считать или запоминать вызовы.
+    # Расширенные методы SceneBackend передаются inner целиком через callBulk, чтобы не терять ее быстрые
+    # пути: версии базового класса разбили бы их на отдельные команды
+class WrapperBackend(SceneBackend):
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.mode = inner.mode
+
+    def __getattr__(self, command):
+        if command.startswith("_"):
+            raise AttributeError(command)
+        func = self.wrap(command, getattr(self.inner, command))
+        setattr(self, command, func)
+        return func
+
+    # Вызов команды command через обертку, здесь - сама команда inner
+    def wrap(self, command, func):
+        return func
+
+    # Вызов расширенного метода command у inner
+    def callBulk(self, command, *args, **kwargs):
+        return getattr(self.inner, command)(*args, **kwargs)
+
+    def applyBatch(self, command, calls):
+        return self.inner.applyBatch(command, calls)
+
+    def createJointChain(self, *args, **kwargs):
+        return self.callBulk("createJointChain", *args, **kwargs)
+
+    def createTransformChain(self, *args, **kwargs):
+        return self.callBulk("createTransformChain", *args, **kwargs)
+
+    def addCurveShapes(self, *args, **kwargs):
+        return self.callBulk("addCurveShapes", *args, **kwargs)
+
+    def setAttrStates(self, *args, **kwargs):
+        return self.callBulk("setAttrStates", *args, **kwargs)
+
+    def assignDisplayLayers(self, *args, **kwargs):
+        return self.callBulk("assignDisplayLayers", *args, **kwargs)
+
+    def getSkinWeights(self, *args, **kwargs):
+        return self.callBulk("getSkinWeights", *args, **kwargs)
+
+    def setSkinWeights(self, *args, **kwargs):
+        return self.callBulk("setSkinWeights", *args, **kwargs)
+
+    def evalAnimCurve(self, *args, **kwargs):
+        return self.callBulk("evalAnimCurve", *args, **kwargs)
+
+    # Подписки всегда относятся к самой сцене, а не к обертке
+    def addNodeAddedCallback(self, func):
+        return self.inner.addNodeAddedCallback(func)
+
+    def addAnimCurveEditedCallback(self, func):
+        return self.inner.addAnimCurveEditedCallback(func)
+
+    def removeCallback(self, callbackId):
+        self.inner.removeCallback(callbackId)
+
+    # Живая сцена Maya
+class MayaBackend(SceneBackend):
+
+    mode = "maya"
+
+    def __init__(self, module = None):
+        self.cmds = module or mayaCommands()
+        if self.cmds is None:
+            raise RuntimeError("maya.cmds is not available, use another scene backend")
+
+    def __getattr__(self, command):
+        return getattr(self.cmds, command)
+
+    def applyBatch(self, command, calls):
+        if self.undoable:
+            return SceneBackend.applyBatch(self, command, calls)
+        if command == "connectAttr" and len(calls) > 1:
+            return self._connectBatch(calls)
+        if command == "setAttr" and len(calls) > 1:
+            return self._setAttrBatch(calls)
+        return SceneBackend.applyBatch(self, command, calls)
+
+    # Создает всю цепочку одним MDagModifier и выставляет значения вторым, без команд на каждый джоинт
+    def createJointChain(self, names, translations, jointOrients = None, radius = 1.0, parent = None, chain = True):
+        if self.undoable:
+            return SceneBackend.createJointChain(self, names, translations, jointOrients, radius, parent, chain)
+        from maya.api import OpenMaya
+
+        modifier = OpenMaya.MDagModifier()
+        parentObject = OpenMaya.MObject.kNullObj
+        if parent:
+            selection = OpenMaya.MSelectionList()
+            selection.add(parent)
+            parentObject = selection.getDependNode(0)
+        objects = []
+        for name in names:
+            joint = modifier.createNode("joint", objects[-1] if chain and objects else parentObject)
+            modifier.renameNode(joint, name)
+            objects.append(joint)
+        modifier.doIt()
+
+        values = OpenMaya.MDGModifier()
+        for n, joint in enumerate(objects):
+            node = OpenMaya.MFnDependencyNode(joint)
+            for axis, value in zip("XYZ", translations[n]):
+                values.newPlugValueDouble(node.findPlug("translate" + axis, False), value)
+            if jointOrients is not None:
+                # Угловые атрибуты через API задаются во внутренних единицах - радианах
+                for axis, value in zip("XYZ", jointOrients[n]):
+                    values.newPlugValueDouble(node.findPlug("jointOrient" + axis, False), math.radians(value))
+            values.newPlugValueDouble(node.findPlug("radius", False), radius)
+        values.doIt()
+        return [OpenMaya.MFnDependencyNode(joint).name() for joint in objects]
+
+    # Создает трансформы и переносит child одним MDagModifier
+    def createTransformChain(self, names, parent = None, child = None):
+        if self.undoable:
+            return SceneBackend.createTransformChain(self, names, parent, child)
+        from maya.api import OpenMaya
+
+        def dependNode(name):
+            selection = OpenMaya.MSelectionList()
+            selection.add(name)
+            return selection.getDependNode(0)
+
+        modifier = OpenMaya.MDagModifier()
+        objects = []
+        for name in names:
+            node = modifier.createNode("transform", objects[-1] if objects else
+                                       (dependNode(parent) if parent else OpenMaya.MObject.kNullObj))
+            modifier.renameNode(node, name)
+            objects.append(node)
+        if child and objects:
+            modifier.reparentNode(dependNode(child), objects[-1])
+        modifier.doIt()
+        return [OpenMaya.MFnDependencyNode(node).name() for node in objects]
+
+    # Создает шейпы через MFnNurbsCurve сразу под трансформами, без временных нод
+    def addCurveShapes(self, parents, points, degree, periodic = False, names = None):
+        if self.undoable:
+            return SceneBackend.addCurveShapes(self, parents, points, degree, periodic, names)
+        from maya.api import OpenMaya
+
+        form = OpenMaya.MFnNurbsCurve.kPeriodic if periodic else OpenMaya.MFnNurbsCurve.kOpen
+        shapes = []
+        for n, parent in enumerate(parents):
+            selection = OpenMaya.MSelectionList()
+            selection.add(parent)
+            shape = OpenMaya.MFnNurbsCurve().create([OpenMaya.MPoint(*point) for point in points[n]],
+                                                    rigMath.curveKnots(len(points[n]), degree, periodic),
+                                                    degree, form, False, False, selection.getDependNode(0))
+            node = OpenMaya.MFnDependencyNode(shape)
+            node.setName(names[n] if names else parent + "Shape")
+            shapes.append(node.name())
+        return shapes
+
+    # Меняет флаги атрибутов напрямую через MPlug: атрибуты группируются по нодам,
+    # атрибуты в нужном состоянии не трогаются
+    def setAttrStates(self, plugs, lock = None, keyable = None, channelBox = None):
+        if self.undoable:
+            return SceneBackend.setAttrStates(self, plugs, lock, keyable, channelBox)
+        from maya.api import OpenMaya
+
+        byNode = {}
+        for plug in plugs:
+            node, attr = plug.split(".", 1)
+            byNode.setdefault(node, []).append(attr)
+        changed = 0
+        for node, attrs in byNode.items():
+            selection = OpenMaya.MSelectionList()
+            selection.add(node)
+            depNode = OpenMaya.MFnDependencyNode(selection.getDependNode(0))
+            for attr in attrs:
+                mPlug = depNode.findPlug(attr, False)
+                states = ((lock, mPlug.isLocked, "isLocked"), (keyable, mPlug.isKeyable, "isKeyable"),
+                          (channelBox, mPlug.isChannelBox, "isChannelBox"))
+                pending = [(prop, state) for state, current, prop in states if state is not None and state != current]
+                for prop, state in pending:
+                    setattr(mPlug, prop, state)
+                changed += bool(pending)
+        return changed
+
+    # Все ноды попадают в слои одним MDGModifier: членство в слое - связь drawInfo -> drawOverride
+    def assignDisplayLayers(self, assignments):
+        if self.undoable:
+            return SceneBackend.assignDisplayLayers(self, assignments)
+        from maya.api import OpenMaya
+
+        modifier = OpenMaya.MDGModifier()
+        for layer, members in assignments:
+            drawInfo = self._plug("{}.drawInfo".format(layer))
+            for member in members:
+                drawOverride = self._plug("{}.drawOverride".format(member))
+                if drawOverride.isDestination:
+                    modifier.disconnect(drawOverride.source(), drawOverride)
+                modifier.connect(drawInfo, drawOverride)
+        modifier.doIt()
+
+    # Веса всех точек кривой одним вызовом MFnSkinCluster
+    def getSkinWeights(self, skin):
+        skinFn, shape, components = self._skinComponents(skin)
+        influences = [path.partialPathName() for path in skinFn.influenceObjects()]
+        weights = skinFn.getWeights(shape, components)[0]
+        count = len(influences)
+        return shape.partialPathName(), influences, [list(weights[n:n + count])
+                                                     for n in range(0, len(weights), count)]
+
+    def setSkinWeights(self, skin, weights):
+        if self.undoable:
+            return SceneBackend.setSkinWeights(self, skin, weights)
+        from maya.api import OpenMaya
+
+        skinFn, shape, components = self._skinComponents(skin)
+        count = len(skinFn.influenceObjects())
+        values = OpenMaya.MDoubleArray([float(w) for row in weights for w in row])
+        skinFn.setWeights(shape, components, OpenMaya.MIntArray(list(range(count))), values, False)
+
+    # Скин, шейп кривой под ним и компонент со всеми ее CV
+    def _skinComponents(self, skin):
+        from maya.api import OpenMaya, OpenMayaAnim
+
+        selection = OpenMaya.MSelectionList()
+        selection.add(skin)
+        skinFn = OpenMayaAnim.MFnSkinCluster(selection.getDependNode(0))
+        shape = skinFn.getPathAtIndex(0)
+        components = OpenMaya.MFnSingleIndexedComponent()
+        componentObject = components.create(OpenMaya.MFn.kCurveCVComponent)
+        components.setCompleteData(OpenMaya.MFnNurbsCurve(shape).numCVs)
+        return skinFn, shape, componentObject
+
+    # Считывает кривую через MFnAnimCurve без отдельной команды на каждое значение
+    def evalAnimCurve(self, curve, times):
+        from maya.api import OpenMaya, OpenMayaAnim
+
+        selection = OpenMaya.MSelectionList()
+        selection.add(curve)
+        animCurve = OpenMayaAnim.MFnAnimCurve(selection.getDependNode(0))
+        unit = OpenMaya.MTime.uiUnit()
+        return [animCurve.evaluate(OpenMaya.MTime(t, unit)) for t in times]
+
+    def addNodeAddedCallback(self, func):
+        from maya.api import OpenMaya
+
+        return OpenMaya.MDGMessage.addNodeAddedCallback(lambda node, clientData: func(node), "dependNode")
+
+    def addAnimCurveEditedCallback(self, func):
+        from maya.api import OpenMaya, OpenMayaAnim
+
+        def edited(curves, clientData):
+            func([OpenMaya.MFnDependencyNode(curve).name() for curve in curves])
+
+        return OpenMayaAnim.MAnimMessage.addAnimCurveEditedCallback(edited)
+
+    def removeCallback(self, callbackId):
+        from maya.api import OpenMaya
+
+        OpenMaya.MMessage.removeCallback(callbackId)
+
+    # Соединяет пакет атрибутов одним MDGModifier вместо отдельного вызова connectAttr на каждую связь
+    def _connectBatch(self, calls):
+        from maya.api import OpenMaya
+
+        modifier = OpenMaya.MDGModifier()
+        pending = set()
+        for args, kwargs in calls:
+            src, dst = self._plug(args[0]), self._plug(args[1])
+            if args[1] in pending:
+                modifier.doIt()
+                modifier = OpenMaya.MDGModifier()
+                pending.clear()
+            if dst.isDestination:
+                if not (kwargs.get("force") or kwargs.get("f")):
+                    raise RuntimeError("connectAttr: '{}' already has an incoming connection".format(args[1]))
+                modifier.disconnect(dst.source(), dst)
+            modifier.connect(src, dst)
+            pending.add(args[1])
+        modifier.doIt()
+        return [None] * len(calls)
+
+    # Выставляет простые числовые значения одним MDGModifier. Вызовы с флагами, несколькими значениями
+    # и атрибутами с единицами измерения (углы, расстояния) выполняются обычным setAttr
+    def _setAttrBatch(self, calls):
+        from maya.api import OpenMaya
+
+        modifier = OpenMaya.MDGModifier()
+        for args, kwargs in calls:
+            simple = len(args) == 2 and not kwargs and isinstance(args[1], (bool, int, float))
+            plug = self._plug(args[0]) if simple else None
+            if plug is None or plug.attribute().hasFn(OpenMaya.MFn.kUnitAttribute):
+                modifier.doIt()
+                modifier = OpenMaya.MDGModifier()
+                self.cmds.setAttr(*args, **kwargs)
+            elif plug.attribute().hasFn(OpenMaya.MFn.kNumericAttribute) and OpenMaya.MFnNumericAttribute(
+                    plug.attribute()).numericType() == OpenMaya.MFnNumericData.kBoolean:
+                modifier.newPlugValueBool(plug, bool(args[1]))
+            elif isinstance(args[1], float):
+                modifier.newPlugValueDouble(plug, args[1])
+            else:
+                modifier.newPlugValueInt(plug, int(args[1]))
+        modifier.doIt()
+        return [None] * len(calls)
+
+    def _plug(self, name):
+        from maya.api import OpenMaya
+
+        selection = OpenMaya.MSelectionList()
+        selection.add(name)
+        return selection.getPlug(0)
+
+    # Операция над сценой, записанная для последующего воспроизведения
+class Operation(object):
+    __slots__ = ("command", "args", "kwargs", "result")
+
+    def __init__(self, command, args, kwargs, result):
+        self.command = command
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+
+    # К какой фазе пакетного воспроизведения относится операция, None - барьер
+    def phase(self):
+        if self.command == "setAttr":
+            if len(self.args) > 1:
+                return "setAttr"
+            # Снятие блокировки должно остаться на своем месте, иначе следующие setAttr упадут
+            if any(not self.kwargs.get(flag, True) for flag in ("lock", "l")):
+                return None
+            return "lockAttr"
+        if self.command in ("createNode", "addAttr", "connectAttr"):
+            return self.command
+        return None
+
+    # Пакет операций одной команды
+class Batch(object):
+    __slots__ = ("command", "phase", "operations")
+
+    def __init__(self, command, phase, operations):
+        self.command = command
+        self.phase = phase
+        self.operations = operations
+
+    # Разбивает список операций на пакеты.
+    # Барьеры (parent, joint, select, rename и т.д.) выполняются строго по порядку записи,
+    # а ноды, атрибуты и связи между двумя барьерами группируются по фазам BATCH_PHASES.
+    # Порядок фаз соответствует зависимостям: связь или значение не может опередить создание ноды,
+    # а блокировка атрибута - связь, которая в него входит
+def scheduleOperations(operations):
+    batches = []
+    segment = {}
+
+    def flush():
+        for phase in BATCH_PHASES:
+            if segment.get(phase):
+                batches.append(Batch("setAttr" if phase == "lockAttr" else phase, phase, segment[phase]))
+        segment.clear()
+
+    for op in operations:
+        phase = op.phase()
+        if phase is None:
+            flush()
+            if batches and batches[-1].phase is None and batches[-1].command == op.command:
+                batches[-1].operations.append(op)
+            else:
+                batches.append(Batch(op.command, None, [op]))
+        else:
+            segment.setdefault(phase, []).append(op)
+    flush()
+    return batches
+
+def _materialize(value):
+    if isinstance(value, tuple):
+        return tuple(_materialize(x) for x in value)
+    if isinstance(value, (list, types.GeneratorType)):
+        return [_materialize(x) for x in value]
+    return value
+
+    # Подменяет имена нод, которые при воспроизведении получили другие имена
+def _remap(value, nameMap):
+    if not nameMap:
+        return value
+    if isinstance(value, STRING_TYPES):
+        if value in nameMap:
+            return nameMap[value]
+        node, dot, attr = value.partition(".")
+        if dot and node in nameMap:
+            return nameMap[node] + dot + attr
+        return value
+    if isinstance(value, tuple):
+        return tuple(_remap(x, nameMap) for x in value)
+    if isinstance(value, list):
+        return [_remap(x, nameMap) for x in value]
+    if isinstance(value, dict):
+        return dict((key, _remap(x, nameMap)) for key, x in value.items())
+    return value
+
+def _updateNameMap(nameMap, recorded, actual):
+    if isinstance(recorded, STRING_TYPES) and isinstance(actual, STRING_TYPES):
+        if recorded != actual:
+            nameMap[recorded] = actual
+    elif isinstance(recorded, (list, tuple)) and isinstance(actual, (list, tuple)):
+        for rec, act in zip(recorded, actual):
+            _updateNameMap(nameMap, rec, act)
+
+    # Режим записи: все изменения сцены выполняются на теневой сцене в памяти (она же отвечает
+    # на запросы) и складываются в список операций, который затем воспроизводится пакетами
+class RecordingBackend(SceneBackend):
+
+    mode = "recording"
+
+    def __init__(self, shadow = None):
+        if shadow is None:
+            from memoryBackend import MemoryBackend
+            shadow = MemoryBackend()
+        self.shadow = shadow
+        self.operations = []
+
+    def __getattr__(self, command):
+        if command.startswith("_"):
+            raise AttributeError(command)
+        func = getattr(self.shadow, command)
+
+        def recorded(*args, **kwargs):
+            args = _materialize(args)
+            kwargs = dict((key, _materialize(value)) for key, value in kwargs.items())
+            result = func(*args, **kwargs)
+            if not self.isQuery(command, kwargs):
+                self.operations.append(Operation(command, args, kwargs, result))
+            return result
+
+        # Кэшируем обертку, чтобы следующие вызовы не проходили через __getattr__
+        setattr(self, command, recorded)
+        return recorded
+
+    def isQuery(self, command, kwargs):
+        if command in QUERY_COMMANDS or kwargs.get("query") or kwargs.get("q"):
+            return True
+        return command == "arclen" and not (kwargs.get("constructionHistory") or kwargs.get("ch"))
+
+    # Веса скина записываются одной операцией, а не отдельным skinPercent на точку
+    def getSkinWeights(self, skin):
+        return self.shadow.getSkinWeights(skin)
+
+    def setSkinWeights(self, skin, weights):
+        weights = _materialize(weights)
+        self.shadow.setSkinWeights(skin, weights)
+        self.operations.append(Operation("setSkinWeights", (skin, weights), {}, None))
+
+    def addNodeAddedCallback(self, func):
+        return self.shadow.addNodeAddedCallback(func)
+
+    def addAnimCurveEditedCallback(self, func):
+        return self.shadow.addAnimCurveEditedCallback(func)
+
+    def removeCallback(self, callbackId):
+        self.shadow.removeCallback(callbackId)
+
+    def clear(self):
+        self.operations = []
+
+    # Количество записанных операций по командам
+    def summary(self):
+        counts = {}
+        for op in self.operations:
+            counts[op.command] = counts.get(op.command, 0) + 1
+        return counts
+
+    # Сохраняет записанные операции в JSON, чтобы воспроизвести их в другой сессии (см. loadRecording)
+    def save(self, path):
+        operations = [{"command": op.command, "args": op.args, "kwargs": op.kwargs, "result": op.result}
+                      for op in self.operations]
+        with open(path, "w") as output:
+            json.dump({"operations": operations}, output)
+
+    # Воспроизводит записанные операции пакетами на целевой сцене.
+    # Возвращает словарь переименований: записанное имя -> имя, которое нода получила при воспроизведении
+    def replay(self, target = None):
+        target = target or MayaBackend()
+        nameMap = {}
+        for batch in scheduleOperations(self.operations):
+            calls = [(_remap(op.args, nameMap), _remap(op.kwargs, nameMap)) for op in batch.operations]
+            results = target.applyBatch(batch.command, calls)
+            for op, result in zip(batch.operations, results):
+                _updateNameMap(nameMap, op.result, result)
+        return nameMap
+
+    # Загружает операции, сохраненные RecordingBackend.save, для воспроизведения
+def loadRecording(path, shadow = None):
+    with open(path) as source:
+        data = json.load(source)
+    recording = RecordingBackend(shadow)
+    recording.operations = [Operation(op["command"], op["args"], op["kwargs"], op["result"])
+                            for op in data["operations"]]
+    return recording
+
+    # Модуль maya.cmds или None вне Maya. Загружается при первом обращении к сцене, а не при импорте:
+    # инструменты, которым нужны только соглашения сетапа, запускаются в обычном Python
+def mayaCommands():
+    try:
+        from maya import cmds as mayaCmds
+    except ImportError:
+        return None
+    return mayaCmds
+
+    # Текущая сцена, с которой работает сетап. Живая сцена Maya подключается при первом вызове getBackend
+_backend = None
+_mayaChecked = False
+
+def getBackend():
+    global _backend, _mayaChecked
+    if _backend is None and not _mayaChecked:
+        _mayaChecked = True
+        mayaCmds = mayaCommands()
+        if mayaCmds is not None:
+            _backend = MayaBackend(mayaCmds)
+    if _backend is None:
+        raise RuntimeError("Scene backend is not set: maya.cmds is not available, call setBackend()")
+    return _backend
+
+    # Задает текущую сцену, возвращает предыдущую
+def setBackend(backend):
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
+
+    # Временно переключает сетап на другую сцену
+@contextlib.contextmanager
+def useBackend(backend):
+    previous = setBackend(backend)
+    try:
+        yield backend
+    finally:
+        setBackend(previous)
+
+    # Блок отмены: все изменения сцены внутри него отменяются одним undo. Быстрые пути MayaBackend
+    # через OpenMaya в очередь отмены не попадают, поэтому внутри блока сцена выполняет их командами.
+    # Блок открывается, только если он нужен (enabled) и очередь отмены есть: отмена включена и сессия
+    # не пакетная (mayapy, maya -batch). Иначе изменения выполняются как есть, с быстрыми путями
+@contextlib.contextmanager
+def undoChunk(name, enabled = True):
+    backend = getBackend()
+    if not enabled or not backend.undoInfo(query = True, state = True) or backend.about(batch = True):
+        yield
+        return
+    # Флаг выставляется самой сцене, а не оберткам над ней (профайлер, кэш трансформов, реестр имен)
+    scene = baseScene(backend)
+    previous = scene.undoable
+    scene.undoable = True
+    backend.undoInfo(openChunk = True, chunkName = name)
+    try:
+        yield
+    finally:
+        backend.undoInfo(closeChunk = True)
+        scene.undoable = previous
+
+    # Сцена под всеми обертками backend (профайлер, кэш трансформов, реестр имен)
+def baseScene(backend):
+    while getattr(backend, "inner", None) is not None:
+        backend = backend.inner
+    return backend
+
+    # Заменитель модуля maya.cmds: перенаправляет вызовы текущей сцене
+class BackendProxy(object):
+
+    def __getattr__(self, command):
+        return getattr(getBackend(), command)
+
+cmds = BackendProxy()
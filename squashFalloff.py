@@ -0,0 +1,81 @@
+    # coding=utf-8
+    # Кэш кривой затухания сжатия (splineStretch): кривая считывается один раз в массив значений по джоинтам
+    # и считывается заново, только когда артист меняет ее ключи. Степени сжатия выставляются из массива,
+    # поэтому сцене не нужно вычислять кривую на каждом кадре для каждого джоинта
+from sceneBackend import baseScene, getBackend
+
+    # Ширина графика предпросмотра в символах
+PREVIEW_WIDTH = 40
+
+    # Значения анимационной кривой curve в моменты times. Пока сцена сообщает об изменении ключей
+    # (SceneBackend.addAnimCurveEditedCallback), кривая не считывается повторно; без подписки
+    # значения считываются при каждом обновлении
+class FalloffSampler(object):
+    __slots__ = ("curve", "times", "samples", "applied", "dirty", "scene", "callbackId", "onChange")
+
+    def __init__(self, curve, times):
+        self.curve = curve
+        self.times = list(times)
+        self.samples = []
+        # Значения, отданные последним вызовом changes()
+        self.applied = []
+        self.dirty = True
+        self.scene = None
+        self.callbackId = None
+        self.onChange = None
+
+    # Подписывается на изменение ключей кривой в текущей сцене: после каждого изменения вызывается
+    # onChange(sampler). Возвращает False, если сцена не сообщает об изменениях
+    def watch(self, onChange = None):
+        self.onChange = onChange
+        if self.callbackId is None:
+            self.scene = baseScene(getBackend())
+            self.callbackId = self.scene.addAnimCurveEditedCallback(self.curvesEdited)
+        return self.callbackId is not None
+
+    def curvesEdited(self, curves):
+        if self.curve in curves:
+            self.dirty = True
+            if self.onChange is not None:
+                self.onChange(self)
+
+    # Сцена кривой: текущая сцена со всеми обертками, если подписка сделана в ней, иначе сцена подписки.
+    # Изменения ключей приходят в любой момент, в том числе когда текущей стала другая сцена
+    def backend(self):
+        backend = getBackend()
+        if self.scene is None or baseScene(backend) is self.scene:
+            return backend
+        return self.scene
+
+    # Значения кривой в моменты times. Кривая считывается заново, только если ее ключи изменились
+    def values(self):
+        if self.dirty:
+            self.samples = [float(x) for x in self.backend().evalAnimCurve(self.curve, self.times)]
+            self.dirty = self.callbackId is None
+        return list(self.samples)
+
+    # Значения, изменившиеся с прошлого вызова: [(индекс, значение)], при первом вызове - все
+    def changes(self):
+        samples = self.values()
+        changed = [(n, value) for n, value in enumerate(samples)
+                   if n >= len(self.applied) or self.applied[n] != value]
+        self.applied = samples
+        return changed
+
+    # Текстовый график значений: строка на момент времени, длина полосы пропорциональна значению
+    def preview(self, width = PREVIEW_WIDTH, labels = None):
+        values = self.values()
+        top = max([abs(x) for x in values] + [1e-9])
+        labels = labels or ["{:g}".format(t) for t in self.times]
+        pad = max([len(x) for x in labels] + [0])
+        lines = []
+        for label, value in zip(labels, values):
+            lines.append("{}  {:>8.3f}  {}".format(label.ljust(pad), value, "#" * int(round(abs(value) / top * width))))
+        return "\n".join(lines)
+
+    # Снимает подписку. Без нее об изменениях ключей не узнать, поэтому кривая считывается при следующем запросе
+    def release(self):
+        if self.callbackId is not None:
+            self.scene.removeCallback(self.callbackId)
+        self.scene = self.callbackId = self.onChange = None
+        self.dirty = True
@@ -0,0 +1,6 @@
+    # coding=utf-8
+    # Модули сетапа лежат в корне репозитория, тесты запускаются из любой папки: python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
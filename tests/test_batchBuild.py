@@ -0,0 +1,50 @@
+    # coding=utf-8
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from batchBuild import loadManifest, runBatch
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # Сборка в текущем процессе: неудачный ассет собирается повторно retries раз и не мешает остальным
+    def test_inProcessWithRetries(self):
+        assets = [{"name": "wolf", "type": "quadruped", "num": 7},
+                  {"name": "broken", "type": "centaur"},
+                  {"name": "hero", "num": 9, "squashMode": "compact"}]
+        report = runBatch(assets, self.folder, workers = 0, retries = 2, log = None)
+        results = dict((result["name"], result) for result in report["results"])
+        self.assertEqual([result["name"] for result in report["results"]], ["wolf", "broken", "hero"])
+        self.assertEqual(report["summary"]["built"], 2)
+        self.assertEqual(report["summary"]["failed"], 1)
+        self.assertEqual(results["broken"]["status"], "failed")
+        self.assertEqual(results["broken"]["attempts"], 3)
+        self.assertIn("Unknown rig type", results["broken"]["error"])
+        for name in ("wolf", "hero"):
+            self.assertEqual(results[name]["attempts"], 1)
+            self.assertTrue(os.path.isfile(results[name]["output"]))
+        self.assertEqual(results["hero"]["squashMode"], "compact")
+        self.assertEqual(sorted(os.listdir(self.folder)), ["hero.json", "wolf.json"])
+
+    def test_noRetries(self):
+        report = runBatch([{"name": "broken", "type": "centaur"}], self.folder, workers = 0, retries = 0, log = None)
+        self.assertEqual(report["results"][0]["attempts"], 1)
+
+    def test_duplicateNames(self):
+        path = os.path.join(self.folder, "manifest.json")
+        with open(path, "w") as output:
+            json.dump({"assets": [{"name": "wolf"}, {"name": "wolf"}]}, output)
+        self.assertRaises(ValueError, loadManifest, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+    # coding=utf-8
+import unittest
+
+import rigSetup
+from buildProfiler import BuildProfiler
+from memoryBackend import MemoryBackend
+from nameRegistry import NameRegistry, trackedNames
+from sceneBackend import RecordingBackend, WrapperBackend, useBackend
+from transformCache import cachedTransforms
+
+
+def recordedBuild(profile):
+    scene = RecordingBackend()
+    with useBackend(scene):
+        report = rigSetup.TorsoRig("biped").build(9, 4, profile = profile, squashMode = "compact")
+    return [(op.command, op.args) for op in scene.operations], report
+
+
+class ProfiledBuildTest(unittest.TestCase):
+
+    # Профайлер только считает вызовы: сцена получает те же операции, что и без него
+    def test_sameOperationsAsUnprofiled(self):
+        plain, report = recordedBuild(False)
+        profiled, report = recordedBuild(True)
+        self.assertEqual(plain, profiled)
+
+    # Кривая затухания считывается одним evalAnimCurve, а не keyframe на каждый джоинт
+    def test_curveSampledInBulk(self):
+        report = recordedBuild(True)[1]
+        self.assertEqual(report["calls"].get("evalAnimCurve"), 1)
+        self.assertLessEqual(report["calls"].get("keyframe", 0), 1)
+
+    # Запросы затухания из Python считывают кривую одним evalAnimCurve
+    def test_falloffQueriedInBulk(self):
+        with useBackend(MemoryBackend()):
+            rig = rigSetup.TorsoRig("biped")
+            rig.build(9, 4)
+            profiler = BuildProfiler()
+            with profiler.activate():
+                with profiler.stage("query"):
+                    rig.squashFalloff()
+                    rig.previewSquashFalloff()
+        self.assertEqual(profiler.stages[0].calls.get("evalAnimCurve"), 1)
+
+
+class WrapperBackendTest(unittest.TestCase):
+
+    # Расширенные методы и подписки проходят сквозь все обертки к самой сцене
+    def test_bulkMethodsReachScene(self):
+        scene = MemoryBackend()
+        registry = NameRegistry()
+        with useBackend(scene), trackedNames(registry), cachedTransforms():
+            profiler = BuildProfiler()
+            with profiler.activate():
+                with profiler.stage("chain"):
+                    from sceneBackend import getBackend
+                    backend = getBackend()
+                    joints = backend.createJointChain(["a", "b"], [(0, 0, 0), (0, 1, 0)])
+                    callbackId = backend.addNodeAddedCallback(lambda node: None)
+        self.assertIsNotNone(callbackId)
+        self.assertEqual(profiler.stages[0].calls, {"createJointChain": 1})
+        self.assertEqual(profiler.stages[0].nodesCreated, 2)
+        self.assertTrue(registry.isIssued(joints[1]))
+        chain = backend
+        while isinstance(chain, WrapperBackend):
+            chain = chain.inner
+        self.assertIs(chain, scene)
+
+
+if __name__ == "__main__":
+    unittest.main()
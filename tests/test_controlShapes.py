@@ -0,0 +1,40 @@
+    # coding=utf-8
+import unittest
+
+import rigMath
+from controlShapes import CIRCLE_CVS, ShapeTemplate, circleCvs, shapeTemplate
+from rigSetup import ControllerAgreementHandler
+
+
+class ShapeTemplateTest(unittest.TestCase):
+
+    # Шаблон строится один раз за сессию, масштабированные CV берутся из кэша копией
+    def test_cached(self):
+        library = ControllerAgreementHandler.CONTROL_LIB
+        template = shapeTemplate("square", library["square"])
+        self.assertIs(shapeTemplate("square", library["square"]), template)
+        points = template.points(2.0)
+        self.assertEqual(list(points[0]), [-2.0, 0.0, 2.0])
+        points.append(None)
+        self.assertEqual(len(template.points(2.0)), len(library["square"]["cvsList"]))
+        self.assertIn(2.0, template.scaled)
+
+    # У периодической кривой первые degree точек повторяются в конце
+    def test_periodic(self):
+        template = ShapeTemplate("ring", CIRCLE_CVS, 3, periodic = True)
+        points = template.points(0.5)
+        self.assertEqual(len(points), len(CIRCLE_CVS) + 3)
+        self.assertEqual(points[-3:], points[:3])
+        self.assertEqual(len(ShapeTemplate("line", CIRCLE_CVS, 1).points()), len(CIRCLE_CVS))
+
+    # Окружность лежит в плоскости, перпендикулярной нормали, и сохраняет радиус
+    def test_circleNormal(self):
+        for normal in ((1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0)):
+            unit = rigMath.vecNormalize(normal)
+            for cv, source in zip(circleCvs(normal), CIRCLE_CVS):
+                self.assertAlmostEqual(rigMath.vecDot(cv, unit), 0.0, places = 6)
+                self.assertAlmostEqual(rigMath.vecLength(cv), rigMath.vecLength(source), places = 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+    # coding=utf-8
+import unittest
+
+from graphAnalysis import DependencyGraph, analyzeGraph, graphFromScene
+from memoryBackend import MemoryBackend
+from rigSetup import TorsoRig
+from sceneBackend import useBackend
+
+
+class AnalyzeGraphTest(unittest.TestCase):
+
+    def test_cycle(self):
+        graph = DependencyGraph()
+        for name in ("a", "b", "c", "d"):
+            graph.addNode(name, "multiplyDivide")
+        graph.connect("a", "outputX", "b", "input1X")
+        graph.connect("b", "outputX", "c", "input1X")
+        graph.connect("c", "outputX", "a", "input1X")
+        graph.connect("c", "outputY", "d", "input1X")
+        report = analyzeGraph(graph)
+        self.assertEqual(report["cycles"], [["a", "b", "c"]])
+        self.assertEqual(report["hazardCounts"], {"cycle": 1})
+
+    # Связи-ссылки (message) не создают зависимостей и циклов
+    def test_referenceIsNotCycle(self):
+        graph = DependencyGraph()
+        graph.addNode("a", "transform")
+        graph.addNode("b", "network")
+        graph.connect("a", "translateX", "b", "input")
+        graph.connect("b", "message", "a", "link")
+        self.assertEqual(analyzeGraph(graph)["cycles"], [])
+
+    # frameCache системы сжатия perJoint читает кривую в других кадрах; компактная система без них
+    def test_frameCacheHazard(self):
+        timeShift = {}
+        for mode in ("perJoint", "compact"):
+            with useBackend(MemoryBackend()):
+                rig = TorsoRig("biped")
+                rig.build(7, 4, squashMode = mode)
+                report = analyzeGraph(graphFromScene([rig.rootGrp]))
+            self.assertEqual(report["cycles"], [])
+            timeShift[mode] = sorted(x["node"] for x in report["hazards"] if x["code"] == "timeShift")
+        self.assertEqual(timeShift["perJoint"], sorted(x + "_frameCache" for x in rig.joints[:-1]))
+        self.assertEqual(timeShift["compact"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
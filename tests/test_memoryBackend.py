@@ -0,0 +1,78 @@
+    # coding=utf-8
+import unittest
+
+import rigSetup
+from memoryBackend import MemoryBackend
+from sceneBackend import useBackend
+
+
+def assertVectorsEqual(test, actual, expected, places = 6):
+    test.assertEqual(len(actual), len(expected))
+    for a, e in zip(actual, expected):
+        test.assertAlmostEqual(a, e, places = places)
+
+
+class PivotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = MemoryBackend()
+        self.node = self.scene.createNode("transform", name = "pivoted")
+
+    def worldTranslation(self):
+        return self.scene.xform(self.node, query = True, matrix = True, worldSpace = True)[12:15]
+
+    def test_rotateAroundRotatePivot(self):
+        self.scene.setAttr(self.node + ".rotatePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".rotateZ", 90)
+        # Начало координат поворачивается вокруг (0, 10, 0): (0, -10, 0)·Rz(90) + (0, 10, 0)
+        assertVectorsEqual(self, self.worldTranslation(), (10.0, 10.0, 0.0))
+        assertVectorsEqual(self, self.scene.xform(self.node, query = True, rotatePivot = True, worldSpace = True),
+                           (0.0, 10.0, 0.0))
+
+    def test_scaleAroundScalePivot(self):
+        self.scene.setAttr(self.node + ".scalePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".scale", 2, 2, 2)
+        self.scene.setAttr(self.node + ".translate", 1, 0, 0)
+        assertVectorsEqual(self, self.worldTranslation(), (1.0, -10.0, 0.0))
+
+    def test_parentedPivot(self):
+        parent = self.scene.createNode("transform", name = "parent")
+        self.scene.setAttr(parent + ".translate", 0, 5, 0)
+        self.scene.parent(self.node, parent, relative = True)
+        self.scene.setAttr(self.node + ".rotatePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".scalePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".rotateX", 90)
+        # Точка (0, 0, 1) объекта: (0, -10, 1)·Rx(90) + (0, 10, 0) + (0, 5, 0)
+        world = self.scene.xform(self.node, query = True, matrix = True, worldSpace = True)
+        point = [sum(p * world[row * 4 + col] for row, p in enumerate((0.0, 0.0, 1.0, 1.0))) for col in range(3)]
+        assertVectorsEqual(self, point, (0.0, 14.0, -10.0))
+
+    def test_setWorldMatrixKeepsPivot(self):
+        self.scene.setAttr(self.node + ".rotatePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".scalePivot", 0, 10, 0)
+        self.scene.setAttr(self.node + ".rotateZ", 90)
+        matrix = self.scene.xform(self.node, query = True, matrix = True, worldSpace = True)
+        self.scene.xform(self.node, worldSpace = True, matrix = matrix)
+        assertVectorsEqual(self, self.scene.getAttr(self.node + ".translate")[0], (0.0, 0.0, 0.0))
+        assertVectorsEqual(self, self.scene.getAttr(self.node + ".rotate")[0], (0.0, 0.0, 90.0))
+
+
+class ControlPivotTest(unittest.TestCase):
+
+    # Контроллеры заморожены в позиции джоинтов, поэтому поворот контроллера вращает джоинт вокруг себя
+    def test_rotatedControlKeepsJointInPlace(self):
+        scene = MemoryBackend()
+        rig = rigSetup.TorsoRig("biped")
+        with useBackend(scene):
+            rig.build(5, 4)
+            hip = rig.ikControls[0]
+            rest = scene.xform(hip.driven, query = True, translation = True, worldSpace = True)
+            scene.setAttr(hip.controlName + ".rotateX", 30)
+            assertVectorsEqual(self, scene.xform(hip.driven, query = True, translation = True, worldSpace = True),
+                               rest)
+            assertVectorsEqual(self, scene.xform(rig.bodyCtrl.controlName, query = True, rotatePivot = True,
+                                                 worldSpace = True), (0.0, 90.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
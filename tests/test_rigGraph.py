@@ -0,0 +1,104 @@
+    # coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+import rigGraph
+from memoryBackend import MemoryBackend
+from rigGraph import RigGraph, loadGraph
+from rigReconcile import RigState, diffStates, reconcileRig
+from rigSetup import TorsoRig
+from sceneBackend import cmds, useBackend
+
+
+class OpenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # Файл, который не удалось открыть как граф, не остается открытым
+    def assertRejected(self, data):
+        path = os.path.join(self.folder, "broken.rgrf")
+        with open(path, "wb") as output:
+            output.write(data)
+        opened = []
+
+        def tracked(*args):
+            opened.append(open(*args))
+            return opened[-1]
+        rigGraph.open = tracked
+        try:
+            self.assertRaises(ValueError, RigGraph, path)
+        finally:
+            del rigGraph.open
+        self.assertEqual([x.closed for x in opened], [True])
+
+    def test_empty(self):
+        self.assertRejected(b"")
+
+    def test_truncated(self):
+        self.assertRejected(b"RG")
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    # Собирает сетап, сохраняет его и загружает в новую сцену. Возвращает исходный риг и риг копии
+    def exportAndLoad(self, scene, rigType = "biped", **kwargs):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig(rigType)
+            rig.build(7, 4, **kwargs)
+            rig.export(self.path("built.rgrf"))
+        with useBackend(scene):
+            return rig, rig.cloneState(loadGraph(self.path("built.rgrf")))
+
+    # Загруженная копия сохраняется в граф, совпадающий с исходным, и совпадает со сборкой по ее настройкам
+    def assertRoundTrip(self, rigType, **kwargs):
+        scene = MemoryBackend()
+        rig, clone = self.exportAndLoad(scene, rigType, **kwargs)
+        with useBackend(scene):
+            clone.export(self.path("loaded.rgrf"))
+            reconciled = reconcileRig(clone, apply = False)
+        with RigGraph(self.path("built.rgrf")) as built, RigGraph(self.path("loaded.rgrf")) as loaded:
+            self.assertEqual(built.summary(), loaded.summary())
+            patch = diffStates(RigState(built), RigState(loaded))
+        self.assertTrue(patch.isEmpty(), patch.summary())
+        self.assertTrue(reconciled.isEmpty(), reconciled.summary())
+
+    def test_biped(self):
+        self.assertRoundTrip("biped")
+
+    def test_quadruped(self):
+        self.assertRoundTrip("quadruped", squashMode = "compact")
+
+    def test_segments(self):
+        self.assertRoundTrip("biped", ikSegments = 2, midDrivers = 1, controlDrive = "matrix",
+                             skinWeights = "analytic")
+
+    # В загруженной сцене степени компактной системы сжатия по-прежнему следуют за кривой splineStretch
+    def test_compactFalloffAfterLoad(self):
+        scene = MemoryBackend()
+        rig, clone = self.exportAndLoad(scene, squashMode = "compact")
+        with useBackend(scene):
+            cmds.setKeyframe(clone.ikControls[1].controlName, time = 2, value = 3.0, attribute = "splineStretch")
+            exponents = [cmds.getAttr("{}.exponent{}".format(clone.squashNodes[0], x))
+                         for x in range(1, len(clone.joints))]
+            falloff = [x[1] for x in clone.squashFalloff()]
+        self.assertEqual(exponents[:2], [1.0, 3.0])
+        self.assertEqual(falloff, exponents)
+
+
+if __name__ == "__main__":
+    unittest.main()
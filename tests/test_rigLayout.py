@@ -0,0 +1,66 @@
+    # coding=utf-8
+import unittest
+
+import rigMath
+from memoryBackend import MemoryBackend
+from rigLayout import RigLayout
+from rigSetup import TorsoRig
+from sceneBackend import cmds, useBackend
+
+
+    # Определитель 3x3 части матрицы: 1 - правая система координат
+def determinant(matrix):
+    a, b, c = matrix[0:3], matrix[4:7], matrix[8:11]
+    return (a[0] * (b[1] * c[2] - b[2] * c[1]) - a[1] * (b[0] * c[2] - b[2] * c[0]) +
+            a[2] * (b[0] * c[1] - b[1] * c[0]))
+
+
+class MirrorFramesTest(unittest.TestCase):
+
+    def assertMatrixEqual(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(first, second):
+            self.assertAlmostEqual(a, b, places = 6)
+
+    # Кадр левой стороны смещается в осях опорного кадра, правый - его отражение по оси X
+    def test_leftAndRight(self):
+        up = rigMath.eulerToMatrix((0.0, 0.0, 90.0), 0)
+        layout = RigLayout(([(0.0, 0.0, 0.0), (0.0, 10.0, 0.0)], [up, up]),
+                           attachments = (("arm", "neckRoot", (1.0, 2.0, 3.0)),))
+        self.assertEqual(sorted(layout.frames), ["L_arm", "R_arm"])
+        left = layout.frame("arm", "left")
+        right = layout.frame("arm", "right")
+        self.assertMatrixEqual(left[12:15], rigMath.vecAdd((0.0, 10.0, 0.0), rigMath.transformPoint((1.0, 2.0, 3.0), up)))
+        self.assertMatrixEqual(right[12:15], (-left[12], left[13], left[14]))
+        self.assertAlmostEqual(determinant(left), 1.0, places = 6)
+        self.assertAlmostEqual(determinant(right), 1.0, places = 6)
+        # Ось X кадра отражается и разворачивается: направление вдоль оси отражения сохраняется
+        self.assertMatrixEqual(right[0:3], (left[0], -left[1], -left[2]))
+        self.assertEqual(layout.side("right"), {"arm": right})
+
+    def test_unknownAnchor(self):
+        self.assertRaises(ValueError, RigLayout, ([(0.0, 0.0, 0.0)], [rigMath.identityMatrix()]),
+                          attachments = (("tail", "chest", (0.0, 0.0, 0.0)),))
+
+    # Кадры крепления собранного рига совпадают с джоинтами в сцене (основание шеи - в ориентации последнего
+    # джоинта спины), правая сторона - отражение левой
+    def test_builtRig(self):
+        for rigType in ("biped", "quadruped"):
+            with useBackend(MemoryBackend()):
+                rig = TorsoRig(rigType)
+                rig.build(7, 4)
+                neckRoot = cmds.xform(rig.joints[-1], query = True, matrix = True, worldSpace = True)
+                neckRoot[12:15] = rig.getNeckRootPosition()
+                hip = cmds.xform(rig.joints[0], query = True, matrix = True, worldSpace = True)
+            anchors = {"neckRoot": neckRoot, "hip": hip}
+            for base, anchor, offset in rig.ATTACHMENTS[rigType]:
+                left = rig.getAttachmentFrame(base, "left")
+                right = rig.getAttachmentFrame(base, "right")
+                frame = anchors[anchor]
+                self.assertMatrixEqual(left[0:12], frame[0:12])
+                self.assertMatrixEqual(left[12:15], rigMath.transformPoint(offset, frame))
+                self.assertMatrixEqual(right[12:15], (-left[12], left[13], left[14]))
+
+
+if __name__ == "__main__":
+    unittest.main()
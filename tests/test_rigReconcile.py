@@ -0,0 +1,44 @@
+    # coding=utf-8
+import unittest
+
+from memoryBackend import MemoryBackend
+from rigReconcile import reconcileRig
+from rigSetup import TorsoRig
+from sceneBackend import useBackend
+
+
+class BuiltRigTest(unittest.TestCase):
+
+    # Только что собранный сетап совпадает с графом, который собрали бы его настройки
+    def assertReconciled(self, rigType, **kwargs):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig(rigType)
+            rig.build(7, 4, **kwargs)
+            patch = reconcileRig(rig, apply = False)
+        self.assertTrue(patch.isEmpty(), patch.summary())
+
+    def test_biped(self):
+        self.assertReconciled("biped")
+
+    def test_quadruped(self):
+        self.assertReconciled("quadruped")
+
+    def test_segments(self):
+        self.assertReconciled("biped", ikSegments = 2)
+
+    # Позиции направляющих берутся по именам "neckRoot" и "hip", а не по порядку ключей словаря
+    def test_locatorsKeepBases(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("quadruped")
+            rig.build(7, 4)
+        self.assertEqual(rig.LOCATORS, {"neckRoot": [0, 30, 30], "hip": [0, 30, -30]})
+        self.assertEqual(rig.locatorNodes, {})
+
+    # Несобранный риг без явного корня сравнивать не с чем
+    def test_unbuiltRig(self):
+        with useBackend(MemoryBackend()):
+            self.assertRaises(ValueError, reconcileRig, TorsoRig("biped"), num = 7, fkNum = 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
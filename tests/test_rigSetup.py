@@ -0,0 +1,319 @@
+    # coding=utf-8
+import unittest
+
+import rigMath
+from buildProfiler import BuildProfiler
+from memoryBackend import MemoryBackend
+from rigSetup import NamingAgreementHandler, TorsoRig, lockAttributes, retargetRigs, setLimitedKeyability
+from sceneBackend import cmds, getBackend, useBackend
+
+
+    # Результат сборки в мировых координатах: матрицы джоинтов, пивоты контроллеров и CV кривых.
+    # Служебные значения, которые в Maya пересчитывает решатель (положение ikHandle), не сравниваются
+def worldState(rig):
+    state = {}
+    for joint in rig.joints + rig.bindJoints + rig.fkJoints:
+        state[joint] = cmds.xform(joint, query = True, matrix = True, worldSpace = True)
+    controls = rig.ikControls + [rig.bodyCtrl]
+    for control in controls:
+        for node in (control.controlName, control.lastNode):
+            state[node + ".rotatePivot"] = cmds.xform(node, query = True, rotatePivot = True, worldSpace = True)
+    curves = rig.fkJoints + [x.controlName for x in controls] + [x.ikSystemObjs[2] for x in rig.splineSegments()]
+    for node in curves:
+        world = cmds.xform(node, query = True, matrix = True, worldSpace = True)
+        for shape in cmds.listRelatives(node, shapes = True) or []:
+            if not cmds.getAttr("{}.intermediateObject".format(shape)):
+                state[shape] = [x for cv in cmds.getAttr("{}.cv[*]".format(shape))
+                                for x in rigMath.transformPoint(cv, world)]
+    return state
+
+
+class UpdateTest(unittest.TestCase):
+
+    # update() с новыми направляющими дает тот же сетап, что и сборка с ними с нуля
+    def assertMatchesFreshBuild(self, rigType, neckRoot = None, hip = None, **kwargs):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig(rigType)
+            rig.build(7, 4, **kwargs)
+            rig.update(neckRoot = neckRoot, hip = hip)
+            updated = worldState(rig)
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig(rigType)
+            for base, position in (("neckRoot", neckRoot), ("hip", hip)):
+                if position is not None:
+                    rig.LOCATORS[base] = list(position)
+            rig.build(7, 4, **kwargs)
+            fresh = worldState(rig)
+        self.assertEqual(sorted(updated), sorted(fresh))
+        for name, values in sorted(fresh.items()):
+            for a, b in zip(updated[name], values):
+                self.assertAlmostEqual(a, b, places = 6, msg = name)
+
+    def test_hip(self):
+        self.assertMatchesFreshBuild("biped", hip = (0, 95, -3))
+
+    def test_neckRoot(self):
+        self.assertMatchesFreshBuild("quadruped", neckRoot = (0, 35, 40))
+
+    def test_segmentsMatrixDrive(self):
+        self.assertMatchesFreshBuild("biped", neckRoot = (2, 140, 9), hip = (3, 80, 0), ikSegments = 2,
+                                     controlDrive = "matrix")
+
+    def test_midDrivers(self):
+        self.assertMatchesFreshBuild("biped", hip = (0, 95, -3), midDrivers = 1, skinWeights = "analytic")
+
+    # Контроллер торса переносится на месте вслед за бедрами
+    def test_bodyControlUpdated(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("biped")
+            rig.build(7, 4)
+            self.assertIn("createBodyControl", rig.update(hip = (0, 95, -3)))
+            pivot = cmds.xform(rig.bodyCtrl.controlName, query = True, rotatePivot = True, worldSpace = True)
+        for a, b in zip(pivot, (0.0, 95.0, -3.0)):
+            self.assertAlmostEqual(a, b, places = 6)
+
+
+class MidDriverTest(unittest.TestCase):
+
+    # Промежуточный джоинт кривой входит в скин при сборке, а аналитические веса делят каждую CV
+    # между двумя соседними джоинтами кривой
+    def test_analyticWeights(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("biped")
+            rig.build(9, 4, skinWeights = "analytic", midDrivers = 1)
+            influences = cmds.skinCluster(rig.skinCluster, query = True, influence = True)
+            weights = cmds.getSkinWeights(rig.skinCluster)[2]
+        self.assertEqual(influences, ["AFrig_hip_J", "AFrig_spine_mid1_J", "AFrig_shldr_J"])
+        self.assertEqual([x.controlName for x in rig.ikControls][2:], ["AFrig_spine_mid1_ctrl"])
+        self.assertEqual(weights[0], [1.0, 0.0, 0.0])
+        self.assertEqual(weights[-1], [0.0, 0.0, 1.0])
+        self.assertIn([0.0, 1.0, 0.0], weights)
+        for row in weights:
+            self.assertAlmostEqual(sum(row), 1.0, places = 6)
+            self.assertLessEqual(len([x for x in row if x > 0.0]), 2)
+
+
+    # Степени сжатия джоинтов спины: входы multiplyDivide, которые выдают масштаб джоинтов
+def squashExponents(joints):
+    plugs = [cmds.listConnections("{}.scaleY".format(x), source = True, destination = False, plugs = True)[0]
+             for x in joints[:-1]]
+    return [cmds.getAttr(x.replace(".output", ".input2")) for x in plugs]
+
+
+class SquashFalloffTest(unittest.TestCase):
+
+    # Правка ключей кривой после release() рига доходит до нод сжатия
+    def test_followsCurveAfterRelease(self):
+        for mode in ("perJoint", "compact"):
+            with useBackend(MemoryBackend()):
+                rig = TorsoRig("biped")
+                rig.build(9, 4, squashMode = mode)
+                control = rig.ikControls[1].controlName
+                joints = list(rig.joints)
+                falloff = [x[1] for x in rig.squashFalloff()]
+                rig.release()
+                cmds.setKeyframe(control, time = 3, value = 2.0, attribute = "splineStretch")
+                exponents = squashExponents(joints)
+            self.assertEqual(falloff, [1.0] * (len(joints) - 1))
+            self.assertEqual(exponents, [1.0, 1.5, 2.0, 1.75, 1.5, 1.25, 1.0])
+
+    # В компактном режиме кривая считывается один раз на сетап, а не на каждый джоинт: с ростом числа джоинтов
+    # добавляются только каналы multiplyDivide, по ноде на три джоинта
+    def test_compactNodeCount(self):
+        counts = []
+        for num in (7, 16, 31):
+            with useBackend(MemoryBackend()):
+                rig = TorsoRig("biped")
+                rig.build(num, 4, squashMode = "compact")
+                types = [cmds.nodeType(x) for x in rig.squashNodes]
+            self.assertEqual(types.count("multiplyDivide"), (len(rig.joints) + 1) // 3)
+            counts.append(len(types) - types.count("multiplyDivide"))
+        self.assertEqual(counts, [1, 1, 1])
+
+    # На кадре компактная система не вычисляет кривую, после правки ключей она считывается один раз
+    def test_compactFrameEvaluations(self):
+        scene = MemoryBackend()
+        with useBackend(scene):
+            rig = TorsoRig("biped")
+            rig.build(16, 4, squashMode = "compact")
+            evaluations = scene.curveEvaluations
+            for frame in range(1, 5):
+                scene.currentTime(frame)
+                squashExponents(rig.joints)
+            self.assertEqual(scene.curveEvaluations, evaluations)
+            cmds.setKeyframe(rig.ikControls[1].controlName, time = 3, value = 2.0, attribute = "splineStretch")
+            self.assertEqual(scene.curveEvaluations, evaluations + len(rig.joints) - 1)
+
+    # Кэш кривой для запросов из Python замечает правку ключей
+    def test_queryFollowsCurve(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("biped")
+            rig.build(9, 4, squashMode = "compact")
+            cmds.setKeyframe(rig.ikControls[1].controlName, time = 3, value = 2.0, attribute = "splineStretch")
+            falloff = rig.squashFalloff()
+        self.assertEqual(falloff[2], (rig.joints[2], 2.0))
+
+
+class BudgetTest(unittest.TestCase):
+
+    def write(self, text):
+        self.lines.append(text)
+
+    def fit(self, nodes):
+        self.lines = []
+        rig = TorsoRig("biped")
+        fkNum = rig.fitBudget({"nodes": nodes}, 9, 4, log = self)[0]
+        return rig.SQUASH_MODE, fkNum, "".join(self.lines)
+
+    # Настройки, измененные ради бюджета, сообщаются в лог
+    def test_changesLogged(self):
+        squashMode, fkNum, log = self.fit(45)
+        self.assertEqual((squashMode, fkNum), ("compact", 3))
+        self.assertIn("squash mode changed from perJoint to compact", log)
+        self.assertIn("FK joints reduced from 4 to 3", log)
+
+    def test_nothingLoggedWhenFits(self):
+        self.assertEqual(self.fit(100), ("perJoint", 4, ""))
+
+
+class BuildStepsTest(unittest.TestCase):
+
+    # Прерванная сборка удаляет только свои ноды: нода, созданная между этапами, остается в сцене
+    def test_cancelKeepsOtherNodes(self):
+        scene = MemoryBackend()
+        with useBackend(scene):
+            before = set(cmds.ls())
+            rig = TorsoRig("biped")
+            steps = rig.buildSteps(7, 4)
+            for n in range(6):
+                next(steps)
+            other = cmds.createNode("transform", name = "artist_grp")
+            next(steps)
+            steps.close()
+            self.assertIs(getBackend(), scene)
+            self.assertEqual(set(cmds.ls()), before | set([other]))
+        self.assertEqual(rig.joints, [])
+
+    # Две пошаговые сборки, которые ведутся поочередно, дают те же сетапы, что и сборки подряд,
+    # а между этапами и после сборок текущей остается сама сцена
+    def test_alternatingBuilds(self):
+        def positions(rig):
+            return [cmds.xform(x, query = True, matrix = True, worldSpace = True) for x in rig.joints + rig.fkJoints]
+
+        scene = MemoryBackend()
+        with useBackend(scene):
+            rigs = [TorsoRig("biped"), TorsoRig("quadruped")]
+            steps = [rig.buildSteps(7, 4) for rig in rigs]
+            for progress in zip(*steps):
+                self.assertIs(getBackend(), scene)
+            self.assertEqual([list(x) for x in steps], [[], []])
+            self.assertIs(getBackend(), scene)
+            alternating = [positions(rig) for rig in rigs]
+        sequential = []
+        for rigType in ("biped", "quadruped"):
+            with useBackend(MemoryBackend()):
+                rig = TorsoRig(rigType)
+                rig.build(7, 4)
+                sequential.append(positions(rig))
+        self.assertEqual(alternating, sequential)
+
+
+class RetargetTest(unittest.TestCase):
+
+    # Положения и исходная длина кривой, по порядку нод рига, а не по именам: у копий шаблона имена
+    # получают номера
+    def placement(self, rig):
+        nodes = rig.joints + rig.bindJoints + rig.fkJoints
+        pivots = [x.controlName for x in rig.ikControls + [rig.bodyCtrl]]
+        return ([cmds.xform(x, query = True, matrix = True, worldSpace = True) for x in nodes] +
+                [cmds.xform(x, query = True, rotatePivot = True, worldSpace = True) for x in pivots] +
+                [[cmds.getAttr("{}.input2X".format(rig.baseStretch))]])
+
+    # Сетап, полученный из шаблона, совпадает со сборкой с нуля с теми же направляющими
+    def test_matchesFreshBuild(self):
+        specs = [{"neckRoot": [0, 150, 6], "hip": [0, 90, -2], "guides": [[0, 120, 9]]},
+                 {"neckRoot": [1, 135, 2], "hip": [0, 80, 1]}]
+        for kwargs in ({}, {"squashMode": "compact", "ikSegments": 2, "controlDrive": "matrix"}):
+            with useBackend(MemoryBackend()):
+                template = TorsoRig("biped")
+                template.build(9, 4, **kwargs)
+                retargeted = retargetRigs(template, specs, self.placement)
+            for spec, placement in zip(specs, retargeted):
+                with useBackend(MemoryBackend()):
+                    rig = TorsoRig("biped")
+                    rig.LOCATORS["neckRoot"] = spec["neckRoot"]
+                    rig.LOCATORS["hip"] = spec["hip"]
+                    rig.GUIDES = spec.get("guides", [])
+                    rig.build(9, 4, **kwargs)
+                    fresh = self.placement(rig)
+                self.assertEqual(len(placement), len(fresh))
+                for a, b in zip(placement, fresh):
+                    for x, y in zip(a, b):
+                        self.assertAlmostEqual(x, y, places = 6)
+
+
+class LockingTest(unittest.TestCase):
+
+    # Повторяющиеся аттрибуты разных вызовов уходят в сцену одним setAttrStates, уже заблокированные не меняются
+    def test_singleCall(self):
+        with useBackend(MemoryBackend()):
+            node = cmds.createNode("transform", name = "locked_grp")
+            profiler = BuildProfiler()
+            with profiler.activate():
+                with profiler.stage("lock"):
+                    changed = lockAttributes([(node, ("tx", "ty")), (node, ("tx", "vis"))])
+                    unchanged = lockAttributes({node: ("tx", "vis")})
+                    setLimitedKeyability(node, ("ty",))
+            states = [(cmds.getAttr("{}.{}".format(node, x), lock = True), cmds.getAttr("{}.{}".format(node, x), keyable = True))
+                      for x in ("tx", "ty", "v", "tz")]
+        self.assertEqual(profiler.stages[0].calls, {"setAttrStates": 3})
+        self.assertEqual((changed, unchanged), (6, 0))
+        self.assertEqual(states, [(True, False), (True, False), (True, False), (False, True)])
+
+    # Блокировки сетапа и раскладка по слоям выполняются одним вызовом на этап
+    def test_buildStages(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("biped")
+            stages = dict((x["name"], x["calls"]) for x in rig.build(7, 4, profile = True)["stages"])
+            members = cmds.listConnections("{}.drawInfo".format(rig.fkLayer))
+            locked = cmds.getAttr("{}.tx".format(rig.fkJoints[1]), lock = True)
+        self.assertEqual(stages["cleanKAttr"].get("setAttrStates"), 1)
+        self.assertEqual(stages["setLayers"].get("assignDisplayLayers"), 1)
+        self.assertNotIn("editDisplayLayerMembers", stages["setLayers"])
+        self.assertEqual(members, rig.fkJoints)
+        self.assertTrue(locked)
+
+
+class NamingTest(unittest.TestCase):
+
+    def test_name(self):
+        name = NamingAgreementHandler(side = "left", base = "arm", suffix = "J")
+        self.assertEqual((name.assetName, name.side, name.suffix, name.nodeName), ("AFrig_", "L_", "_J", "AFrig_L_arm_J"))
+
+    # Поля можно поменять и собрать имя заново теми же методами, что и до шаблонов
+    def test_resolveAgain(self):
+        name = NamingAgreementHandler(base = "arm")
+        name.assetName, name.side, name.suffix = "wolf", "Right", "ctrl"
+        name.resolveSide()
+        name.resolveAssetName()
+        name.resolveSuffix()
+        name.createName()
+        self.assertEqual(name.nodeName, "wolf_R_arm_ctrl")
+
+
+class RigTypeTest(unittest.TestCase):
+
+    def test_unknownType(self):
+        self.assertRaises(ValueError, TorsoRig, "other")
+
+    # Неизвестный тип при обновлении не затрагивает собранный сетап
+    def test_unknownTypeOnUpdate(self):
+        with useBackend(MemoryBackend()):
+            rig = TorsoRig("biped")
+            rig.build(7, 4)
+            self.assertRaises(ValueError, rig.update, type = "other")
+        self.assertEqual(rig.rigType, "biped")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+    # coding=utf-8
+import unittest
+
+from memoryBackend import MemoryBackend
+from rigSetup import TorsoRig
+from sceneBackend import undoChunk, useBackend
+
+
+    # Сцена в памяти с очередью отмены, как интерактивная сессия Maya: запоминает открытые блоки отмены
+    # и режим, в котором выполнялись изменения
+class UndoScene(MemoryBackend):
+
+    def __init__(self, undoState = True, batch = False):
+        MemoryBackend.__init__(self)
+        self.undoState = undoState
+        self.batch = batch
+        self.chunks = []
+        self.undoableCalls = set()
+
+    def undoInfo(self, *args, **kwargs):
+        if kwargs.get("query"):
+            return self.undoState
+        self.chunks.append(kwargs.get("chunkName", "close"))
+
+    def about(self, *args, **kwargs):
+        return self.batch
+
+    def setAttr(self, *args, **kwargs):
+        self.undoableCalls.add(self.undoable)
+        return MemoryBackend.setAttr(self, *args, **kwargs)
+
+
+class UndoChunkTest(unittest.TestCase):
+
+    def build(self, scene, **kwargs):
+        with useBackend(scene):
+            TorsoRig("biped").build(5, 4, **kwargs)
+        return scene
+
+    # По умолчанию сборка идет без блока отмены, с быстрыми путями сцены
+    def test_buildWithoutChunk(self):
+        scene = self.build(UndoScene())
+        self.assertEqual(scene.chunks, [])
+        self.assertEqual(scene.undoableCalls, set([False]))
+
+    def test_interactiveBuild(self):
+        scene = self.build(UndoScene(), undoable = True)
+        self.assertEqual(scene.chunks, ["TorsoRig", "close"])
+        self.assertEqual(scene.undoableCalls, set([True]))
+        self.assertFalse(scene.undoable)
+
+    # Пошаговая сборка - блок отмены на каждый этап: действия между этапами в блоки не попадают
+    def test_stepChunks(self):
+        scene = UndoScene()
+        with useBackend(scene):
+            rig = TorsoRig("biped")
+            for progress in rig.buildSteps(5, 4, undoable = True):
+                self.assertEqual(scene.chunks[-1], "close")
+                self.assertFalse(scene.undoable)
+        self.assertEqual(scene.chunks, ["TorsoRig", "close"] * len(rig.BUILD_STAGES))
+
+    def test_undoDisabled(self):
+        scene = self.build(UndoScene(undoState = False), undoable = True)
+        self.assertEqual(scene.chunks, [])
+        self.assertEqual(scene.undoableCalls, set([False]))
+
+    def test_batchSession(self):
+        scene = self.build(UndoScene(batch = True), undoable = True)
+        self.assertEqual(scene.chunks, [])
+
+    def test_disabledChunk(self):
+        scene = UndoScene()
+        with useBackend(scene), undoChunk("test", enabled = False):
+            self.assertFalse(scene.undoable)
+        self.assertEqual(scene.chunks, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
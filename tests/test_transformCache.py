@@ -0,0 +1,70 @@
+    # coding=utf-8
+import unittest
+
+from memoryBackend import MemoryBackend
+from sceneBackend import cmds, getBackend, useBackend
+from transformCache import TransformCacheBackend, cachedTransforms
+
+
+    # Мировая позиция node
+def position(node):
+    return cmds.xform(node, query = True, translation = True, worldSpace = True)
+
+
+class TransformCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = MemoryBackend()
+        with useBackend(self.scene):
+            self.parent = cmds.createNode("transform", name = "parent_grp")
+            self.child = cmds.createNode("transform", name = "child_grp", parent = self.parent)
+            cmds.setAttr("{}.translate".format(self.child), 1.0, 0.0, 0.0)
+
+    def test_repeatedQueryHits(self):
+        with useBackend(self.scene), cachedTransforms() as cache:
+            position(self.child)
+            position(self.child)
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+
+    # Перенос родителя через xform сдвигает потомка: кэш сбрасывается
+    def test_xformInvalidates(self):
+        with useBackend(self.scene), cachedTransforms() as cache:
+            self.assertEqual(position(self.child), [1.0, 0.0, 0.0])
+            cmds.xform(self.parent, translation = (0.0, 5.0, 0.0), worldSpace = True)
+            self.assertEqual(position(self.child), [1.0, 5.0, 0.0])
+        self.assertEqual(cache.misses, 2)
+
+    def test_parentInvalidates(self):
+        with useBackend(self.scene), cachedTransforms():
+            other = cmds.createNode("transform", name = "other_grp")
+            cmds.setAttr("{}.translate".format(other), 0.0, 0.0, 3.0)
+            self.assertEqual(position(self.child), [1.0, 0.0, 0.0])
+            cmds.parent(self.child, other, relative = True)
+            self.assertEqual(position(self.child), [1.0, 0.0, 3.0])
+
+    def test_setAttrInvalidates(self):
+        with useBackend(self.scene), cachedTransforms():
+            self.assertEqual(position(self.child), [1.0, 0.0, 0.0])
+            cmds.setAttr("{}.translateY".format(self.parent), 2.0)
+            self.assertEqual(position(self.child), [1.0, 2.0, 0.0])
+
+    # Блокировка атрибута положение не меняет, кэш сохраняется
+    def test_lockKeepsCache(self):
+        with useBackend(self.scene), cachedTransforms() as cache:
+            position(self.child)
+            cmds.setAttr("{}.translateX".format(self.child), lock = True)
+            position(self.child)
+        self.assertEqual(cache.hits, 1)
+
+    # Вложенный вызов использует уже включенный кэш, после выхода сцена снова без обертки
+    def test_nested(self):
+        with useBackend(self.scene), cachedTransforms() as cache:
+            with cachedTransforms() as nested:
+                self.assertIs(nested, cache)
+            self.assertIsInstance(getBackend(), TransformCacheBackend)
+        with useBackend(self.scene):
+            self.assertIs(getBackend(), self.scene)
+
+
+if __name__ == "__main__":
+    unittest.main()
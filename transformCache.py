@@ -0,0 +1,97 @@
+    # coding=utf-8
+import contextlib
+
+from sceneBackend import QUERY_COMMANDS, WrapperBackend, getBackend, useBackend
+
+    # Флаги xform, значения которых в мировом пространстве кэшируются
+CACHED_XFORM_FLAGS = (("translation", "t"), ("matrix", "m"), ("rotatePivot", "rp"), ("rotation", "ro"))
+
+    # Атрибуты, изменение которых сдвигает трансформы (и всех потомков)
+TRANSFORM_ATTRS = ("translate", "rotate", "scale", "jointOrient", "rotatePivot", "scalePivot", "rotateAxis",
+                   "shear", "inheritsTransform", "offsetParentMatrix")
+SHORT_TRANSFORM_ATTRS = ("t", "tx", "ty", "tz", "r", "rx", "ry", "rz", "s", "sx", "sy", "sz", "jo", "jox", "joy",
+                         "joz", "ro", "rp", "sp", "ra", "sh", "it", "opm")
+
+    # Команды, которые создают новые ноды или меняют не трансформы и не сбрасывают кэш
+SAFE_COMMANDS = ("createNode", "spaceLocator", "curve", "circle", "addAttr", "aliasAttr", "select",
+                 "createDisplayLayer", "editDisplayLayerMembers", "setKeyframe", "arclen", "createJointChain",
+                 "addCurveShapes", "setAttrStates", "assignDisplayLayers",
+                 "getSkinWeights", "setSkinWeights")
+
+    # Изменяет ли атрибут положение трансформа
+def affectsTransform(plug):
+    attr = str(plug).split(".", 1)[-1].split("[")[0]
+    return attr.startswith(TRANSFORM_ATTRS) or attr in SHORT_TRANSFORM_ATTRS
+
+    # Сцена-обертка на время сборки: запоминает мировые матрицы, позиции и пивоты из запросов xform
+    # и сбрасывает их, когда сборка перемещает, перепривязывает или замораживает ноды.
+    # Кэш сбрасывается целиком, так как смещение родителя меняет положение всех потомков
+class TransformCacheBackend(WrapperBackend):
+
+    def __init__(self, inner):
+        WrapperBackend.__init__(self, inner)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def wrap(self, command, func):
+
+        def forwarded(*args, **kwargs):
+            if self.invalidates(command, args, kwargs):
+                self.cache.clear()
+            return func(*args, **kwargs)
+
+        return forwarded
+
+    # Сбрасывает ли команда кэш
+    def invalidates(self, command, args, kwargs):
+        if command in QUERY_COMMANDS or command in SAFE_COMMANDS or kwargs.get("query") or kwargs.get("q"):
+            return False
+        if command == "setAttr":
+            # Блокировка и видимость в channel box значения не меняют
+            return len(args) > 1 and affectsTransform(args[0])
+        if command == "connectAttr":
+            return affectsTransform(args[1])
+        return True
+
+    def xform(self, obj, **kwargs):
+        if not (kwargs.get("query") or kwargs.get("q")):
+            self.cache.clear()
+            return self.inner.xform(obj, **kwargs)
+        if not (kwargs.get("worldSpace") or kwargs.get("ws")):
+            return self.inner.xform(obj, **kwargs)
+        flags = [longName for longName, shortName in CACHED_XFORM_FLAGS if kwargs.get(longName) or kwargs.get(shortName)]
+        if len(flags) != 1:
+            return self.inner.xform(obj, **kwargs)
+        key = (obj, flags[0])
+        value = self.cache.get(key)
+        if value is None and flags[0] == "translation" and (obj, "matrix") in self.cache:
+            # Мировая позиция - строка переноса мировой матрицы
+            value = self.cache[key] = self.cache[(obj, "matrix")][12:15]
+        if value is None:
+            self.misses += 1
+            value = self.cache[key] = list(self.inner.xform(obj, **kwargs))
+        else:
+            self.hits += 1
+        return list(value)
+
+    def applyBatch(self, command, calls):
+        if any(self.invalidates(command, args, kwargs) for args, kwargs in calls):
+            self.cache.clear()
+        return self.inner.applyBatch(command, calls)
+
+    # Перенос child сдвигает его вместе с потомками
+    def createTransformChain(self, names, parent = None, child = None):
+        if child:
+            self.cache.clear()
+        return self.inner.createTransformChain(names, parent, child)
+
+    # Включает кэш для текущей сцены. Вложенные вызовы используют уже включенный кэш
+@contextlib.contextmanager
+def cachedTransforms():
+    backend = getBackend()
+    if isinstance(backend, TransformCacheBackend):
+        yield backend
+        return
+    with useBackend(TransformCacheBackend(backend)) as cache:
+        yield cache